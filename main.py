@@ -2,34 +2,232 @@
 """
 AI Chat Desktop Application
 A Python desktop application with authentication, AI chat, and system tray functionality.
+
+Usage:
+    python main.py                 Start the app (or raise the running window)
+    python main.py send "prompt"   Ask the running app and print its reply
+    python main.py replay TRACE [SPEED]
+                                   Replay a captured trace headlessly and report timings
+    python main.py schedule        List scheduled prompts and when they next run
+    python main.py stats [minute|hour|day] [DAYS]
+                                   Export token usage and latency rollups as CSV
+    python main.py loadtest [USERS,...] [SECONDS]
+                                   Simulate concurrent users headlessly and report scaling
 """
 
-import tkinter as tk
-from tkinter import ttk, messagebox
+import multiprocessing
 import threading
 import sys
 import os
+import uuid
 from pathlib import Path
+from typing import Optional
 
 # Add the project root to Python path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+from src.single_instance import SingleInstance, IpcServer, send_request
+
+def run_cli(argv) -> int:
+    """Run a command-line subcommand against the running instance"""
+    if argv[0] == '--tray-helper':
+        # Started by TrayManager; an entry here rather than -m works in frozen builds too
+        from src.tray_process import main as run_tray_helper
+        run_tray_helper()
+        return 0
+
+    if argv[0] == 'send' and len(argv) > 1:
+        reply = send_request({"cmd": "send", "text": " ".join(argv[1:])})
+        if reply is None:
+            print("AI Chat Assistant is not running", file=sys.stderr)
+            return 1
+        if not reply.get("ok"):
+            print(f"Error: {reply.get('error')}", file=sys.stderr)
+            return 1
+        print(reply["reply"])
+        return 0
+
+    if argv[0] == 'replay' and len(argv) > 1:
+        return run_replay(argv[1], float(argv[2]) if len(argv) > 2 else 0)
+
+    if argv[0] == 'schedule':
+        return run_schedule()
+
+    if argv[0] == 'stats':
+        resolution = argv[1] if len(argv) > 1 else 'day'
+        return run_stats(resolution, int(argv[2]) if len(argv) > 2 else None)
+
+    if argv[0] == 'loadtest':
+        levels = [int(users) for users in argv[1].split(',')] if len(argv) > 1 else None
+        return run_loadtest(levels, float(argv[2]) if len(argv) > 2 else None)
+
+    print(__doc__.strip(), file=sys.stderr)
+    return 2
+
+def run_replay(trace_file: str, speed: float) -> int:
+    """Feed a captured trace through a headless controller and print timings"""
+    from src.config import Config
+    from src.app_controller import AppController
+    from src.tracing import load_traces, replay_workload
+
+    config = Config()
+    # Temporary overrides: replay must not touch the user's history or sync
+    for key, value in (('ai.api_provider', 'replay'), ('ai.trace_file', trace_file),
+                       ('ai.replay_speed', speed), ('ai.trace_mode', 'off'),
+                       ('chat.persist_history', False), ('retrieval.enabled', False),
+                       ('sync.enabled', False), ('analytics.enabled', False)):
+        config.set(key, value, save=False)
+
+    controller = AppController(config)
+    traces = [trace for trace in load_traces(Path(trace_file).expanduser())
+              if trace.get("status") == "completed"]
+    for index, result in enumerate(replay_workload(controller, traces), 1):
+        ttft = f"{result['ttft_ms']:.1f}" if result['ttft_ms'] is not None else "-"
+        print(f"{index:4d}  ttft {ttft:>8} ms  total {result['total_ms']:9.1f} ms  "
+              f"(captured {result['captured_total_ms']} ms)")
+
+    for name in ('generation.ttft_ms', 'generation.total_ms'):
+        summary = controller.metrics.summary(name)
+        if summary["count"]:
+            print(f"{name}: p50 {summary['p50']:.1f} ms  p95 {summary['p95']:.1f} ms  "
+                  f"max {summary['max']:.1f} ms  (n={summary['count']})")
+    print(f"hash misses: {controller.get_provider().misses}")
+    return 0
+
+def run_schedule() -> int:
+    """Print the configured scheduled prompts and their next run times"""
+    from src.config import Config
+    from src.scheduler import next_runs
+
+    runs = next_runs(Config())
+    if not runs:
+        print("No scheduled prompts (add them to scheduler.jobs in config.json)")
+    for job, due in runs:
+        when = due.strftime('%Y-%m-%d %H:%M') if due else "done"
+        spec = job.cron.spec if job.cron else f"at {job.at.isoformat()}"
+        print(f"{job.id:20s} {spec:20s} next {when}")
+    return 0
+
+def run_stats(resolution: str, days) -> int:
+    """Print usage rollups as CSV (all retained rows unless DAYS is given)"""
+    from src.analytics import UsageAnalytics, RESOLUTIONS, export_csv
+
+    if resolution not in RESOLUTIONS:
+        print(f"Resolution must be one of: {', '.join(RESOLUTIONS)}", file=sys.stderr)
+        return 2
+    analytics = UsageAnalytics()
+    if days:
+        rows = analytics.recent(days, resolution)
+    else:
+        rows = analytics.query(resolution)
+    export_csv(rows, sys.stdout)
+    return 0
+
+def run_loadtest(levels, duration) -> int:
+    """Run the load harness (loadtest.* settings) and print a row per concurrency level"""
+    from src.config import Config
+    from src.loadtest import LoadTest
+
+    config = Config()
+    levels = levels or config.get('loadtest.levels', [1, 4, 16, 64])
+    duration = duration or config.get('loadtest.duration', 20)
+    try:
+        test = LoadTest(provider=config.get('loadtest.provider', 'mock'),
+                        think=config.get('loadtest.think_time', 'exp:2'),
+                        prompts=config.get('loadtest.prompts') or None,
+                        timeout=config.get('loadtest.timeout', 60))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    print(f"{'users':>5}  {'replies/s':>9}  {'ok':>5}  {'fail':>4}  {'ttft p50':>8}  {'p95':>7}  "
+          f"{'total p50':>9}  {'p95':>7}  {'p99':>7}  {'threads':>7}  {'MiB/session':>11}")
+    results = []
+    for result in test.run(levels, duration):
+        results.append(result)
+        rss = f"{result.rss_per_session_mb:.2f}" if result.rss_per_session_mb is not None else "-"
+        print(f"{result.users:5d}  {result.throughput:9.2f}  {result.completed:5d}  "
+              f"{result.failed + result.timed_out:4d}  {result.ttft_ms.get('p50', 0):8.0f}  "
+              f"{result.ttft_ms.get('p95', 0):7.0f}  {result.total_ms.get('p50', 0):9.0f}  "
+              f"{result.total_ms.get('p95', 0):7.0f}  {result.total_ms.get('p99', 0):7.0f}  "
+              f"{result.peak_threads:7d}  {rss:>11}")
+
+    print("\nLock contention (all levels):")
+    for result in results:
+        for lock in result.locks:
+            if lock.acquisitions:
+                print(f"  {result.users:4d} users  {lock.name:28s} {lock.contention:6.1%} of "
+                      f"{lock.acquisitions:6d}  wait {lock.wait_ms:8.1f} ms  max {lock.max_wait_ms:6.1f} ms")
+    return 0
+
+if __name__ == "__main__":
+    # Frozen builds: lets the spawned thumbnail and tool workers start
+    multiprocessing.freeze_support()
+
+# Subcommands never need the GUI, so skip loading it entirely
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from src.config import Config
+    from src.logger import configure_logging, shutdown_logging
+
+    configure_logging(Config())
+    try:
+        exit_code = run_cli(sys.argv[1:])
+    finally:
+        shutdown_logging()
+    sys.exit(exit_code)
+
+# A relaunch only brings the running window forward: take the instance lock
+# before loading the GUI or building the controller, so a second launch
+# neither pays the cold start nor touches the shared files
+instance_lock = None
+if __name__ == "__main__":
+    from src.config import Config
+
+    startup_config = Config()
+    if startup_config.get('app.single_instance', True):
+        instance_lock = SingleInstance()
+        if not instance_lock.acquire():
+            if send_request({"cmd": "raise"}, timeout=5) is None:
+                print("AI Chat Assistant is already running but not responding", file=sys.stderr)
+            sys.exit(0)
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+
 from src.app_controller import AppController
 from src.ui.auth_window import AuthWindow
 from src.ui.chat_window import ChatWindow
+from src.ui.quick_message import QuickMessageWindow
 from src.tray_manager import TrayManager
 from src.config import Config
+from src.prewarm import Prewarmer
+from src.scheduler import Scheduler
+from src.watchdog import MainLoopWatchdog
+from src.memory_monitor import MemoryMonitor
+from src.logger import get_logger, configure_logging, shutdown_logging
+
+log = get_logger('app')
 
 class AIChairApplication:
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, config: Optional[Config] = None, instance_lock: Optional[SingleInstance] = None):
+        self.config = config or Config()
+        configure_logging(self.config)
         self.root = None
         self.current_window = None
         self.tray_manager = None
-        self.controller = AppController()
+        self.controller = AppController(self.config)
         self.is_authenticated = False
         self.user_email = None
+        self.instance_lock = instance_lock  # Acquired before the app is built (see __main__)
+        self.ipc_server = None
+        self.prewarmer = None
+        self.watchdog = None
+        self.memory_monitor = None
+        self.quick_message = None
+        self.scheduler = None
+        self.unread_results = []  # Scheduled results that finished while hidden
+        self.unnotified_results = []
         
     def initialize(self):
         """Initialize the application"""
@@ -52,12 +250,50 @@ class AIChairApplication:
         # Apply theme
         self.setup_theme()
         
+        # Watch for main-loop stalls
+        if self.config.get('watchdog.enabled', True):
+            self.watchdog = MainLoopWatchdog(self.root, self.controller.metrics,
+                                             self.config.get('watchdog.interval_ms', 100),
+                                             self.config.get('watchdog.budget_ms', 200))
+            self.watchdog.start()
+        
+        # Track memory use and leaks over long tray sessions
+        if self.config.get('memory.enabled', True):
+            self.setup_memory_monitor()
+        
+        # Build the quick message popup now so the tray can show it instantly
+        self.quick_message = QuickMessageWindow(self.root, self.controller)
+        
         # Initialize tray manager
-        self.tray_manager = TrayManager(self)
+        self.tray_manager = TrayManager(self, self.config.get('tray.helper_restarts', 3))
+        
+        # Warm up the provider connection while the user signs in
+        if self.config.get('network.prewarm', True):
+            self.prewarmer = Prewarmer(self.controller)
         
         # Show authentication window
         self.show_auth_window()
         
+    def setup_memory_monitor(self):
+        """Create the memory monitor and register long-lived subsystems"""
+        controller = self.controller
+        self.memory_monitor = MemoryMonitor(
+            controller.metrics,
+            budget_mb=self.config.get('memory.budget_mb', 400),
+            interval=self.config.get('memory.check_interval', 60),
+            leak_checks=self.config.get('memory.leak_checks', 5),
+            tracemalloc_mode=self.config.get('memory.tracemalloc', 'auto')
+        )
+        keep = self.config.get('memory.trim_keep_messages', 200)
+        self.memory_monitor.register('messages', lambda: len(controller.conversation),
+                                     lambda: controller.trim_history(keep), leak_check=False)
+        self.memory_monitor.register('retrieval_pairs', lambda: len(controller.retrieval),
+                                     leak_check=False)
+        # These should stay flat; steady growth means windows are not released
+        self.memory_monitor.register('message_callbacks', lambda: len(controller.message_callbacks))
+        self.memory_monitor.register('chat_windows', lambda: len(ChatWindow.instances))
+        self.memory_monitor.start()
+    
     def setup_theme(self):
         """Setup application theme matching the original design"""
         style = ttk.Style()
@@ -97,9 +333,15 @@ class AIChairApplication:
         if self.current_window:
             self.current_window.destroy()
             
+        if self.memory_monitor:
+            self.memory_monitor.unregister('rendered_lines')
+        
         self.current_window = AuthWindow(self.root, self.controller, self.on_authentication_success)
         self.root.deiconify()  # Show window
         
+        if self.prewarmer:
+            self.prewarmer.start()
+        
     def show_chat_window(self):
         """Show the chat window"""
         if self.current_window:
@@ -108,28 +350,65 @@ class AIChairApplication:
         self.current_window = ChatWindow(self.root, self.controller, self.user_email)
         self.root.deiconify()  # Show window
         
+        if self.memory_monitor:
+            chat_window = self.current_window
+            keep_lines = self.config.get('memory.trim_keep_lines', 2000)
+            # Counted from the monitor thread; trimming must happen on the Tk thread
+            self.memory_monitor.register(
+                'rendered_lines', lambda: chat_window.rendered_lines,
+                lambda: self.root.after(0, chat_window.trim_rendered_history, keep_lines),
+                leak_check=False)
+        
     def on_authentication_success(self, email):
         """Handle successful authentication"""
         self.is_authenticated = True
         self.user_email = email
+        self.controller.user_id = email
         self.show_chat_window()
+        self.controller.start_sync(email)
+        self.controller.start_outbound(self.on_queued_delivered)
+        
+        # Refresh the pooled connection if the sign-in screen sat idle for a while
+        if self.prewarmer:
+            self.prewarmer.start(min_interval=self.config.get('network.prewarm_refresh', 30))
         
-        # Start tray manager
+        # Start the tray helper process
         if self.tray_manager:
-            threading.Thread(target=self.tray_manager.start, daemon=True).start()
+            self.tray_manager.start()
+        
+        # Run scheduled prompts while signed in
+        if self.config.get('scheduler.enabled', True):
+            self.scheduler = Scheduler(self.controller, self.on_scheduled_result,
+                                       max_concurrent=self.config.get('scheduler.max_concurrent', 1))
+            self.scheduler.start()
     
     def on_sign_out(self):
         """Handle user sign out"""
         self.is_authenticated = False
         self.user_email = None
+        self.controller.user_id = ''
+        self.controller.stop_sync()
+        self.controller.stop_outbound()
+        self.controller.end_session()
+        self.stop_scheduler()
+        if self.controller.analytics:
+            self.controller.analytics.save()
+        if self.quick_message:
+            self.quick_message.hide()
         self.show_auth_window()
         
         # Stop tray if running
         if self.tray_manager:
             self.tray_manager.stop()
     
+    def save_render_snapshot(self):
+        """Persist the chat page so the next launch can paint it immediately"""
+        if isinstance(self.current_window, ChatWindow):
+            self.current_window.save_snapshot()
+    
     def minimize_to_tray(self):
         """Minimize application to system tray"""
+        self.save_render_snapshot()
         self.root.withdraw()
         if self.tray_manager:
             self.tray_manager.show_notification("AI Chat minimized to tray")
@@ -139,17 +418,144 @@ class AIChairApplication:
         self.root.deiconify()
         self.root.lift()
         self.root.focus_force()
+        self.show_unread_results()
+    
+    def stop_scheduler(self):
+        if self.scheduler:
+            self.scheduler.stop()
+            self.scheduler = None
+        self.unread_results = []
+        self.unnotified_results = []
+    
+    def on_scheduled_result(self, result):
+        """A scheduled prompt finished (runs on a scheduler thread)"""
+        self.root.after(0, self.deliver_scheduled_result, result)
+    
+    def deliver_scheduled_result(self, result):
+        """Show a result now, or hold it for the tray if the window is hidden"""
+        if not self.is_authenticated:
+            return
+        if self.root.state() != 'withdrawn' and isinstance(self.current_window, ChatWindow):
+            self.current_window.show_scheduled_result(result)
+            return
+        
+        self.unread_results.append(result)
+        if self.tray_manager:
+            self.tray_manager.update_unread_count(len(self.unread_results))
+        
+        # Results finishing close together share one notification
+        self.unnotified_results.append(result)
+        if len(self.unnotified_results) == 1:
+            delay = self.config.get('scheduler.notify_batch_seconds', 10)
+            self.root.after(int(delay * 1000), self.notify_scheduled_results)
+    
+    def notify_scheduled_results(self):
+        results, self.unnotified_results = self.unnotified_results, []
+        if not results or not self.tray_manager:
+            return
+        if len(results) == 1:
+            title = f"Scheduled: {results[0].name}"
+            message = results[0].text[:200]
+        else:
+            title = f"{len(results)} scheduled prompts finished"
+            message = ", ".join(result.name for result in results)
+        self.tray_manager.show_notification(title, message)
+    
+    def show_unread_results(self):
+        """Move results held while hidden into the chat and clear the badge"""
+        if not self.unread_results or not isinstance(self.current_window, ChatWindow):
+            return
+        results, self.unread_results = self.unread_results, []
+        for result in results:
+            self.current_window.show_scheduled_result(result)
+        if self.tray_manager:
+            self.tray_manager.update_unread_count(0)
+    
+    def on_queued_delivered(self, item, text: str, ok: bool):
+        """A message queued while offline was answered (runs on a flush thread)"""
+        self.root.after(0, self.deliver_queued_reply, item, text, ok)
+    
+    def deliver_queued_reply(self, item, text: str, ok: bool):
+        if not self.is_authenticated:
+            return
+        if isinstance(self.current_window, ChatWindow):
+            self.current_window.on_queued_reply(item, text, ok)
+        if self.root.state() == 'withdrawn' and self.tray_manager:
+            self.tray_manager.show_notification("Queued message sent", text[:200])
+    
+    def show_quick_message(self):
+        """Show the quick message popup, or the main window before sign-in"""
+        if self.is_authenticated and self.quick_message:
+            self.quick_message.show()
+        else:
+            self.restore_from_tray()
+    
+    def handle_ipc_request(self, request: dict) -> dict:
+        """Handle a request from another launch (runs on an IPC thread)"""
+        command = request.get("cmd")
+        
+        if command == "raise":
+            self.root.after(0, self.restore_from_tray)
+            return {"ok": True}
+        
+        if command == "send":
+            if not self.is_authenticated:
+                return {"ok": False, "error": "Not signed in"}
+            
+            done = threading.Event()
+            result = {}
+            
+            def on_response(response: str):
+                result["reply"] = response
+                done.set()
+            
+            # Stored as its own conversation; the chat window never shows it
+            self.controller.send_message_to_ai(request.get("text", ""), on_response,
+                                               interactive=False, conversation_id=uuid.uuid4().hex)
+            if not done.wait(self.config.get('app.ipc_send_timeout', 120)):
+                return {"ok": False, "error": "Timed out waiting for a response"}
+            return {"ok": True, "reply": result["reply"]}
+        
+        return {"ok": False, "error": f"Unknown command: {command}"}
     
     def quit_application(self):
         """Quit the application"""
+        self.save_render_snapshot()
+        if self.ipc_server:
+            self.ipc_server.stop()
+        if self.instance_lock:
+            self.instance_lock.release()
+        self.controller.stop_sync()
+        self.controller.stop_outbound()
+        self.controller.end_session()
+        self.stop_scheduler()
+        if self.controller.analytics:
+            self.controller.analytics.save()
+        self.controller.thumbnails.shutdown()
+        if self.controller.tool_executor:
+            self.controller.tool_executor.shutdown()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.memory_monitor:
+            self.memory_monitor.stop()
+        shutdown_logging()
         if self.tray_manager:
             self.tray_manager.stop()
         self.root.quit()
         self.root.destroy()
+        # The window is gone, so waiting for sync's final push blocks nothing visible
+        self.controller.wait_for_sync()
         sys.exit(0)
     
     def run(self):
         """Run the application"""
+        if self.instance_lock:
+            try:
+                self.ipc_server = IpcServer(self.handle_ipc_request)
+                self.ipc_server.start()
+            except OSError as e:
+                log.warning("IPC server unavailable: %s", e)
+        
         try:
             self.initialize()
             
@@ -162,9 +568,10 @@ class AIChairApplication:
         except KeyboardInterrupt:
             self.quit_application()
         except Exception as e:
+            log.exception("Application error: %s", e)
             messagebox.showerror("Error", f"Application error: {str(e)}")
             self.quit_application()
 
 if __name__ == "__main__":
-    app = AIChairApplication()
+    app = AIChairApplication(startup_config, instance_lock)
     app.run()
\ No newline at end of file
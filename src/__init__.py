@@ -7,7 +7,16 @@ __version__ = "1.0.0"
 __author__ = "AI Chat Team"
 __description__ = "Desktop AI Chat Assistant with Authentication and Tray Integration"
 
-from .config import Config
-from .app_controller import AppController
+__all__ = ['Config', 'AppController']
 
-__all__ = ['Config', 'AppController']
\ No newline at end of file
+
+def __getattr__(name):
+    # Exports are resolved lazily so lightweight entry points (such as the
+    # IPC client used by ``main.py send``) don't import the whole app
+    if name == 'Config':
+        from .config import Config
+        return Config
+    if name == 'AppController':
+        from .app_controller import AppController
+        return AppController
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,348 @@
+"""
+Usage Analytics
+Token counts and latency per user, model and time period, kept as
+precomputed rollups at minute, hour and day resolution.
+
+Each resolution is a small columnar table: one ``array`` per measure and a
+row per (period, user, model). Recording an exchange adds to one row of each
+table, and queries read only the rows of the requested range, so stats never
+scan the chat history. Latency percentiles come from a per-row histogram.
+Tables are saved under ~/.ai_chat_app/analytics/; minute and hour rows
+older than their retention are dropped.
+"""
+
+import bisect
+import csv
+import json
+import os
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
+
+from .logger import get_logger
+
+log = get_logger('analytics')
+
+ANALYTICS_DIR = Path.home() / ".ai_chat_app" / "analytics"
+RESOLUTIONS = ('minute', 'hour', 'day')
+DEFAULT_RETENTION_DAYS = {'minute': 2, 'hour': 90, 'day': 0}  # 0 = keep forever
+
+# Summed per row; max_total_ms is a maximum instead
+INT_COLUMNS = ('requests', 'errors', 'cancelled', 'estimated', 'prompt_tokens', 'completion_tokens',
+               'ttft_count')
+FLOAT_COLUMNS = ('ttft_ms', 'total_ms', 'tool_ms', 'max_total_ms')
+LATENCY_BUCKETS_MS = (50, 100, 150, 200, 300, 400, 500, 700, 1000, 1500, 2000, 3000, 4000, 5000,
+                      7000, 10000, 15000, 20000, 30000, 60000)
+_BINS = len(LATENCY_BUCKETS_MS) + 1  # Last bin is overflow
+
+
+def period_start(resolution: str, timestamp: float) -> int:
+    """Start of the minute, hour or (local) day containing timestamp"""
+    if resolution == 'day':
+        moment = datetime.fromtimestamp(timestamp)
+        return int(datetime(moment.year, moment.month, moment.day).timestamp())
+    step = 60 if resolution == 'minute' else 3600
+    return int(timestamp // step * step)
+
+
+@dataclass
+class UsageRow:
+    period: Optional[datetime]  # None when not grouped by period
+    user: str
+    model: str
+    requests: int = 0
+    errors: int = 0
+    cancelled: int = 0
+    estimated: int = 0  # Requests whose token counts were estimated locally
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    ttft_avg_ms: Optional[float] = None
+    total_avg_ms: Optional[float] = None
+    total_p50_ms: Optional[float] = None  # Interpolated within a histogram bin
+    total_p95_ms: Optional[float] = None
+    max_total_ms: float = 0.0
+    tool_ms: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"period": self.period.isoformat() if self.period else "", "user": self.user,
+                "model": self.model, "requests": self.requests, "errors": self.errors,
+                "cancelled": self.cancelled, "estimated": self.estimated,
+                "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                "ttft_avg_ms": _round(self.ttft_avg_ms), "total_avg_ms": _round(self.total_avg_ms),
+                "total_p50_ms": _round(self.total_p50_ms), "total_p95_ms": _round(self.total_p95_ms),
+                "max_total_ms": _round(self.max_total_ms), "tool_ms": _round(self.tool_ms)}
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+class RollupTable:
+    """Columnar rows of one resolution, ordered by period"""
+
+    def __init__(self, resolution: str):
+        self.resolution = resolution
+        self.keys: List[Tuple[int, str, str]] = []  # (period start, user, model) per row
+        self.periods = array('q')  # Period start per row, for range lookups
+        self.index: Dict[Tuple[int, str, str], int] = {}
+        self.ints = {name: array('q') for name in INT_COLUMNS}
+        self.floats = {name: array('d') for name in FLOAT_COLUMNS}
+        self.histogram = array('q')  # _BINS counts per row
+        self.ordered = True  # False if a row arrived out of period order (clock change)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: Tuple[int, str, str], values: Dict[str, float], latency_bin: int):
+        row = self.index.get(key)
+        if row is None:
+            row = self._append_row(key)
+        for name in INT_COLUMNS:
+            if name in values:
+                self.ints[name][row] += int(values[name])
+        for name in ('ttft_ms', 'total_ms', 'tool_ms'):
+            if name in values:
+                self.floats[name][row] += values[name]
+        if values.get('total_ms', 0) > self.floats['max_total_ms'][row]:
+            self.floats['max_total_ms'][row] = values['total_ms']
+        self.histogram[row * _BINS + latency_bin] += 1
+
+    def _append_row(self, key: Tuple[int, str, str]) -> int:
+        if self.periods and key[0] < self.periods[-1]:
+            self.ordered = False
+        row = len(self.keys)
+        self.keys.append(key)
+        self.periods.append(key[0])
+        self.index[key] = row
+        for column in self.ints.values():
+            column.append(0)
+        for column in self.floats.values():
+            column.append(0.0)
+        self.histogram.extend([0] * _BINS)
+        return row
+
+    def rows_between(self, start: Optional[int], end: Optional[int]) -> Iterable[int]:
+        """Row numbers with start <= period < end"""
+        if not self.ordered:
+            return [row for row, period in enumerate(self.periods)
+                    if (start is None or period >= start) and (end is None or period < end)]
+        first = 0 if start is None else bisect.bisect_left(self.periods, start)
+        last = len(self.periods) if end is None else bisect.bisect_left(self.periods, end)
+        return range(first, last)
+
+    def prune(self, before: int):
+        """Drop rows for periods before a timestamp"""
+        keep = [row for row in range(len(self.keys)) if self.periods[row] >= before]
+        if len(keep) == len(self.keys):
+            return
+        table = RollupTable(self.resolution)
+        for row in sorted(keep, key=lambda row: self.periods[row]):
+            copy = table._append_row(self.keys[row])
+            for name in INT_COLUMNS:
+                table.ints[name][copy] = self.ints[name][row]
+            for name in FLOAT_COLUMNS:
+                table.floats[name][copy] = self.floats[name][row]
+            table.histogram[copy * _BINS:(copy + 1) * _BINS] = self.histogram[row * _BINS:(row + 1) * _BINS]
+        self.__dict__.update(table.__dict__)
+
+    def save(self, path: Path):
+        """Write a JSON header line followed by the raw columns, atomically"""
+        header = {"version": 1, "resolution": self.resolution, "bins": _BINS,
+                  "ints": list(INT_COLUMNS), "floats": list(FLOAT_COLUMNS),
+                  "keys": [list(key) for key in self.keys]}
+        temp = path.with_suffix('.tmp')
+        with open(temp, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b"\n")
+            for name in INT_COLUMNS:
+                self.ints[name].tofile(f)
+            for name in FLOAT_COLUMNS:
+                self.floats[name].tofile(f)
+            self.histogram.tofile(f)
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path: Path, resolution: str) -> 'RollupTable':
+        table = cls(resolution)
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            if (header.get("ints") != list(INT_COLUMNS) or header.get("floats") != list(FLOAT_COLUMNS)
+                    or header.get("bins") != _BINS):
+                raise ValueError(f"unsupported rollup layout in {path.name}")
+            rows = len(header["keys"])
+            for name in INT_COLUMNS:
+                table.ints[name].fromfile(f, rows)
+            for name in FLOAT_COLUMNS:
+                table.floats[name].fromfile(f, rows)
+            table.histogram.fromfile(f, rows * _BINS)
+        for row, key in enumerate(header["keys"]):
+            key = (int(key[0]), key[1], key[2])
+            if table.periods and key[0] < table.periods[-1]:
+                table.ordered = False
+            table.keys.append(key)
+            table.periods.append(key[0])
+            table.index[key] = row
+        return table
+
+
+class UsageAnalytics:
+    """Records every exchange into the rollups and answers stats queries"""
+
+    def __init__(self, directory: Optional[Path] = None, retention_days: Optional[Dict[str, int]] = None,
+                 save_interval: float = 60):
+        self.directory = directory or ANALYTICS_DIR
+        self.retention_days = dict(DEFAULT_RETENTION_DAYS, **(retention_days or {}))
+        self.save_interval = save_interval
+        self.tables: Optional[Dict[str, RollupTable]] = None  # Loaded on first use
+        self._dirty = False
+        self._saved = time.monotonic()
+        self._saving = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, RollupTable]:
+        """Read the saved tables; called with the lock held"""
+        if self.tables is None:
+            tables = {}
+            for resolution in RESOLUTIONS:
+                path = self.directory / f"{resolution}.rollup"
+                try:
+                    tables[resolution] = RollupTable.load(path, resolution) if path.exists() \
+                        else RollupTable(resolution)
+                except (OSError, ValueError, KeyError, EOFError) as e:
+                    log.error("Error loading %s usage rollups, starting over: %s", resolution, e)
+                    tables[resolution] = RollupTable(resolution)
+            self.tables = tables
+        return self.tables
+
+    def record(self, user: str, model: str, prompt_tokens: int, completion_tokens: int,
+               total_ms: float, ttft_ms: Optional[float] = None, tool_ms: float = 0.0,
+               status: str = 'ok', estimated: bool = False, timestamp: Optional[float] = None):
+        """Add one exchange to every resolution (status: ok, error or cancelled)"""
+        timestamp = timestamp or time.time()
+        values = {'requests': 1, 'errors': int(status == 'error'), 'cancelled': int(status == 'cancelled'),
+                  'estimated': int(estimated), 'prompt_tokens': prompt_tokens,
+                  'completion_tokens': completion_tokens, 'total_ms': total_ms, 'tool_ms': tool_ms}
+        if ttft_ms is not None:
+            values['ttft_ms'] = ttft_ms
+            values['ttft_count'] = 1
+        latency_bin = bisect.bisect_left(LATENCY_BUCKETS_MS, total_ms)
+        with self._lock:
+            for resolution, table in self._load().items():
+                table.add((period_start(resolution, timestamp), user, model), values, latency_bin)
+            self._dirty = True
+            due = not self._saving and time.monotonic() - self._saved >= self.save_interval
+            if due:
+                self._saving = True
+        if due:
+            threading.Thread(target=self.save, name="analytics-save", daemon=True).start()
+
+    def save(self):
+        """Prune expired rows and write the tables if anything changed"""
+        try:
+            with self._lock:
+                if not self._dirty or self.tables is None:
+                    return
+                now = time.time()
+                for resolution, table in self.tables.items():
+                    days = self.retention_days.get(resolution, 0)
+                    if days:
+                        table.prune(period_start(resolution, now - days * 86400))
+                self.directory.mkdir(parents=True, exist_ok=True)
+                for resolution, table in self.tables.items():
+                    table.save(self.directory / f"{resolution}.rollup")
+                self._dirty = False
+                self._saved = time.monotonic()
+        except OSError as e:
+            log.error("Error saving usage rollups: %s", e)
+        finally:
+            self._saving = False
+
+    def query(self, resolution: str = 'day', start: Optional[datetime] = None,
+              end: Optional[datetime] = None, group_by: Sequence[str] = ('period', 'user', 'model'),
+              user: Optional[str] = None, model: Optional[str] = None) -> List[UsageRow]:
+        """Rows of one resolution between start and end, merged by the group_by fields"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        start_ts = period_start(resolution, start.timestamp()) if start else None
+        end_ts = int(end.timestamp()) if end else None
+        groups: Dict[Tuple, List[float]] = {}
+        with self._lock:
+            table = self._load()[resolution]
+            for row in table.rows_between(start_ts, end_ts):
+                period, row_user, row_model = table.keys[row]
+                if (user is not None and row_user != user) or (model is not None and row_model != model):
+                    continue
+                key = (period if 'period' in group_by else None,
+                       row_user if 'user' in group_by else '',
+                       row_model if 'model' in group_by else '')
+                totals = groups.get(key)
+                if totals is None:
+                    totals = groups[key] = [0] * (len(INT_COLUMNS) + len(FLOAT_COLUMNS) + _BINS)
+                for index, name in enumerate(INT_COLUMNS):
+                    totals[index] += table.ints[name][row]
+                offset = len(INT_COLUMNS)
+                for index, name in enumerate(FLOAT_COLUMNS):
+                    value = table.floats[name][row]
+                    if name == 'max_total_ms':
+                        totals[offset + index] = max(totals[offset + index], value)
+                    else:
+                        totals[offset + index] += value
+                offset += len(FLOAT_COLUMNS)
+                for index in range(_BINS):
+                    totals[offset + index] += table.histogram[row * _BINS + index]
+
+        return [self._to_row(key, totals) for key, totals in
+                sorted(groups.items(), key=lambda item: (item[0][0] or 0, item[0][1], item[0][2]))]
+
+    @staticmethod
+    def _to_row(key: Tuple, totals: List[float]) -> UsageRow:
+        ints = dict(zip(INT_COLUMNS, totals))
+        floats = dict(zip(FLOAT_COLUMNS, totals[len(INT_COLUMNS):]))
+        histogram = totals[len(INT_COLUMNS) + len(FLOAT_COLUMNS):]
+        requests = ints['requests']
+
+        def percentile(p):
+            """Linear interpolation inside the bin holding the p-th request"""
+            if not requests:
+                return None
+            rank, seen = p * requests, 0
+            highest = floats['max_total_ms']
+            for index, count in enumerate(histogram):
+                if count and seen + count >= rank:
+                    lower = LATENCY_BUCKETS_MS[index - 1] if index else 0
+                    upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else highest
+                    upper = min(upper, highest)
+                    return min(upper, lower + (upper - lower) * (rank - seen) / count)
+                seen += count
+            return highest
+
+        return UsageRow(
+            period=datetime.fromtimestamp(key[0]) if key[0] is not None else None,
+            user=key[1], model=key[2],
+            requests=requests, errors=ints['errors'], cancelled=ints['cancelled'],
+            estimated=ints['estimated'], prompt_tokens=ints['prompt_tokens'],
+            completion_tokens=ints['completion_tokens'],
+            ttft_avg_ms=floats['ttft_ms'] / ints['ttft_count'] if ints['ttft_count'] else None,
+            total_avg_ms=floats['total_ms'] / requests if requests else None,
+            total_p50_ms=percentile(0.50), total_p95_ms=percentile(0.95),
+            max_total_ms=floats['max_total_ms'], tool_ms=floats['tool_ms'])
+
+    def recent(self, days: int, resolution: str = 'day', **kwargs) -> List[UsageRow]:
+        """Rows for the last few days (days=1: today so far)"""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.query(resolution, start=today - timedelta(days=days - 1), **kwargs)
+
+
+def export_csv(rows: List[UsageRow], out: TextIO):
+    """Write query rows as CSV with a header line"""
+    writer = csv.DictWriter(out, fieldnames=list(UsageRow(None, '', '').as_dict()))
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row.as_dict())
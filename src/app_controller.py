@@ -3,32 +3,166 @@ Application Controller
 Handles business logic, authentication, and API interactions.
 """
 
-import requests
 import time
 import json
 import threading
-from typing import Optional, Callable, Dict, Any
-from dataclasses import dataclass
+import uuid
+from itertools import chain
+from typing import Optional, Callable, Dict, Any, List
+from dataclasses import dataclass, field
 from datetime import datetime
 
+from .analytics import UsageAnalytics
+from .attachments import Attachment, BlobStore, ThumbnailPool
+from .config import Config
+from .conversation_tree import ConversationTree
+from .history_store import HistoryStore
+from .logger import get_logger
+from .metrics import Metrics
+from .mock_rules import MockResponder
+from .outbox import Outbox, OutboundQueue, QueuedSend
+from .profiler import SamplingProfiler
+from .providers import BaseProvider, GenerationCancelled, NetworkError, ToolCall, Usage, create_provider
+from .retrieval import RetrievalResponder
+from .snippets import SnippetLibrary
+from .tiered_history import ColdHistory, HistoryView
+from .tools import TOOL_REGISTRY, DEFAULT_ROOTS, ToolExecutor
+from .tracing import TraceRecorder
+
+log = get_logger('controller')
+
 @dataclass
 class Message:
     id: str
     content: str
     sender: str  # 'user' or 'ai'
     timestamp: datetime
+    attachments: List[Attachment] = field(default_factory=list)
+
+class Generation:
+    """Handle for a single in-flight AI request"""
+
+    def __init__(self, message: str):
+        self.message = message
+        self.cancel_event = threading.Event()
+        self.partial_chunks = []
+        self.provider_name = None
+        self.user_message = None
+        self.conversation_id = None  # Set for exchanges kept off the chat's conversation
+        self.cancel_requested_at = None
+        self.stopped_text = None  # Partial text handed back by cancel_generation
+        self._response = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def partial_text(self) -> str:
+        return ''.join(self.partial_chunks)
+
+    def attach_response(self, response):
+        """Register the open HTTP response so cancel() can abort it"""
+        with self._lock:
+            self._response = response
+            cancelled = self.cancelled
+
+        if cancelled:
+            response.close()
+
+    def check_cancelled(self):
+        """Raise GenerationCancelled if a stop was requested"""
+        if self.cancelled:
+            raise GenerationCancelled()
+
+    def cancel(self):
+        """Request cancellation and abort any open connection"""
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancel_requested_at = time.perf_counter()
+            self.cancel_event.set()
+            response = self._response
+
+        if response is not None:
+            try:
+                # Closing the response tears down the socket, which unblocks
+                # a worker waiting on the next streamed chunk
+                response.close()
+            except Exception:
+                pass
 
 class AppController:
-    def __init__(self):
-        self.api_base_url = "https://api.openai.com/v1"  # Example AI API
-        self.api_key = None
-        self.messages = []
+    SYSTEM_PROMPT = "You are a helpful AI assistant."
+
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or Config()
+        self.api_key = self.config.api_key or None
+        self.conversation = ConversationTree()
+        self.cold_history = ColdHistory(Message)  # Older messages of the active branch, compressed
+        self._history_lock = threading.Lock()
+        self._resume_parent_id = None
+        self._latest_prompt_id = None  # Newest interactive prompt, whose reply may move the head
+        self._known_message_ids = None  # Stored message ids, built on the first sync pull
         self.is_typing = False
         self.message_callbacks = []
+        self.current_generation = None
+        self.active_generations = set()
+        self.metrics = Metrics()
+        self._generation_lock = threading.Lock()
+        self._provider = None
+        self._provider_key = None
+        self._provider_lock = threading.Lock()
+        self.conversation_id = uuid.uuid4().hex
+        self.history_store = HistoryStore()
+        self.retrieval = RetrievalResponder()
+        self.mock_responder = MockResponder(self.config.get('mock.rules_file', ''),
+                                            self.config.get('mock.reload_interval', 2))
+        self.snippets = SnippetLibrary(history_prompts=self.config.get('snippets.history_prompts', 5000),
+                                       min_prompt_count=self.config.get('snippets.min_prompt_count', 2))
+        self.outbox = Outbox()
+        self.outbound = None
+        self.user_id = ''  # Signed-in user, for usage analytics
+        self.analytics = None
+        if self.config.get('analytics.enabled', True):
+            self.analytics = UsageAnalytics(retention_days=self.config.get('analytics.retention_days'),
+                                            save_interval=self.config.get('analytics.save_interval', 60))
+        self.blob_store = BlobStore()
+        self.thumbnails = ThumbnailPool(self.blob_store,
+                                        size=self.config.get('attachments.thumbnail_size', 160),
+                                        workers=self.config.get('attachments.thumbnail_workers', 2))
+        self.sync_engine = None
+        self._stopped_sync = None
+        self.tracer = None
+        self.tool_executor = None
+        self._tool_lock = threading.Lock()
+        self.profiler = SamplingProfiler(interval=self.config.get('profiler.interval_ms', 5) / 1000,
+                                         max_overhead=self.config.get('profiler.max_overhead', 0.02))
+        
+        if self.config.get('retrieval.enabled', True):
+            # Replies recorded from here on are added live, so the build stops at this offset
+            cutoff = self.history_store.size()
+            threading.Thread(target=self._build_retrieval_index, args=(cutoff,), daemon=True).start()
+        if self.config.get('snippets.enabled', True):
+            # Reads the history file on the index thread, not here
+            self.snippets.build_async(record.get("content", "") for record in self.history_store.iter_records()
+                                      if record.get("sender") == 'user')
+    
+    @property
+    def messages(self) -> HistoryView:
+        """Messages on the active branch, oldest first"""
+        return HistoryView(self.cold_history, self.conversation.path())
         
     def add_message_callback(self, callback: Callable):
         """Add callback for new messages"""
         self.message_callbacks.append(callback)
+    
+    def remove_message_callback(self, callback: Callable):
+        """Remove a callback added with add_message_callback"""
+        # Bound methods compare equal to a fresh bound method of the same object
+        if callback in self.message_callbacks:
+            self.message_callbacks.remove(callback)
         
     def notify_message_callbacks(self, message: Message):
         """Notify all message callbacks"""
@@ -36,7 +170,74 @@ class AppController:
             try:
                 callback(message)
             except Exception as e:
-                print(f"Error in message callback: {e}")
+                log.exception("Error in message callback: %s", e)
+    
+    def _record_message(self, message: Message, provider: Optional[str] = None,
+                        persist: bool = True, reply_to: Optional[str] = None):
+        """Add a message to history, persist it and notify callbacks
+
+        The message goes after the active branch's head, or under reply_to.
+        A reply to the newest chat prompt always becomes the head while its
+        branch is still active.
+        """
+        with self._history_lock:
+            if reply_to is None:
+                node = self.conversation.append(message)
+            else:
+                node = self.conversation.add(message, reply_to, follow=reply_to == self._latest_prompt_id)
+            # While a resumed conversation loads, new roots continue its stored head
+            parent_id = node.parent.message.id if node.parent else self._resume_parent_id
+            self._enforce_history_limits()
+        if persist and self.config.get('chat.persist_history', True):
+            record = self.history_store.append(message, self.conversation_id, provider, parent_id)
+            if self.sync_engine:
+                # Blobs are pushed ahead of the records that reference them
+                for attachment in message.attachments:
+                    self.sync_engine.enqueue_blob(attachment.digest)
+                self.sync_engine.enqueue(record)
+        self.notify_message_callbacks(message)
+
+    def _store_detached(self, conversation_id: str, message: Message, provider: Optional[str] = None,
+                        parent_id: Optional[str] = None):
+        """Persist a message under another conversation, leaving the chat's tree alone"""
+        if not self.config.get('chat.persist_history', True):
+            return
+        record = self.history_store.append(message, conversation_id, provider, parent_id)
+        if self.sync_engine:
+            self.sync_engine.enqueue(record)
+    
+    def _enforce_history_limits(self):
+        """Move old messages to the cold tier and cap the total kept in memory
+
+        Called with the history lock held.
+        """
+        hot = self.config.get('chat.hot_messages', 200)
+        # Evict a block's worth at a time rather than one message per send
+        if len(self.conversation) > hot + self.cold_history.block_size:
+            self.cold_history.extend(self.conversation.trim(hot))
+        
+        # Older messages remain on disk; only the in-memory history is capped
+        excess = self.message_count() - self.config.get('chat.max_history', 10000)
+        if excess > 0:
+            self.cold_history.drop_oldest(excess)
+    
+    def _build_retrieval_index(self, cutoff: Optional[int] = None):
+        """Index stored prompt/reply pairs up to cutoff (a history file offset)"""
+        started = time.perf_counter()
+        try:
+            self.retrieval.build(
+                (prompt, record.get("content", ""))
+                for prompt, record in self.history_store.iter_pairs(cutoff)
+                if self._is_indexable(record.get("provider"))
+            )
+            self.metrics.observe('retrieval.build_ms', (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            log.exception("Error building retrieval index: %s", e)
+    
+    @staticmethod
+    def _is_indexable(provider: Optional[str]) -> bool:
+        """Only replies from real models are worth retrieving later"""
+        return bool(provider) and provider not in ('mock', 'offline', 'replay')
     
     def authenticate_email(self, email: str, password: str) -> bool:
         """Authenticate user with email and password"""
@@ -65,153 +266,751 @@ class AppController:
             
             # In a real app, you'd open browser and handle OAuth flow
             # For demo, we'll just simulate success
-            print("Opening Microsoft authentication (simulated)...")
+            log.info("Opening Microsoft authentication (simulated)...")
             time.sleep(2)  # Simulate auth time
             
             return "user@microsoft.com"  # Mock successful auth
             
         except Exception as e:
-            print(f"Microsoft auth error: {e}")
+            log.error("Microsoft auth error: %s", e)
             return None
     
-    def send_message_to_ai(self, message: str, callback: Callable[[str], None]):
-        """Send message to AI API and handle response"""
+    def send_message_to_ai(self, message: str, callback: Callable[[str], None],
+                           on_chunk: Optional[Callable[[str], None]] = None,
+                           interactive: bool = True,
+                           attachments: Optional[List[Attachment]] = None,
+                           on_queued: Optional[Callable[[], None]] = None,
+                           conversation_id: Optional[str] = None) -> Generation:
+        """Send message to AI API and handle response
+
+        Returns a Generation handle that can be passed to cancel_generation().
+        The callback is not invoked for a generation that has been cancelled.
+        Non-interactive sends (IPC, background jobs) run alongside the chat
+        window's request without taking its typing slot. With a
+        conversation_id the exchange is sent without chat history and stored
+        under that conversation, like run_background_prompt, instead of on
+        the chat's active branch.
+
+        Interactive sends that can't reach the provider are queued durably
+        (on_queued is called instead of callback) and answered on reconnect.
+        """
+        generation = Generation(message)
+        user_msg = Message(
+            id=uuid.uuid4().hex,
+            content=message,
+            sender='user',
+            timestamp=datetime.now(),
+            attachments=list(attachments or [])
+        )
+        generation.user_message = user_msg
+        generation.conversation_id = conversation_id
+
+        with self._generation_lock:
+            self.active_generations.add(generation)
+            if interactive:
+                self.current_generation = generation
+                self.is_typing = True
+        if interactive:
+            self.snippets.record_prompt(message)
+
+        def emit(chunk: str):
+            generation.check_cancelled()
+            generation.partial_chunks.append(chunk)
+            if on_chunk:
+                on_chunk(chunk)
+
+        queueable = interactive and self.outbound is not None
+
         def ai_request():
+            started = time.perf_counter()
             try:
-                self.is_typing = True
-                
+                if queueable and self._should_queue():
+                    # Stay in line behind sends still waiting for the network
+                    self._queue_send(generation, on_queued, recorded=False)
+                    return
+
+                context = self.build_context(message, history=[] if conversation_id else None,
+                                             attachments=user_msg.attachments)
+
                 # Add user message
-                user_msg = Message(
-                    id=str(int(time.time() * 1000)),
-                    content=message,
-                    sender='user',
-                    timestamp=datetime.now()
-                )
-                self.messages.append(user_msg)
-                self.notify_message_callbacks(user_msg)
-                
-                # Simulate AI processing time
-                time.sleep(1 + len(message) * 0.01)  # Realistic typing delay
-                
-                # Generate AI response (mock)
-                ai_response = self.generate_ai_response(message)
-                
+                if conversation_id:
+                    self._store_detached(conversation_id, user_msg)
+                else:
+                    if interactive:
+                        self._latest_prompt_id = user_msg.id
+                    self._record_message(user_msg)
+
+                self.call_real_ai_api(message, generation, emit, context, offline_fallback=not queueable)
+
+                ai_response = generation.partial_text
+                generation.check_cancelled()
+
                 # Add AI message
                 ai_msg = Message(
-                    id=str(int(time.time() * 1000) + 1),
+                    id=uuid.uuid4().hex,
                     content=ai_response,
                     sender='ai',
                     timestamp=datetime.now()
                 )
-                self.messages.append(ai_msg)
-                self.notify_message_callbacks(ai_msg)
-                
-                self.is_typing = False
+                if conversation_id:
+                    self._store_detached(conversation_id, ai_msg, generation.provider_name, user_msg.id)
+                else:
+                    self._record_message(ai_msg, generation.provider_name, reply_to=user_msg.id)
+                if self._is_indexable(generation.provider_name):
+                    self.retrieval.add(message, ai_response)
+
+                self._finish_generation(generation)
+                self.metrics.increment('generation.completed')
+                self.metrics.observe('generation.total_ms', (time.perf_counter() - started) * 1000)
                 callback(ai_response)
-                
+
+            except GenerationCancelled:
+                self._record_cancellation(generation)
+
             except Exception as e:
-                self.is_typing = False
+                if generation.cancelled:
+                    # Closing the response mid-read surfaces as a network error
+                    self._record_cancellation(generation)
+                    return
+
+                if isinstance(e, NetworkError) and queueable and not generation.partial_chunks:
+                    self._queue_send(generation, on_queued, recorded=user_msg.id in self.conversation)
+                    return
+
+                self._finish_generation(generation)
+                self.metrics.increment('generation.failed')
                 error_msg = f"Sorry, I encountered an error: {str(e)}"
-                
+
                 ai_msg = Message(
-                    id=str(int(time.time() * 1000) + 1),
+                    id=uuid.uuid4().hex,
                     content=error_msg,
                     sender='ai',
                     timestamp=datetime.now()
                 )
-                self.messages.append(ai_msg)
-                self.notify_message_callbacks(ai_msg)
-                
+                if user_msg.id in self.conversation:
+                    self._record_message(ai_msg, persist=False, reply_to=user_msg.id)
+
                 callback(error_msg)
-        
+
         # Run in separate thread to avoid blocking UI
-        threading.Thread(target=ai_request, daemon=True).start()
-    
-    def generate_ai_response(self, user_message: str) -> str:
-        """Generate AI response (mock implementation)"""
-        user_message_lower = user_message.lower()
-        
-        # Context-aware responses
-        if any(word in user_message_lower for word in ['hello', 'hi', 'hey']):
-            return "Hello! I'm your AI assistant. How can I help you today?"
-        
-        elif 'help' in user_message_lower:
-            return ("I'm here to help! I can assist with various topics like answering questions, "
-                   "brainstorming ideas, explaining concepts, or just having a conversation. "
-                   "What would you like to discuss?")
-        
-        elif 'weather' in user_message_lower:
-            return ("I don't have access to real-time weather data, but I'd recommend checking "
-                   "a weather app or website for current conditions. Is there anything else I can help with?")
-        
-        elif 'python' in user_message_lower:
-            return ("Python is a great programming language! It's known for its simplicity and readability. "
-                   "Are you working on a specific Python project or have questions about Python development?")
-        
-        elif 'thank' in user_message_lower:
-            return "You're welcome! Is there anything else I can help you with?"
+        threading.Thread(target=ai_request, name="ai-request", daemon=True).start()
+        return generation
+
+    def _should_queue(self) -> bool:
+        """Whether a new send should go straight to the outbound queue"""
+        outbound = self.outbound
+        return outbound is not None and (not outbound.online or self.outbox.count(self.conversation_id) > 0)
+
+    def _queue_send(self, generation: Generation, on_queued: Optional[Callable[[], None]],
+                    recorded: bool):
+        """Park a send in the outbox until the provider is reachable again"""
+        user_msg = generation.user_message
+        self.outbox.add(QueuedSend(user_msg.id, self.conversation_id, user_msg.content, user_msg.timestamp,
+                                   user_msg.attachments, self.conversation.head_id, recorded))
+        self._finish_generation(generation)
+        self.metrics.increment('outbox.queued')
+        outbound = self.outbound
+        if outbound is not None:
+            if recorded:
+                outbound.report_offline()
+            else:
+                outbound.wake()
+        if on_queued:
+            on_queued()
+
+    def deliver_queued(self, item: QueuedSend) -> Optional[str]:
+        """Send a queued prompt and record the reply (blocking)
+
+        Raises NetworkError if the provider is still unreachable. Returns
+        None if the prompt was already answered, live or in stored history
+        (a conversation that isn't loaded, or is still being resumed).
+        """
+        node = self.conversation.nodes.get(item.key)
+        if node is not None and any(child.message.sender == 'ai'
+                                    for child in self.conversation.children.get(item.key, [])):
+            return None
+        stored = False
+        if self.config.get('chat.persist_history', True):
+            stored, answered = self.history_store.message_status(item.key)
+            if answered:
+                return None
+
+        user_msg = Message(id=item.key, content=item.content, sender='user', timestamp=item.created,
+                           attachments=item.attachments)
+        generation = Generation(item.content)
+        generation.user_message = user_msg
+        with self._generation_lock:
+            self.active_generations.add(generation)
+        active = item.conversation_id == self.conversation_id
+        in_tree = item.key in self.conversation
+        try:
+            if not active:
+                history = []
+            elif in_tree:
+                # Everything on the branch before the prompt itself
+                path = self.conversation.path()
+                ids = [message.id for message in path]
+                history = HistoryView(self.cold_history, path[:ids.index(item.key)]) if item.key in ids else []
+            else:
+                history = None
+            context = self.build_context(item.content, history, item.attachments)
+            if active and not in_tree:
+                # A failed earlier attempt may have stored it already
+                self._record_message(user_msg, persist=not stored)
+                self.outbox.mark_recorded(item.key)
+
+            response = self.call_real_ai_api(item.content, generation, context=context, offline_fallback=False)
+        finally:
+            self._finish_generation(generation)
+
+        ai_msg = Message(id=uuid.uuid4().hex, content=response, sender='ai', timestamp=datetime.now())
+        if active:
+            self._record_message(ai_msg, generation.provider_name, reply_to=user_msg.id)
+        elif self.config.get('chat.persist_history', True):
+            # The conversation was switched away from; add the exchange to its stored history
+            if not item.recorded and not stored:
+                self.history_store.append(user_msg, item.conversation_id, parent_id=item.parent_id)
+            self.history_store.append(ai_msg, item.conversation_id, generation.provider_name, user_msg.id)
+        if self._is_indexable(generation.provider_name):
+            self.retrieval.add(item.content, response)
+        return response
+
+    def run_background_prompt(self, message: str, conversation_id: str) -> str:
+        """Answer a prompt outside the chat conversation (blocking)
+
+        For scheduled jobs: no chat history is sent and the exchange is stored
+        under its own conversation id instead of joining the active branch.
+        """
+        generation = Generation(message)
+        context = self.build_context(message, history=[])
+        response = self.call_real_ai_api(message, generation, context=context)
         
-        else:
-            # Generic responses
-            responses = [
-                "That's an interesting question! Let me help you with that.",
-                "I understand what you're asking. Here's my perspective on it:",
-                "Great point! I can provide some insights about this topic.",
-                "I'd be happy to help you explore this further.",
-                "That's a thoughtful query. Let me break this down for you:",
-                "I can definitely assist with that. Here's what I think:",
-            ]
-            
-            import random
-            base_response = random.choice(responses)
-            
-            return f"{base_response}\n\nYou mentioned: \"{user_message}\"\n\nThis is a mock response from the Python desktop application. In a production environment, this would be powered by a real AI API like OpenAI's GPT, Anthropic's Claude, or similar services."
+        user_msg = Message(id=uuid.uuid4().hex, content=message, sender='user', timestamp=datetime.now())
+        ai_msg = Message(id=uuid.uuid4().hex, content=response, sender='ai', timestamp=datetime.now())
+        self._store_detached(conversation_id, user_msg)
+        self._store_detached(conversation_id, ai_msg, generation.provider_name, user_msg.id)
+        return response
+
+    def cancel_generation(self, generation: Optional[Generation] = None) -> str:
+        """Stop an in-flight generation and return the partial text received so far
+
+        The typing slot is released immediately; the worker thread notices the
+        cancellation on its next chunk (or when its connection is closed).
+        """
+        generation = generation or self.current_generation
+        if generation is None or generation not in self.active_generations:
+            # Already finished (or stopped); nothing left to abort
+            return ""
+
+        generation.cancel()
+        # What the caller shows is what gets recorded, even if a chunk was in flight
+        generation.stopped_text = generation.partial_text
+        self._finish_generation(generation)
+        self.metrics.increment('generation.cancelled')
+        return generation.stopped_text
+
+    def _finish_generation(self, generation: Generation):
+        """Release the typing slot if this generation still owns it"""
+        with self._generation_lock:
+            self.active_generations.discard(generation)
+            if self.current_generation is generation:
+                self.current_generation = None
+                self.is_typing = False
+
+    def _record_cancellation(self, generation: Generation):
+        """Keep partial output as the prompt's reply and report how long the worker took to stop"""
+        self._finish_generation(generation)
+        if generation.cancel_requested_at is not None:
+            latency_ms = (time.perf_counter() - generation.cancel_requested_at) * 1000
+            self.metrics.observe('generation.cancel_latency_ms', latency_ms)
+
+        partial = generation.stopped_text if generation.stopped_text is not None else generation.partial_text
+        if partial:
+            ai_msg = Message(
+                id=uuid.uuid4().hex,
+                content=partial,
+                sender='ai',
+                timestamp=datetime.now()
+            )
+            if generation.conversation_id:
+                self._store_detached(generation.conversation_id, ai_msg, generation.provider_name,
+                                     generation.user_message.id)
+            elif generation.user_message.id in self.conversation:
+                self._record_message(ai_msg, generation.provider_name, reply_to=generation.user_message.id)
+
+    def generate_ai_response(self, user_message: str) -> str:
+        """Generate AI response (mock implementation)
+
+        Answers from past real-model replies when the offline index has a
+        confident match, otherwise from the mock rules (mock.rules_file).
+        """
+        if self.config.get('retrieval.enabled', True):
+            started = time.perf_counter()
+            match = self.retrieval.lookup(user_message, self.config.get('retrieval.min_score', 0.35))
+            self.metrics.observe('retrieval.lookup_ms', (time.perf_counter() - started) * 1000)
+            if match:
+                self.metrics.increment('retrieval.hits')
+                return match[0]
+
+        return self.mock_responder.respond(user_message)
     
-    def call_real_ai_api(self, message: str) -> str:
-        """Call real AI API (example implementation)"""
-        if not self.api_key:
-            raise Exception("API key not configured")
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "gpt-3.5-turbo",
-            "messages": [
-                {"role": "system", "content": "You are a helpful AI assistant."},
-                {"role": "user", "content": message}
-            ],
-            "max_tokens": 500,
-            "temperature": 0.7
-        }
-        
+    def create_target_provider(self, name: str, model: str) -> BaseProvider:
+        """Create a standalone adapter for a provider/model pair
+
+        Uses the ai.* settings otherwise; the caller closes it when done.
+        """
+        settings = dict(self.config.get('ai', {}))
+        if self.api_key:
+            settings['api_key'] = self.api_key
+        settings['api_provider'] = name
+        if model:
+            settings['model'] = model
+        kwargs = self._mock_kwargs() if name == 'mock' else {}
+        return create_provider(name, settings, **kwargs)
+    
+    def compare_models(self, message: str, targets: List[str],
+                       on_chunk: Optional[Callable] = None, on_done: Optional[Callable] = None):
+        """Send one prompt to several "provider:model" targets concurrently
+
+        Returns the started CompareRun. Nothing is added to the conversation
+        unless a reply is kept with keep_comparison().
+        """
+        from .compare import CompareRun, CompareTarget
+
+        default_provider = self.config.get('ai.api_provider', 'mock')
+        parsed = [CompareTarget.parse(spec, default_provider) for spec in targets if spec.strip()]
+        return CompareRun(self, message, parsed, on_chunk, on_done).start()
+    
+    def keep_comparison(self, message: str, reply: str, provider: Optional[str] = None):
+        """Add a compared prompt and the chosen reply to the conversation"""
+        user_msg = Message(id=uuid.uuid4().hex, content=message, sender='user', timestamp=datetime.now())
+        ai_msg = Message(id=uuid.uuid4().hex, content=reply, sender='ai', timestamp=datetime.now())
+        self._record_message(user_msg)
+        self._record_message(ai_msg, provider, reply_to=user_msg.id)
+        return user_msg, ai_msg
+    
+    def get_provider(self) -> BaseProvider:
+        """Get the adapter for the configured provider
+
+        The adapter is (re)created whenever the relevant ai.* settings change,
+        so switching providers in settings takes effect on the next request.
+        """
+        settings = dict(self.config.get('ai', {}))
+        if self.api_key:
+            settings['api_key'] = self.api_key
+        name = settings.get('api_provider', 'mock')
+        key = (name, settings.get('model'), settings.get('max_tokens'),
+               settings.get('temperature'), settings.get('api_key'),
+               settings.get('base_url'), settings.get('trace_file'), settings.get('replay_speed'),
+               tuple(sorted(self.config.get('mock', {}).items())) if name == 'mock' else None)
+
+        with self._provider_lock:
+            if self._provider is None or self._provider_key != key:
+                if self._provider is not None:
+                    self._provider.close()
+                kwargs = self._mock_kwargs() if name == 'mock' else {}
+                self._provider = create_provider(name, settings, **kwargs)
+                self._provider_key = key
+            return self._provider
+
+    def _mock_kwargs(self) -> Dict[str, Any]:
+        """Mock adapter arguments: the rule-based responder and latency settings"""
+        return {'responder': self.generate_ai_response, 'latency': self.config.get('mock', {})}
+
+    def build_context(self, message: str, history: Optional[List[Message]] = None,
+                      attachments: Optional[List[Attachment]] = None,
+                      provider: Optional[BaseProvider] = None) -> List[Dict[str, str]]:
+        """Build the provider message list for a new user message
+
+        Includes as much recent history as fits in the provider's context
+        window (the configured provider's unless one is given) after
+        reserving room for the response.
+        """
+        provider = provider or self.get_provider()
+        if history is None:
+            newest_first = chain(self.conversation.iter_path_reversed(), self.cold_history.iter_reversed())
+        else:
+            newest_first = reversed(history)
+        prompt = self.prompt_content(message, attachments)
+        budget = (provider.capabilities.max_context - provider.max_tokens
+                  - provider.count_tokens(self.SYSTEM_PROMPT) - provider.count_tokens(prompt))
+
+        turns = []
+        for past in newest_first:
+            content = self.prompt_content(past.content, past.attachments)
+            cost = provider.count_tokens(content)
+            if cost > budget:
+                break
+            budget -= cost
+            turns.append({"role": "user" if past.sender == 'user' else "assistant",
+                          "content": content})
+        turns.reverse()
+
+        return ([{"role": "system", "content": self.SYSTEM_PROMPT}] + turns
+                + [{"role": "user", "content": prompt}])
+
+    def prompt_content(self, text: str, attachments: Optional[List[Attachment]] = None) -> str:
+        """Message text with its attachments as the provider sees them"""
+        if not attachments:
+            return text
+        inline_bytes = self.config.get('attachments.inline_bytes', 32768)
+        parts = [text] if text else []
+        parts.extend(self.blob_store.prompt_text(attachment, inline_bytes) for attachment in attachments)
+        return "\n\n".join(parts)
+
+    def add_attachment(self, path: str, callback: Callable[[Attachment], None],
+                       on_error: Optional[Callable[[str], None]] = None):
+        """Import a file into the blob store on a worker thread
+
+        The callback receives the Attachment (on the worker thread) once the
+        file has been hashed and stored.
+        """
+        def import_file():
+            started = time.perf_counter()
+            try:
+                attachment = self.blob_store.add(path)
+            except OSError as e:
+                log.error("Error attaching %s: %s", path, e)
+                if on_error:
+                    on_error(str(e))
+                return
+            self.metrics.observe('attachments.import_ms', (time.perf_counter() - started) * 1000)
+            callback(attachment)
+
+        threading.Thread(target=import_file, name="attachment-import", daemon=True).start()
+
+    def call_real_ai_api(self, message: str, generation: Optional[Generation] = None,
+                         emit: Optional[Callable[[str], None]] = None,
+                         context: Optional[List[Dict[str, str]]] = None,
+                         offline_fallback: Optional[bool] = None) -> str:
+        """Call the configured AI provider
+
+        Streams the completion so that a Generation can abort it mid-response;
+        each content delta is passed to emit as it arrives. If the provider
+        can't be reached, answers offline when offline_fallback allows it
+        (retrieval.offline_fallback by default).
+        """
+        provider = self.get_provider()
+        if context is None:
+            context = self.build_context(message)
+
+        chunks = []
+        if generation:
+            generation.provider_name = provider.name
+        capture = self._start_trace(provider, context)
+        tools = self.offered_tools(provider)
+        max_steps = self.config.get('tools.max_steps', 5)
+        steps = 0
+        usage = []
+        exchange = {"status": 'error', "ttft_ms": None, "tool_ms": 0.0}
+        request_context = context
+        started = time.perf_counter()
         try:
-            response = requests.post(
-                f"{self.api_base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result['choices'][0]['message']['content']
-            else:
-                raise Exception(f"API error: {response.status_code}")
-                
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Network error: {str(e)}")
+            while True:
+                # The last step offers no tools, so the model has to answer
+                offer = tools if steps < max_steps else None
+                calls = []
+                turn_start = len(chunks)
+                for chunk in provider.stream_turn(context, offer, generation):
+                    if isinstance(chunk, ToolCall):
+                        calls.append(chunk)
+                        continue
+                    if isinstance(chunk, Usage):
+                        usage.append(chunk)
+                        continue
+                    if not chunks:
+                        exchange["ttft_ms"] = (time.perf_counter() - started) * 1000
+                        self.metrics.observe('generation.ttft_ms', exchange["ttft_ms"])
+                    chunks.append(chunk)
+                    if capture:
+                        capture.chunk(chunk)
+                    if emit:
+                        emit(chunk)
+                if not calls:
+                    break
+                steps += 1
+                log.info("Running tools: %s", ", ".join(call.name for call in calls))
+                tools_started = time.perf_counter()
+                results = self.get_tool_executor().run(calls, self.config.get('tools.allowed') or None,
+                                                       generation)
+                exchange["tool_ms"] += (time.perf_counter() - tools_started) * 1000
+                context = context + provider.tool_messages(''.join(chunks[turn_start:]), calls, results)
+        except GenerationCancelled:
+            exchange["status"] = 'cancelled'
+            if capture:
+                capture.finish("cancelled")
+            raise
+        except NetworkError as e:
+            if capture:
+                cancelled = generation is not None and generation.cancelled
+                capture.finish("cancelled" if cancelled else "error", str(e))
+            if offline_fallback is None:
+                offline_fallback = self.config.get('retrieval.offline_fallback', True)
+            if chunks or not offline_fallback:
+                raise
+            # No network: answer from the offline responder instead of failing
+            self.record_usage(provider, request_context, chunks, usage, exchange, started, generation)
+            exchange = None
+            self.metrics.increment('generation.offline_fallback')
+            if generation:
+                generation.provider_name = 'offline'
+            response = self.generate_ai_response(message)
+            chunks.append(response)
+            if emit:
+                emit(response)
+        else:
+            exchange["status"] = 'ok'
+            if capture:
+                capture.finish()
+        finally:
+            if exchange is not None:
+                self.record_usage(provider, request_context, chunks, usage, exchange, started, generation)
+
+        return ''.join(chunks)
+
+    def record_usage(self, provider: BaseProvider, context: List[Dict[str, Any]], chunks: List[str],
+                     usage: List[Usage], exchange: Dict[str, Any], started: float,
+                     generation: Optional[Generation] = None):
+        """Add an exchange's tokens and timings to the usage rollups
+
+        Token counts the provider didn't report are estimated with its tokenizer.
+        """
+        if self.analytics is None:
+            return
+        status = exchange["status"]
+        if status == 'error' and generation is not None and generation.cancelled:
+            # Closing the response on Stop surfaces as an error
+            status = 'cancelled'
+        if usage:
+            prompt_tokens = sum(turn.prompt_tokens for turn in usage)
+            completion_tokens = sum(turn.completion_tokens for turn in usage)
+        elif chunks or status == 'ok':
+            prompt_tokens = sum(provider.count_tokens(str(message.get('content') or '')) for message in context)
+            completion_tokens = provider.count_tokens(''.join(chunks)) if chunks else 0
+        else:
+            prompt_tokens = completion_tokens = 0
+        model = f"{provider.name}:{provider.model}" if self._is_indexable(provider.name) and provider.model \
+            else provider.name
+        try:
+            self.analytics.record(self.user_id or 'local', model, prompt_tokens, completion_tokens,
+                                  total_ms=(time.perf_counter() - started) * 1000,
+                                  ttft_ms=exchange.get("ttft_ms"), tool_ms=exchange.get("tool_ms", 0.0),
+                                  status=status, estimated=not usage and bool(prompt_tokens))
+        except Exception as e:
+            log.error("Error recording usage: %s", e)
+
+    def offered_tools(self, provider: BaseProvider) -> Optional[list]:
+        """Tool definitions to send with a request, or None when tools are off"""
+        if not self.config.get('tools.enabled', False) or not provider.capabilities.tools:
+            return None
+        allowed = self.config.get('tools.allowed') or list(TOOL_REGISTRY)
+        return provider.format_tools([TOOL_REGISTRY[name] for name in allowed if name in TOOL_REGISTRY])
+
+    def get_tool_executor(self) -> ToolExecutor:
+        """The shared tool process pool, created on first use"""
+        with self._tool_lock:
+            if self.tool_executor is None:
+                self.tool_executor = ToolExecutor(workers=self.config.get('tools.workers', 4),
+                                                  timeout=self.config.get('tools.timeout', 10),
+                                                  memory_mb=self.config.get('tools.memory_mb', 256),
+                                                  cache_ttl=self.config.get('tools.cache_ttl', 60),
+                                                  roots=self.config.get('tools.search_roots', DEFAULT_ROOTS),
+                                                  metrics=self.metrics)
+            return self.tool_executor
+
+    def _start_trace(self, provider: BaseProvider, context: List[Dict[str, str]]):
+        """Begin capturing an exchange when ai.trace_mode is set to capture"""
+        if self.config.get('ai.trace_mode', 'off') != 'capture' or provider.name == 'replay':
+            return None
+        if self.tracer is None:
+            self.tracer = TraceRecorder()
+            log.info("Capturing provider traces to %s", self.tracer.path)
+        return self.tracer.start(provider, context)
+
+    def get_message_history(self) -> HistoryView:
+        """Get chat message history (the active branch)
+
+        Cold messages are decompressed only when indexed or sliced.
+        """
+        return self.messages
+    
+    def message_count(self) -> int:
+        """Number of messages on the active branch"""
+        return len(self.cold_history) + self.conversation.depth
     
-    def get_message_history(self) -> list[Message]:
-        """Get chat message history"""
-        return self.messages.copy()
+    def trim_history(self, keep: int):
+        """Drop all but the most recent messages of the active branch from memory"""
+        with self._history_lock:
+            self.cold_history.clear()
+            if len(self.conversation) > keep:
+                self.conversation.trim(keep)
+    
+    def branch_from(self, message_id: str) -> bool:
+        """Prepare to edit a message: the next message sent becomes its new version"""
+        return self.conversation.rewind(message_id)
+    
+    def message_versions(self, message_id: str) -> List[str]:
+        """Ids of a message and its alternative versions, oldest first"""
+        return self.conversation.siblings(message_id)
+    
+    def switch_branch(self, message_id: str) -> bool:
+        """Make the branch through a message version active"""
+        return self.conversation.switch_to(message_id)
     
     def clear_message_history(self):
         """Clear chat message history"""
-        self.messages.clear()
+        with self._history_lock:
+            self.conversation = ConversationTree()
+            self.cold_history.clear()
+        # Start a new conversation; stored history stays available for retrieval
+        self.conversation_id = uuid.uuid4().hex
+    
+    def resume_conversation(self, conversation_id: str, callback: Callable[[List[Message]], None],
+                            head_id: Optional[str] = None):
+        """Continue a stored conversation
+
+        New messages join it right away, after head_id. Its stored tree is
+        loaded on a worker thread, any messages sent in the meantime are
+        moved on top of it, and a view of the stored part of the active
+        branch is passed to the callback (oldest first).
+        """
+        self.conversation_id = conversation_id
+        self._resume_parent_id = head_id
+
+        def load():
+            started = time.perf_counter()
+            loaded = ConversationTree()
+            try:
+                previous_id = None
+                for record in self.history_store.iter_records():
+                    if record.get("conversation_id") != conversation_id:
+                        continue
+                    message = Message(
+                        id=record.get("id", ""),
+                        content=record.get("content", ""),
+                        sender=record.get("sender", "ai"),
+                        timestamp=datetime.fromisoformat(record["timestamp"]),
+                        attachments=[Attachment.from_dict(data) for data in record.get("attachments", [])]
+                    )
+                    # Records from before branching existed form a single chain
+                    loaded.add(message, record["parent_id"] if "parent_id" in record else previous_id)
+                    previous_id = message.id
+            except (OSError, KeyError, ValueError) as e:
+                log.error("Error loading conversation history: %s", e)
+
+            if head_id in loaded:
+                loaded.switch_to(head_id)
+
+            with self._history_lock:
+                # Messages sent while loading may already be on disk
+                meanwhile = self.conversation.path()
+                known = {message.id for message in meanwhile}
+                stored = [message for message in loaded.path() if message.id not in known]
+                for message in meanwhile:
+                    if message.id not in loaded:
+                        loaded.append(message)
+                self.conversation = loaded
+                self.cold_history.clear()
+                self._resume_parent_id = None
+                self._enforce_history_limits()
+
+            self.metrics.observe('history.load_ms', (time.perf_counter() - started) * 1000)
+            callback(HistoryView(self.cold_history, self.conversation.path(), limit=len(stored)))
+
+        threading.Thread(target=load, name="history-load", daemon=True).start()
     
+    def start_sync(self, user_id: str):
+        """Start background history sync for a signed-in user"""
+        if self.sync_engine or not self.config.get('sync.enabled', False):
+            return
+
+        endpoint = self.config.get('sync.endpoint', '')
+        access_token = self.config.get('sync.access_token', '')
+        refresh_token = self.config.get('sync.refresh_token', '')
+        if not endpoint or not (access_token or refresh_token):
+            log.warning("Sync enabled but sync.endpoint or the sync session tokens are not configured")
+            return
+
+        from .sync_engine import SyncEngine, SyncSession, HttpKvTransport
+
+        api_key = self.config.get('sync.api_key', '')
+        # https://<project>.supabase.co/functions/v1/... -> https://<project>.supabase.co/auth/v1
+        auth_url = self.config.get('sync.auth_url', '') or endpoint.split('/functions/')[0] + '/auth/v1'
+        session = SyncSession(auth_url, api_key, access_token, refresh_token, on_refresh=self._save_sync_tokens)
+        transport = HttpKvTransport(endpoint, api_key, session)
+        merge = self._merge_remote_history if self.config.get('chat.persist_history', True) else None
+        self._known_message_ids = None
+        self.sync_engine = SyncEngine(transport, user_id, blob_store=self.blob_store,
+                                      batch_size=self.config.get('sync.batch_size', 50),
+                                      interval=self.config.get('sync.interval', 5),
+                                      max_backoff=self.config.get('sync.max_backoff', 300),
+                                      pull_interval=self.config.get('sync.pull_interval', 60),
+                                      on_pull=merge)
+        self.sync_engine.start()
+
+    def _merge_remote_history(self, history: Dict[str, List[Dict[str, Any]]]):
+        """Store messages synced from other machines (on the sync thread)
+
+        They are appended to the history file, so they show up when their
+        conversation is opened; messages already stored here are skipped.
+        """
+        if self._known_message_ids is None:
+            self._known_message_ids = {record.get("id") for record in self.history_store.iter_records()}
+        added = 0
+        for records in history.values():
+            for record in records:
+                if record.get("id") not in self._known_message_ids:
+                    self.history_store.append_record(record)
+                    self._known_message_ids.add(record.get("id"))
+                    added += 1
+        if added:
+            log.info("Merged %d message(s) from other machines", added)
+            self.metrics.increment('sync.merged', added)
+
+    def _save_sync_tokens(self, access_token: str, refresh_token: str):
+        """Keep the rotated session tokens; the old refresh token is now spent"""
+        self.config.set('sync.access_token', access_token, save=False)
+        self.config.set('sync.refresh_token', refresh_token)
+
+    def stop_sync(self):
+        """Stop background sync; the final push finishes on the sync thread"""
+        if self.sync_engine:
+            self.sync_engine.stop()
+            self._stopped_sync, self.sync_engine = self.sync_engine, None
+
+    def wait_for_sync(self, timeout: float = 5):
+        """Give a stopped sync thread time for its final push (at exit, once the UI is gone)"""
+        engine, self._stopped_sync = self._stopped_sync, None
+        if engine:
+            engine.join(timeout)
+
+    def end_session(self):
+        """Finish per-session diagnostics on sign-out or quit"""
+        output = self.profiler.stop()
+        if output:
+            log.info("Profile saved to %s", output)
+        tracer, self.tracer = self.tracer, None
+        if tracer is not None:
+            tracer.close()
+            log.info("Trace saved to %s", tracer.path)
+
+    def start_outbound(self, on_delivered: Optional[Callable] = None):
+        """Start flushing sends queued while offline, including ones from earlier sessions"""
+        if self.outbound or not self.config.get('outbox.enabled', True):
+            return
+        self.outbound = OutboundQueue(self, self.outbox, on_delivered,
+                                      probe_interval=self.config.get('outbox.probe_interval', 5),
+                                      max_backoff=self.config.get('outbox.max_backoff', 120),
+                                      max_concurrent=self.config.get('outbox.max_concurrent', 2))
+        self.outbound.start()
+
+    def stop_outbound(self):
+        """Stop flushing; queued sends stay on disk for the next sign-in"""
+        if self.outbound:
+            self.outbound.stop()
+            self.outbound = None
+
     def set_api_key(self, api_key: str):
         """Set AI API key"""
-        self.api_key = api_key
\ No newline at end of file
+        self.api_key = api_key
+        self.config.api_key = api_key
\ No newline at end of file
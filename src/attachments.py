@@ -0,0 +1,241 @@
+"""
+Attachments
+Files attached to chat messages. Each file is stored once in a
+content-addressed blob store under ``~/.ai_chat_app/blobs``, keyed by the
+SHA-256 of its contents, so attaching the same file twice costs nothing.
+
+Files are hashed while they are copied into the store, in a single pass
+of fixed-size chunks, so even very large attachments are read once and
+never held in memory whole. Image thumbnails are rendered in a small process pool and
+cached on disk by digest.
+"""
+
+import hashlib
+import mimetypes
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, BinaryIO, Optional, Tuple
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from .logger import get_logger
+
+log = get_logger('attachments')
+
+APP_DIR = Path.home() / ".ai_chat_app"
+CHUNK_SIZE = 1 << 20
+
+IMAGE_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/bmp', 'image/webp'}
+# Non-text/* types whose contents are still worth showing to the model
+TEXT_TYPES = {'application/json', 'application/xml', 'application/javascript',
+              'application/x-sh', 'application/x-yaml', 'application/toml'}
+UNKNOWN_TYPE = 'application/octet-stream'
+
+
+def format_size(size: int) -> str:
+    """Human-readable file size"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def copy_hashed(source: Path, target: Path, chunk_size: int = CHUNK_SIZE) -> Tuple[str, int]:
+    """Copy a file, returning the SHA-256 hex digest and size of what was copied"""
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray(chunk_size)
+    with memoryview(buffer) as view, open(source, 'rb') as src, open(target, 'wb') as dst:
+        while True:
+            read = src.readinto(buffer)
+            if not read:
+                break
+            chunk = view[:read]
+            digest.update(chunk)
+            dst.write(chunk)
+            size += read
+    return digest.hexdigest(), size
+
+
+@lru_cache(maxsize=32)
+def _read_text(path: str, max_bytes: int) -> Optional[str]:
+    # Blobs never change once written, so caching by path is safe
+    with open(path, 'rb') as f:
+        data = f.read(max_bytes)
+    if b'\x00' in data:
+        return None
+    return data.decode('utf-8', errors='replace')
+
+
+@dataclass(frozen=True)
+class Attachment:
+    digest: str
+    name: str
+    size: int
+    mime: str
+
+    @property
+    def is_image(self) -> bool:
+        return self.mime in IMAGE_TYPES
+
+    @property
+    def is_text(self) -> bool:
+        return self.mime.startswith('text/') or self.mime in TEXT_TYPES
+
+    @property
+    def label(self) -> str:
+        return f"📎 {self.name} ({format_size(self.size)})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Attachment':
+        return cls(data["digest"], data.get("name", data["digest"][:12]),
+                   data.get("size", 0), data.get("mime", UNKNOWN_TYPE))
+
+
+class BlobStore:
+    def __init__(self, root: Optional[Path] = None):
+        self.root = root or APP_DIR / "blobs"
+        self.imported = 0
+        self.deduplicated = 0
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def __contains__(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def add(self, source: Path) -> Attachment:
+        """Store a file (if its contents aren't stored yet) and describe it
+
+        Runs for as long as hashing and copying the file take, so call it
+        off the Tk thread.
+        """
+        source = Path(source)
+        # The digest isn't known until the copy is done, so copy to a temp name first
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp = self.root / f"import-{os.getpid()}-{threading.get_ident()}.part"
+        try:
+            digest, size = copy_hashed(source, temp)
+            target = self.path_for(digest)
+            if target.exists():
+                self.deduplicated += 1
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp, target)
+                self.imported += 1
+        finally:
+            temp.unlink(missing_ok=True)
+
+        mime = mimetypes.guess_type(source.name)[0] or UNKNOWN_TYPE
+        return Attachment(digest, source.name, size, mime)
+
+    def open(self, digest: str) -> BinaryIO:
+        """Open a stored blob for streaming"""
+        return open(self.path_for(digest), 'rb')
+
+    def prompt_text(self, attachment: Attachment, max_bytes: int = 32768) -> str:
+        """How an attachment is shown to the model
+
+        Text files are inlined up to max_bytes; anything else is described
+        by name, type and size.
+        """
+        text = None
+        if attachment.is_text or attachment.mime == UNKNOWN_TYPE:
+            try:
+                text = _read_text(str(self.path_for(attachment.digest)), max_bytes)
+            except OSError as e:
+                log.warning("Attachment %s unreadable: %s", attachment.name, e)
+
+        if text is None:
+            return f"[Attached {attachment.mime}: {attachment.name}, {format_size(attachment.size)}]"
+        note = " (truncated)" if attachment.size > max_bytes else ""
+        return f"[Attached file: {attachment.name}{note}]\n```\n{text}\n```"
+
+
+def _render_thumbnail(source: str, target: str, size: int) -> str:
+    """Process-pool worker: write a PNG thumbnail of an image"""
+    with Image.open(source) as image:
+        # Lets JPEG decode at a reduced scale instead of full resolution
+        image.draft('RGB', (size, size))
+        image.thumbnail((size, size))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        temp = f"{target}.{os.getpid()}.part"
+        image.save(temp, 'PNG')
+    os.replace(temp, target)
+    return target
+
+
+class ThumbnailPool:
+    """Renders and caches image thumbnails in worker processes
+
+    Decoding a large image holds the GIL for a long time, so it runs in a
+    separate process rather than a thread of the UI process.
+    """
+
+    def __init__(self, blob_store: BlobStore, cache_dir: Optional[Path] = None,
+                 size: int = 160, workers: int = 2):
+        self.blob_store = blob_store
+        self.cache_dir = cache_dir or APP_DIR / "thumbnails"
+        self.size = size
+        self.workers = workers
+        self._pool = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}-{self.size}.png"
+
+    def request(self, attachment: Attachment) -> Optional[Future]:
+        """Future resolving to the thumbnail's path; None if there can't be one"""
+        if not PIL_AVAILABLE or not attachment.is_image:
+            return None
+
+        digest = attachment.digest
+        target = self.path_for(digest)
+        if target.exists():
+            future = Future()
+            future.set_result(str(target))
+            return future
+
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is not None:
+                return future
+            if self._pool is None:
+                # Spawned, since forking a process that runs Tk and worker
+                # threads isn't safe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            future = self._pool.submit(_render_thumbnail, str(self.blob_store.path_for(digest)),
+                                       str(target), self.size)
+            self._pending[digest] = future
+        future.add_done_callback(lambda done: self._finished(digest, done))
+        return future
+
+    def _finished(self, digest: str, future: Future):
+        with self._lock:
+            self._pending.pop(digest, None)
+        if not future.cancelled() and future.exception() is not None:
+            log.warning("Thumbnail failed for %s: %s", digest[:12], future.exception())
+
+    def shutdown(self):
+        """Stop the worker processes, dropping queued work"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._pending = {}
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,171 @@
+"""
+Model Comparison
+Sends one prompt to several provider/model pairs at once and measures each
+stream: time to first token, tokens per second and total latency.
+
+Every target streams on its own thread through the shared connection pools,
+so a run takes as long as its slowest target rather than the sum of all.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from .logger import get_logger
+from .providers import GenerationCancelled, Usage
+
+log = get_logger('compare')
+
+
+@dataclass(frozen=True)
+class CompareTarget:
+    provider: str
+    model: str
+
+    @classmethod
+    def parse(cls, spec: str, default_provider: str = 'mock') -> 'CompareTarget':
+        """Parse "provider:model" (a bare model uses default_provider)"""
+        provider, sep, model = spec.strip().partition(':')
+        if not sep:
+            return cls(default_provider, provider)
+        return cls(provider.strip(), model.strip())
+
+    @property
+    def label(self) -> str:
+        return f"{self.provider}:{self.model}" if self.model else self.provider
+
+
+@dataclass
+class CompareResult:
+    target: CompareTarget
+    status: str = 'running'  # running, completed, cancelled or error
+    text: str = ''
+    tokens: int = 0
+    ttft_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        """Output rate once streaming started (excludes time to first token)"""
+        if self.ttft_ms is None or self.total_ms is None:
+            return None
+        streaming = (self.total_ms - self.ttft_ms) / 1000
+        return self.tokens / streaming if streaming > 0 else None
+
+    def summary(self) -> str:
+        parts = []
+        if self.ttft_ms is not None:
+            parts.append(f"TTFT {self.ttft_ms:.0f} ms")
+        if self.tokens_per_sec is not None:
+            parts.append(f"{self.tokens_per_sec:.1f} tok/s")
+        if self.total_ms is not None:
+            parts.append(f"total {self.total_ms:.0f} ms")
+        if self.status in ('cancelled', 'error'):
+            parts.append(self.status)
+        return " • ".join(parts)
+
+
+class CompareRun:
+    """One prompt fanned out to several targets
+
+    on_chunk(index, chunk, result) and on_done(index, result) are called on
+    the target's worker thread.
+    """
+
+    def __init__(self, controller, message: str, targets: List[CompareTarget],
+                 on_chunk: Optional[Callable] = None, on_done: Optional[Callable] = None):
+        from .app_controller import Generation
+
+        self.controller = controller
+        self.message = message
+        self.targets = targets
+        self.results = [CompareResult(target) for target in targets]
+        self.generations = [Generation(message) for _ in targets]
+        self.on_chunk = on_chunk
+        self.on_done = on_done
+        self.wall_ms = None
+        self._remaining = len(targets)
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+        self._started = None
+
+    def start(self) -> 'CompareRun':
+        """Start every target at once"""
+        self._started = time.perf_counter()
+        if not self.targets:
+            self._finished.set()
+        for index in range(len(self.targets)):
+            threading.Thread(target=self._run, args=(index,), name=f"compare-{index}",
+                             daemon=True).start()
+        self.controller.metrics.increment('compare.runs')
+        return self
+
+    def _run(self, index: int):
+        target = self.targets[index]
+        result = self.results[index]
+        generation = self.generations[index]
+        provider = None
+        context = None
+        chunks = []
+        usage = []
+        started = time.perf_counter()
+        try:
+            provider = self.controller.create_target_provider(target.provider, target.model)
+            generation.provider_name = provider.name
+            provider.check_ready()
+            context = self.controller.build_context(self.message, provider=provider)
+            started = time.perf_counter()
+            for chunk in provider.stream_turn(context, None, generation):
+                if isinstance(chunk, Usage):
+                    usage.append(chunk)
+                    continue
+                generation.check_cancelled()
+                if not chunks:
+                    result.ttft_ms = (time.perf_counter() - started) * 1000
+                chunks.append(chunk)
+                if self.on_chunk:
+                    self.on_chunk(index, chunk, result)
+            result.status = 'completed'
+        except GenerationCancelled:
+            result.status = 'cancelled'
+        except Exception as e:
+            # A closed response surfaces as a network error after Stop
+            result.status = 'cancelled' if generation.cancelled else 'error'
+            if result.status == 'error':
+                result.error = str(e)
+                log.warning("Compare target %s failed: %s", target.label, e)
+        finally:
+            if provider is not None:
+                provider.close()
+
+        result.total_ms = (time.perf_counter() - started) * 1000
+        result.text = ''.join(chunks)
+        if provider is not None and result.text:
+            result.tokens = usage[-1].completion_tokens if usage else provider.count_tokens(result.text)
+        if context is not None:
+            status = 'ok' if result.status == 'completed' else result.status
+            self.controller.record_usage(provider, context, chunks, usage,
+                                         {"status": status, "ttft_ms": result.ttft_ms}, started, generation)
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+            if last:
+                self.wall_ms = (time.perf_counter() - self._started) * 1000
+        if self.on_done:
+            self.on_done(index, result)
+        if last:
+            self._finished.set()
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def cancel(self):
+        """Stop every target that is still streaming"""
+        for generation in self.generations:
+            generation.cancel()
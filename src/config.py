@@ -8,6 +8,10 @@ import json
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+from .logger import get_logger
+
+log = get_logger('config')
+
 class Config:
     def __init__(self):
         self.config_dir = Path.home() / ".ai_chat_app"
@@ -18,7 +22,9 @@ class Config:
                 "version": "1.0.0",
                 "window_width": 800,
                 "window_height": 600,
-                "theme": "light"
+                "theme": "light",
+                "single_instance": True,  # Relaunches raise the running window
+                "ipc_send_timeout": 120  # Seconds `main.py send` waits for a reply
             },
             "auth": {
                 "remember_email": True,
@@ -26,23 +32,145 @@ class Config:
                 "session_timeout": 3600  # 1 hour
             },
             "chat": {
-                "max_history": 1000,
+                "max_history": 10000,  # Messages kept in memory (the rest stay on disk)
+                "hot_messages": 200,  # Newest messages kept as live objects; older ones are compressed
                 "auto_scroll": True,
                 "show_timestamps": True,
-                "notification_sound": True
+                "notification_sound": True,
+                "persist_history": True,
+                "restore_session": True,  # Repaint the last page and continue the conversation on launch
+                "snapshot_lines": 300  # Transcript lines kept in the render snapshot
+            },
+            "snippets": {
+                "enabled": True,  # Suggest snippets (~/.ai_chat_app/snippets.json) and past prompts while typing
+                "max_suggestions": 6,
+                "history_prompts": 5000,  # Most frequent past prompts indexed
+                "min_prompt_count": 2  # Times a prompt must have been sent to be suggested
+            },
+            "attachments": {
+                "inline_bytes": 32768,  # Text attachment bytes included in the prompt
+                "thumbnail_size": 160,  # Longest side of image previews (pixels)
+                "thumbnail_workers": 2  # Processes rendering previews
+            },
+            "retrieval": {
+                "enabled": True,
+                "min_score": 0.35,  # Confidence needed to reuse a past reply
+                "offline_fallback": True  # Answer offline when the provider is unreachable
             },
             "ai": {
-                "api_provider": "mock",  # "openai", "anthropic", "mock"
+                "api_provider": "mock",  # "openai", "anthropic", "local", "mock", "replay"
                 "api_key": "",
+                "base_url": "",  # Override the provider's default endpoint
                 "model": "gpt-3.5-turbo",
                 "max_tokens": 500,
-                "temperature": 0.7
+                "temperature": 0.7,
+                "trace_mode": "off",  # "capture" records every exchange to ~/.ai_chat_app/traces
+                "trace_file": "",  # Capture replayed by the "replay" provider
+                "replay_speed": 1.0  # 1.0 = original timing, 0 = no delays
+            },
+            "tools": {
+                "enabled": False,  # Let models call local tools (OpenAI and Anthropic providers)
+                "allowed": [],  # Tool names offered to the model; empty = all registered tools
+                "search_roots": ["~/Documents"],  # Folders the file tools may read; [] = none
+                "workers": 4,  # Tool processes
+                "timeout": 10,  # Seconds per call
+                "memory_mb": 256,  # Address-space limit per tool process
+                "max_steps": 5,  # Tool rounds per reply before the model must answer
+                "cache_ttl": 60  # Seconds identical calls reuse a result
+            },
+            "mock": {
+                "rules_file": "",  # JSON keyword/regex rules for mock replies; reloaded when edited
+                "reload_interval": 2,  # Seconds between checks of the rules file
+                "first_token_ms": 500,  # Simulated time to first token
+                "ms_per_char": 10,  # Extra "reading" time per prompt character
+                "max_think_ms": 2000,  # Cap on the reading time
+                "token_ms": 25,  # Delay between streamed chunks
+                "words_per_chunk": 1,
+                "jitter": 0.0  # Random +/- fraction applied to every delay, e.g. 0.3
+            },
+            "analytics": {
+                "enabled": True,  # Record token counts and latency per user, model and period
+                "save_interval": 60,  # Seconds between writes of the rollups
+                "retention_days": {"minute": 2, "hour": 90, "day": 0}  # 0 = keep forever
+            },
+            "loadtest": {
+                "levels": [1, 4, 16, 64],  # Concurrent simulated users per step
+                "duration": 20,  # Seconds per step
+                "think_time": "exp:2",  # fixed:S, uniform:MIN:MAX, exp:MEAN or lognormal:MEDIAN:SIGMA
+                "provider": "mock",  # "mock", or "local" for a stub HTTP server on localhost
+                "timeout": 60,  # Seconds before a reply counts as timed out
+                "prompts": []  # Prompts users pick from at random; empty = built-in set
+            },
+            "compare": {
+                "targets": []  # "provider:model" pairs for compare mode; empty = the current model
+            },
+            "outbox": {
+                "enabled": True,  # Queue sends made while offline and send them on reconnect
+                "probe_interval": 5,  # First connectivity re-check after a failure (seconds)
+                "max_backoff": 120,  # Longest wait between checks while offline (seconds)
+                "max_concurrent": 2  # Queued sends delivered at once on reconnect
+            },
+            "network": {
+                "prewarm": True,  # Connect to the provider while the sign-in screen is shown
+                "prewarm_refresh": 30,  # Re-warm after sign-in if the last warm-up is older (seconds)
+                "dns_cache_ttl": 3600  # Seconds a persisted DNS answer is trusted
+            },
+            "sync": {
+                "enabled": False,
+                # e.g. https://<project>.supabase.co/functions/v1/make-server-46ee36be
+                "endpoint": "",
+                "api_key": "",  # The project's anon key
+                "access_token": "",  # The user's Supabase session token; sync is scoped to its user
+                "refresh_token": "",  # Renews access_token before it expires; rotated tokens are saved
+                "auth_url": "",  # Supabase auth endpoint; empty = derived from endpoint
+                "batch_size": 50,  # Messages per push
+                "interval": 5,  # Seconds between pushes
+                "pull_interval": 60,  # Seconds between pulls of other machines' messages
+                "max_backoff": 300  # Longest retry delay while offline (seconds)
+            },
+            "profiler": {
+                "interval_ms": 5,  # Target sampling interval
+                "max_overhead": 0.02  # Sampling backs off to stay under this share of wall time
+            },
+            "watchdog": {
+                "enabled": True,
+                "interval_ms": 100,  # Heartbeat period on the Tk main loop
+                "budget_ms": 200  # Lag beyond this is reported as a stall
+            },
+            "memory": {
+                "enabled": True,
+                "budget_mb": 400,  # RSS above this triggers cache/history trimming
+                "check_interval": 60,  # Seconds between checks
+                "leak_checks": 5,  # Consecutive growing checks before a leak is suspected
+                "tracemalloc": "auto",  # "auto" (start on suspicion), "always" or "off"
+                "trim_keep_messages": 200,
+                "trim_keep_lines": 2000
+            },
+            "logging": {
+                "level": "info",  # debug, info, warning, error
+                "levels": {},  # Per-subsystem overrides, e.g. {"controller": "debug"}
+                "console_level": "warning",  # Also echo these to stderr when available
+                "max_bytes": 5242880,  # Rotate app.jsonl beyond this size
+                "backup_count": 5,
+                "flush_interval": 1.0,  # Seconds between background flushes
+                "dump_seconds": 300  # Window written by "Save Diagnostic Log"
+            },
+            "scheduler": {
+                "enabled": True,
+                # e.g. {"id": "standup", "prompt": "...", "cron": "0 9 * * 1-5"}
+                # or {"id": "reminder", "prompt": "...", "at": "2024-01-01T09:00"}
+                "jobs": [],
+                "max_concurrent": 1,  # Jobs running at once
+                "catch_up": True,  # Run once for runs missed while asleep or closed
+                "max_sleep": 60,  # Longest wait between checks (seconds)
+                "notify_batch_seconds": 10  # Results finishing within this window share a notification
             },
             "tray": {
                 "minimize_to_tray": True,
                 "close_to_tray": True,
                 "show_notifications": True,
-                "notification_duration": 5
+                "notification_duration": 5,
+                "helper_restarts": 3  # Times to restart a crashed tray helper process
             }
         }
         
@@ -65,7 +193,7 @@ class Config:
                 return self.default_config.copy()
                 
         except Exception as e:
-            print(f"Error loading config: {e}")
+            log.error("Error loading config: %s", e)
             return self.default_config.copy()
     
     def save_config(self) -> bool:
@@ -79,7 +207,7 @@ class Config:
             return True
             
         except Exception as e:
-            print(f"Error saving config: {e}")
+            log.error("Error saving config: %s", e)
             return False
     
     def get(self, key_path: str, default=None):
@@ -94,8 +222,11 @@ class Config:
         except (KeyError, TypeError):
             return default
     
-    def set(self, key_path: str, value: Any) -> bool:
-        """Set configuration value using dot notation"""
+    def set(self, key_path: str, value: Any, save: bool = True) -> bool:
+        """Set configuration value using dot notation
+
+        Pass save=False for a temporary override that isn't written to disk.
+        """
         keys = key_path.split('.')
         config_section = self.config
         
@@ -110,10 +241,10 @@ class Config:
             config_section[keys[-1]] = value
             
             # Auto-save
-            return self.save_config()
+            return self.save_config() if save else True
             
         except Exception as e:
-            print(f"Error setting config value: {e}")
+            log.error("Error setting config value %s: %s", key_path, e)
             return False
     
     def _deep_update(self, base_dict: Dict, update_dict: Dict):
@@ -0,0 +1,156 @@
+"""
+Conversation Tree
+Branching message history. Each message is a node that points at its
+parent, so branches created by editing an earlier prompt share their whole
+prefix with the original instead of copying it.
+
+Nodes are never modified after creation; the tree only adds nodes and moves
+the head (the leaf of the active branch).
+"""
+
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class Node:
+    __slots__ = ('message', 'parent', 'depth')
+
+    def __init__(self, message, parent: Optional['Node'] = None):
+        self.message = message
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 1
+
+
+class ConversationTree:
+    def __init__(self):
+        self.nodes: Dict[str, Node] = {}
+        self.children: Dict[Optional[str], List[Node]] = {}  # None holds the roots
+        self.head: Optional[Node] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self.nodes
+
+    @property
+    def head_id(self) -> Optional[str]:
+        head = self.head
+        return head.message.id if head else None
+
+    @property
+    def depth(self) -> int:
+        """Number of messages on the active branch"""
+        head = self.head
+        return head.depth if head else 0
+
+    def append(self, message) -> Node:
+        """Add a message after the head of the active branch"""
+        with self._lock:
+            return self.add(message, self.head_id)
+
+    def add(self, message, parent_id: Optional[str], follow: bool = False) -> Node:
+        """Add a message under a parent (None for a new root)
+
+        The head follows the new node only if the parent was the head, so a
+        reply to a branch the user has since left doesn't pull them back.
+        With follow, it also moves when the parent is further up the active
+        branch (something was appended after the prompt while it was being
+        answered).
+        """
+        with self._lock:
+            parent = self.nodes.get(parent_id) if parent_id is not None else None
+            node = Node(message, parent)
+            self.nodes[message.id] = node
+            self.children.setdefault(parent.message.id if parent else None, []).append(node)
+            if self.head is parent or (follow and parent is not None and self._on_active_branch(parent)):
+                self.head = node
+            return node
+
+    def _on_active_branch(self, node: Node) -> bool:
+        head = self.head
+        while head is not None and head.depth > node.depth:
+            head = head.parent
+        return head is node
+
+    def parent_id(self, message_id: str) -> Optional[str]:
+        node = self.nodes.get(message_id)
+        return node.parent.message.id if node and node.parent else None
+
+    def iter_path_reversed(self) -> Iterator:
+        """Yield the active branch's messages, newest first"""
+        node = self.head
+        while node is not None:
+            yield node.message
+            node = node.parent
+
+    def path(self) -> List:
+        """Messages on the active branch, oldest first"""
+        messages = list(self.iter_path_reversed())
+        messages.reverse()
+        return messages
+
+    def rewind(self, message_id: str) -> bool:
+        """Move the head to just before a message, so the next append branches"""
+        with self._lock:
+            node = self.nodes.get(message_id)
+            if node is None:
+                return False
+            self.head = node.parent
+            return True
+
+    def siblings(self, message_id: str) -> List[str]:
+        """Ids of a message and its alternative versions, oldest first"""
+        node = self.nodes.get(message_id)
+        if node is None:
+            return []
+        key = node.parent.message.id if node.parent else None
+        return [sibling.message.id for sibling in self.children.get(key, [])]
+
+    def version_info(self, message_id: str) -> Tuple[int, int]:
+        """(1-based position, count) of a message among its versions"""
+        ids = self.siblings(message_id)
+        return (ids.index(message_id) + 1, len(ids)) if message_id in ids else (0, 0)
+
+    def switch_to(self, message_id: str) -> bool:
+        """Make the branch through a message active, following its latest replies"""
+        with self._lock:
+            node = self.nodes.get(message_id)
+            if node is None:
+                return False
+            while self.children.get(node.message.id):
+                node = self.children[node.message.id][-1]
+            self.head = node
+            return True
+
+    def trim(self, keep: int) -> List:
+        """Keep the newest messages of the active branch and everything below them
+
+        Returns the older active-branch messages that were removed (oldest
+        first). Branches that split off above the cut are dropped.
+        """
+        with self._lock:
+            path = self.path()
+            if len(path) <= keep:
+                return []
+            evicted = path[:-keep] if keep > 0 else path
+            head_id = self.head_id
+            old_children = self.children
+            self.clear()
+            if keep > 0:
+                # Nodes are immutable, so the kept subtree is rebuilt under a new root
+                pending = [(path[-keep], None)]
+                while pending:
+                    message, parent_id = pending.pop()
+                    self.add(message, parent_id)
+                    pending.extend((child.message, message.id)
+                                   for child in reversed(old_children.get(message.id, [])))
+                self.head = self.nodes.get(head_id)
+            return evicted
+
+    def clear(self):
+        with self._lock:
+            self.nodes = {}
+            self.children = {}
+            self.head = None
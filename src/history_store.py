@@ -0,0 +1,116 @@
+"""
+History Store
+Append-only JSONL persistence for chat messages across sessions.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from .logger import get_logger
+
+log = get_logger('history')
+
+
+class HistoryStore:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or Path.home() / ".ai_chat_app" / "history.jsonl"
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def to_record(message, conversation_id: str, provider: Optional[str] = None,
+                  parent_id: Optional[str] = None) -> Dict[str, Any]:
+        """Convert a Message into its stored form
+
+        parent_id links the message into the conversation tree (None for a
+        root). Records written before branching have no parent_id key.
+        """
+        record = {
+            "id": message.id,
+            "conversation_id": conversation_id,
+            "parent_id": parent_id,
+            "sender": message.sender,
+            "content": message.content,
+            "timestamp": message.timestamp.isoformat()
+        }
+        if provider:
+            record["provider"] = provider
+        if getattr(message, 'attachments', None):
+            record["attachments"] = [attachment.to_dict() for attachment in message.attachments]
+        return record
+
+    def append(self, message, conversation_id: str, provider: Optional[str] = None,
+               parent_id: Optional[str] = None) -> Dict[str, Any]:
+        """Append a message record"""
+        record = self.to_record(message, conversation_id, provider, parent_id)
+        self.append_record(record)
+        return record
+
+    def append_record(self, record: Dict[str, Any]):
+        """Append an already-built record (e.g. one synced from another machine)"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except OSError as e:
+            log.error("Error saving message history: %s", e)
+
+    def size(self) -> int:
+        """Current length of the file in bytes, for use as an iter_records cutoff"""
+        try:
+            return self.path.stat().st_size
+        except OSError:
+            return 0
+
+    def iter_records(self, end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield stored message records, oldest first
+
+        With end, stop at that byte offset (a size() taken earlier), so records
+        appended since then are left out.
+        """
+        if not self.path.exists():
+            return
+
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                offset += len(line)
+                if end is not None and offset > end:
+                    return
+                try:
+                    yield json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # Tolerate a torn final line from an interrupted write
+                    continue
+
+    def message_status(self, message_id: str) -> Tuple[bool, bool]:
+        """(stored, answered): whether a message is in the file and has an AI reply"""
+        stored = answered = False
+        if not self.path.exists():
+            return stored, answered
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if message_id not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("id") == message_id:
+                    stored = True
+                elif record.get("parent_id") == message_id and record.get("sender") == 'ai':
+                    answered = True
+        return stored, answered
+
+    def iter_pairs(self, end: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (user prompt, AI reply record) pairs in conversation order"""
+        last_prompt = {}
+        for record in self.iter_records(end):
+            conversation = record.get("conversation_id")
+            if record.get("sender") == 'user':
+                last_prompt[conversation] = record.get("content", "")
+            elif conversation in last_prompt:
+                yield last_prompt.pop(conversation), record
@@ -0,0 +1,409 @@
+"""
+Load Testing
+Headless load harness: simulated users, each with its own AppController
+session, send prompts through the real controller code paths with think
+time in between, at increasing levels of concurrency.
+
+Each level reports throughput, latency percentiles, peak thread count,
+memory per session and how often the controller's locks were contended.
+Answers come from the mock provider, or from a local OpenAI-compatible stub
+server (provider "local") so that the HTTP transport is exercised as well.
+No history, traces or sync data are written.
+
+Think time specs: ``fixed:S``, ``uniform:MIN:MAX``, ``exp:MEAN`` and
+``lognormal:MEDIAN:SIGMA`` (seconds).
+"""
+
+import gc
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+
+from .config import Config
+from .logger import get_logger
+from .memory_monitor import current_rss_mb
+from .mock_rules import MockResponder
+
+log = get_logger('loadtest')
+
+DEFAULT_PROMPTS = [
+    "Hello there!",
+    "Can you help me plan my week?",
+    "What's the weather like for a picnic tomorrow?",
+    "How do I read a CSV file in Python?",
+    "Summarize the main points of our discussion so far.",
+    "Thanks, that was useful.",
+]
+
+# Controller attributes replaced with ContendedLock for the run
+SESSION_LOCKS = ('_history_lock', '_generation_lock', '_provider_lock', '_tool_lock')
+
+
+@dataclass(frozen=True)
+class ThinkTime:
+    kind: str
+    params: tuple
+
+    @classmethod
+    def parse(cls, spec: str) -> 'ThinkTime':
+        """Parse "exp:2", "uniform:1:3", "fixed:0.5" or "lognormal:2:0.5" """
+        kind, *params = spec.strip().split(':')
+        expected = {'fixed': 1, 'uniform': 2, 'exp': 1, 'lognormal': 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Invalid think time: {spec!r}")
+        return cls(kind, tuple(float(param) for param in params))
+
+    def sample(self, rng: random.Random) -> float:
+        """Seconds to wait before the next prompt"""
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return rng.uniform(*self.params)
+        if self.kind == 'exp':
+            return rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+class ContendedLock:
+    """Drop-in lock wrapper that records how often and how long callers waited
+
+    Counters are only updated while the lock is held, so they need no lock
+    of their own.
+    """
+
+    def __init__(self, name: str, lock=None):
+        self.name = name
+        self._lock = lock or threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        waited = (time.perf_counter() - started) * 1000
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_ms += waited
+        self.max_wait_ms = max(self.max_wait_ms, waited)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+@dataclass
+class LockReport:
+    name: str
+    acquisitions: int = 0
+    contended: int = 0
+    wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+
+    @property
+    def contention(self) -> float:
+        """Fraction of acquisitions that had to wait"""
+        return self.contended / self.acquisitions if self.acquisitions else 0.0
+
+
+@dataclass
+class LevelResult:
+    users: int
+    duration_s: float
+    completed: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    ttft_ms: Dict[str, float] = field(default_factory=dict)
+    total_ms: Dict[str, float] = field(default_factory=dict)
+    peak_threads: int = 0
+    rss_per_session_mb: Optional[float] = None
+    locks: List[LockReport] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Completed replies per second"""
+        return self.completed / self.duration_s if self.duration_s else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"users": self.users, "duration_s": round(self.duration_s, 2),
+                "completed": self.completed, "failed": self.failed, "timed_out": self.timed_out,
+                "throughput": round(self.throughput, 2), "ttft_ms": self.ttft_ms,
+                "total_ms": self.total_ms, "peak_threads": self.peak_threads,
+                "rss_per_session_mb": self.rss_per_session_mb,
+                "locks": [{"name": lock.name, "acquisitions": lock.acquisitions,
+                           "contended": lock.contended, "wait_ms": round(lock.wait_ms, 2),
+                           "max_wait_ms": round(lock.max_wait_ms, 2)} for lock in self.locks]}
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping pooled keep-alive connections is expected under load
+        pass
+
+
+class StubServer:
+    """OpenAI-compatible streaming endpoint on localhost with simulated latency"""
+
+    def __init__(self, responder: Optional[MockResponder] = None, latency: Optional[Dict[str, Any]] = None):
+        self.responder = responder or MockResponder()
+        latency = latency or {}
+        self.first_token_ms = latency.get('first_token_ms', 500)
+        self.token_ms = latency.get('token_ms', 25)
+        self.words_per_chunk = max(1, latency.get('words_per_chunk', 1))
+        self._server = None
+
+    def start(self) -> str:
+        """Serve on a free port; returns the base URL"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like a real endpoint
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    messages = json.loads(body).get('messages') or [{}]
+                except ValueError:
+                    messages = [{}]
+                prompt = messages[-1].get('content') or ''
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                time.sleep(stub.first_token_ms / 1000)
+                words = stub.responder.respond(prompt).split(' ')
+                for start in range(0, len(words), stub.words_per_chunk):
+                    text = ' '.join(words[start:start + stub.words_per_chunk])
+                    delta = {"choices": [{"delta": {"content": text if start == 0 else ' ' + text}}]}
+                    self._write(f"data: {json.dumps(delta)}\n\n")
+                    time.sleep(stub.token_ms / 1000)
+                self._write("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write(self, text: str):
+                data = text.encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+        self._server = _QuietServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name="loadtest-stub", daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def isolated_config(provider: str = 'mock', base_url: str = '') -> Config:
+    """The user's config with everything that writes to disk or the network turned off"""
+    config = Config()
+    if base_url:
+        config.set('ai.base_url', base_url, save=False)
+    for key, value in (('ai.api_provider', provider), ('ai.trace_mode', 'off'), ('chat.persist_history', False),
+                       ('retrieval.enabled', False), ('snippets.enabled', False),
+                       ('sync.enabled', False), ('tools.enabled', False), ('analytics.enabled', False)):
+        config.set(key, value, save=False)
+    return config
+
+
+def instrument_locks(controller) -> List[ContendedLock]:
+    """Swap a fresh controller's locks for contention-recording wrappers"""
+    locks = []
+    for attribute in SESSION_LOCKS:
+        lock = ContendedLock(f"controller.{attribute.strip('_')}", getattr(controller, attribute))
+        setattr(controller, attribute, lock)
+        locks.append(lock)
+    for owner, name in ((controller.metrics, 'metrics'), (controller.history_store, 'history_store')):
+        lock = ContendedLock(f"{name}.lock", owner._lock)
+        owner._lock = lock
+        locks.append(lock)
+    return locks
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))], 1)
+
+    return {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99),
+            "max": round(samples[-1], 1)}
+
+
+class LoadTest:
+    """Runs simulated users against fresh controller sessions, level by level"""
+
+    def __init__(self, provider: str = 'mock', think: str = 'exp:2', prompts: Optional[Sequence[str]] = None,
+                 timeout: float = 60, seed: int = 0):
+        if provider not in ('mock', 'local'):
+            # Never point simulated users at a real (possibly billed) endpoint
+            raise ValueError(f"Load tests run against 'mock' or 'local' (a stub server), not {provider!r}")
+        self.provider = provider
+        self.think = ThinkTime.parse(think)
+        self.prompts = list(prompts or DEFAULT_PROMPTS)
+        self.timeout = timeout
+        self.seed = seed
+
+    def run(self, levels: Sequence[int], duration: float) -> Iterator[LevelResult]:
+        """Run each concurrency level for duration seconds and yield its results"""
+        stub = None
+        base_url = ''
+        if self.provider == 'local':
+            stub = StubServer(latency=Config().get('mock', {}))
+            base_url = stub.start()
+        try:
+            for users in levels:
+                yield self.run_level(users, duration, base_url)
+        finally:
+            if stub is not None:
+                stub.stop()
+
+    def run_level(self, users: int, duration: float, base_url: str = '') -> LevelResult:
+        from .app_controller import AppController
+
+        gc.collect()
+        baseline_rss = current_rss_mb()
+        config = isolated_config(self.provider, base_url)
+        sessions, locks = [], []
+        for _ in range(users):
+            controller = AppController(config)
+            locks.extend(instrument_locks(controller))
+            sessions.append(controller)
+
+        shared = self._instrument_shared()
+        locks.extend(lock for _, _, lock in shared)
+
+        stop = threading.Event()
+        samples: Dict[str, List[float]] = {"ttft": [], "total": []}
+        timed_out = []
+        peak = {"threads": threading.active_count(), "rss": baseline_rss}
+
+        def monitor():
+            while not stop.wait(0.1):
+                peak["threads"] = max(peak["threads"], threading.active_count())
+                rss = current_rss_mb()
+                if rss is not None and baseline_rss is not None:
+                    peak["rss"] = max(peak["rss"], rss)
+
+        threads = [threading.Thread(target=self._simulate_user,
+                                    args=(controller, random.Random(self.seed * 100_003 + index),
+                                          stop, samples, timed_out),
+                                    name=f"loadtest-user-{index}", daemon=True)
+                   for index, controller in enumerate(sessions)]
+        monitor_thread = threading.Thread(target=monitor, name="loadtest-monitor", daemon=True)
+        started = time.perf_counter()
+        monitor_thread.start()
+        for thread in threads:
+            thread.start()
+        stop.wait(duration)
+        stop.set()
+        # Requests in flight at the deadline still count
+        for thread in threads:
+            thread.join(self.timeout)
+        elapsed = time.perf_counter() - started
+        monitor_thread.join()
+
+        for module, attribute, lock in shared:
+            setattr(module, attribute, lock._lock)
+        for controller in sessions:
+            if controller._provider is not None:
+                controller._provider.close()
+
+        result = LevelResult(users, elapsed, timed_out=len(timed_out),
+                             ttft_ms=_percentiles(samples["ttft"]), total_ms=_percentiles(samples["total"]),
+                             peak_threads=peak["threads"], locks=self._merge(locks))
+        for controller in sessions:
+            result.completed += controller.metrics.counters.get('generation.completed', 0)
+            result.failed += controller.metrics.counters.get('generation.failed', 0)
+        if baseline_rss is not None and peak["rss"] is not None:
+            result.rss_per_session_mb = round((peak["rss"] - baseline_rss) / users, 2)
+        log.info("Load level %d: %.1f replies/s, p95 %s ms", users, result.throughput,
+                 result.total_ms.get("p95"))
+        return result
+
+    def _simulate_user(self, controller, rng: random.Random, stop: threading.Event,
+                       samples: Dict[str, List[float]], timed_out: list):
+        """One user: send, wait for the reply, think, repeat until stopped"""
+        # Users start staggered rather than all in the same instant
+        if stop.wait(self.think.sample(rng) * rng.random()):
+            return
+        while not stop.is_set():
+            done = threading.Event()
+            first_chunk = []
+            started = time.perf_counter()
+
+            def on_chunk(chunk: str):
+                if not first_chunk:
+                    first_chunk.append(time.perf_counter())
+
+            generation = controller.send_message_to_ai(rng.choice(self.prompts), lambda response: done.set(),
+                                                       on_chunk=on_chunk)
+            if not done.wait(self.timeout):
+                controller.cancel_generation(generation)
+                timed_out.append(generation)
+                continue
+            finished = time.perf_counter()
+            # list.append is atomic, so users share the sample lists without a lock
+            samples["total"].append((finished - started) * 1000)
+            if first_chunk:
+                samples["ttft"].append((first_chunk[0] - started) * 1000)
+            stop.wait(self.think.sample(rng))
+
+    def _instrument_shared(self) -> list:
+        """Wrap process-wide locks the sessions contend on (restored after the level)"""
+        shared = []
+        if self.provider != 'mock':
+            from .providers import transport
+            shared.append((transport, '_sessions_lock',
+                           ContendedLock('transport.sessions_lock', transport._sessions_lock)))
+        for module, attribute, lock in shared:
+            setattr(module, attribute, lock)
+        return shared
+
+    @staticmethod
+    def _merge(locks: List[ContendedLock]) -> List[LockReport]:
+        """Totals per lock name across sessions, most contended first"""
+        reports: Dict[str, LockReport] = {}
+        for lock in locks:
+            report = reports.setdefault(lock.name, LockReport(lock.name))
+            report.acquisitions += lock.acquisitions
+            report.contended += lock.contended
+            report.wait_ms += lock.wait_ms
+            report.max_wait_ms = max(report.max_wait_ms, lock.max_wait_ms)
+        return sorted(reports.values(), key=lambda report: -report.wait_ms)
@@ -0,0 +1,248 @@
+"""
+Structured Logging
+Low-overhead logger that records into in-memory ring buffers and flushes
+rotated JSONL files from a background thread.
+
+Logging a record is a level check plus a deque append (atomic under the
+GIL, so no lock on the hot path). Messages use %-style arguments that are
+only formatted when the record is flushed or dumped. Records hold plain data
+only: tracebacks are formatted and other argument objects (exceptions in
+particular) are converted to strings when logged, so the ring buffer never
+keeps frames or their locals alive.
+"""
+
+import json
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+_PLAIN = (str, int, float, bool, type(None))
+
+
+def _plain(value):
+    return value if isinstance(value, _PLAIN) else str(value)
+
+
+class Logger:
+    __slots__ = ('name', 'level', '_manager')
+
+    def __init__(self, name: str, manager: 'LogManager'):
+        self.name = name
+        self._manager = manager
+        self.level = manager.level_for(name)
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, msg: str, *args, exc_info: bool = False, **fields):
+        if level < self.level:
+            return
+        exc = None
+        if exc_info:
+            exc_type, exc_value, exc_tb = sys.exc_info()
+            if exc_type is not None:
+                exc = ''.join(traceback.format_exception(exc_type, exc_value, exc_tb)).rstrip()
+            del exc_tb
+        args = tuple(_plain(arg) for arg in args)
+        fields = {key: _plain(value) for key, value in fields.items()} if fields else fields
+        self._manager.record((time.time(), level, self.name,
+                              threading.current_thread().name, msg, args, fields, exc))
+
+    def debug(self, msg: str, *args, **fields):
+        if DEBUG >= self.level:
+            self.log(DEBUG, msg, *args, **fields)
+
+    def info(self, msg: str, *args, **fields):
+        if INFO >= self.level:
+            self.log(INFO, msg, *args, **fields)
+
+    def warning(self, msg: str, *args, **fields):
+        self.log(WARNING, msg, *args, **fields)
+
+    def error(self, msg: str, *args, **fields):
+        self.log(ERROR, msg, *args, **fields)
+
+    def exception(self, msg: str, *args, **fields):
+        """Log an error with the current exception's traceback"""
+        self.log(ERROR, msg, *args, exc_info=True, **fields)
+
+
+class LogManager:
+    def __init__(self, ring_size: int = 10000):
+        self.log_dir = Path.home() / ".ai_chat_app" / "logs"
+        self.default_level = INFO
+        self.levels: Dict[str, int] = {}
+        self.console_level = WARNING
+        self.max_bytes = 5 * 1024 * 1024
+        self.backup_count = 5
+        self.flush_interval = 1.0
+        self.dropped = 0
+        self.loggers: Dict[str, Logger] = {}
+        self.recent: deque = deque(maxlen=ring_size)  # For "dump last N seconds"
+        self.pending: deque = deque(maxlen=ring_size)  # Awaiting the flusher
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._write_lock = threading.Lock()
+
+    def configure(self, config):
+        """Apply settings from the ``logging`` config section and start flushing"""
+        self.default_level = LEVELS.get(config.get('logging.level', 'info'), INFO)
+        self.levels = {name: LEVELS.get(level, INFO)
+                       for name, level in config.get('logging.levels', {}).items()}
+        self.console_level = LEVELS.get(config.get('logging.console_level', 'warning'), WARNING)
+        self.max_bytes = config.get('logging.max_bytes', self.max_bytes)
+        self.backup_count = config.get('logging.backup_count', self.backup_count)
+        self.flush_interval = config.get('logging.flush_interval', self.flush_interval)
+
+        for name, logger in self.loggers.items():
+            logger.level = self.level_for(name)
+
+        self.start()
+
+    def level_for(self, name: str) -> int:
+        return self.levels.get(name, self.default_level)
+
+    def get_logger(self, name: str) -> Logger:
+        logger = self.loggers.get(name)
+        if logger is None:
+            logger = self.loggers[name] = Logger(name, self)
+        return logger
+
+    def record(self, entry: tuple):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.recent.append(entry)
+        self.pending.append(entry)
+
+    def start(self):
+        """Start the background flusher"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="log-flusher", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        """Stop the flusher after writing everything pending"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self.flush()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write pending records to the current log file"""
+        entries = []
+        while True:
+            try:
+                entries.append(self.pending.popleft())
+            except IndexError:
+                break
+        if not entries:
+            return
+
+        lines = [json.dumps(self.to_dict(entry), ensure_ascii=False, default=str) for entry in entries]
+        self._echo(entries)
+
+        try:
+            with self._write_lock:
+                self.log_dir.mkdir(parents=True, exist_ok=True)
+                path = self.log_dir / "app.jsonl"
+                if path.exists() and path.stat().st_size > self.max_bytes:
+                    self._rotate(path)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+        except OSError:
+            # Nowhere left to report this; the ring buffer still has the records
+            pass
+
+    def _rotate(self, path: Path):
+        for index in range(self.backup_count - 1, 0, -1):
+            older = path.with_name(f"{path.name}.{index}")
+            if older.exists():
+                older.replace(path.with_name(f"{path.name}.{index + 1}"))
+        path.replace(path.with_name(f"{path.name}.1"))
+
+    def _echo(self, entries):
+        # Windowed builds have no console
+        if sys.stderr is None:
+            return
+        for entry in entries:
+            if entry[1] >= self.console_level:
+                record = self.to_dict(entry)
+                print(f"[{record['level'].upper()}] {record['subsystem']}: {record['message']}",
+                      file=sys.stderr)
+                if 'exception' in record:
+                    print(record['exception'], file=sys.stderr)
+
+    @staticmethod
+    def to_dict(entry: tuple) -> Dict[str, Any]:
+        timestamp, level, subsystem, thread, msg, args, fields, exc = entry
+        try:
+            message = msg % args if args else msg
+        except (TypeError, ValueError):
+            message = f"{msg} {args!r}"
+
+        record = {
+            "time": datetime.fromtimestamp(timestamp).isoformat(timespec='milliseconds'),
+            "level": LEVEL_NAMES.get(level, str(level)),
+            "subsystem": subsystem,
+            "thread": thread,
+            "message": message
+        }
+        if fields:
+            record.update(fields)
+        if exc:
+            record["exception"] = exc
+        return record
+
+    def dump_recent(self, seconds: float = 300) -> Optional[Path]:
+        """Write the last N seconds of records to a dump file"""
+        cutoff = time.time() - seconds
+        entries = [entry for entry in list(self.recent) if entry[0] >= cutoff]
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        path = self.log_dir / f"dump-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+        with open(path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(self.to_dict(entry), ensure_ascii=False, default=str) + '\n')
+        return path
+
+
+_manager = LogManager()
+
+
+def get_logger(name: str) -> Logger:
+    """Get the logger for a subsystem"""
+    return _manager.get_logger(name)
+
+
+def configure_logging(config):
+    """Apply logging settings and start the background flusher"""
+    _manager.configure(config)
+
+
+def shutdown_logging():
+    """Flush and stop logging"""
+    _manager.shutdown()
+
+
+def dump_recent(seconds: float = 300) -> Optional[Path]:
+    """Write the last N seconds of log records to a dump file"""
+    return _manager.dump_recent(seconds)
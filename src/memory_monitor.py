@@ -0,0 +1,206 @@
+"""
+Memory Monitor
+Tracks process memory and per-subsystem object counts, enforces a memory
+budget by trimming caches, and reports suspected leaks with allocation sites.
+
+Subsystems register a count function (and optionally a trim function). A
+subsystem whose count grows on every check for ``leak_checks`` checks in a
+row is a suspected leak. In "auto" mode tracemalloc is only started at that
+point, so allocation sites are available for reports without paying the
+tracing overhead all the time.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+from .logger import get_logger
+
+log = get_logger('memory')
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MiB, if it can be determined"""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Peak rather than current RSS; bytes on macOS, KiB elsewhere
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class MemoryMonitor:
+    def __init__(self, metrics, budget_mb: float = 400, interval: float = 60,
+                 leak_checks: int = 5, tracemalloc_mode: str = "auto", top_sites: int = 10):
+        self.metrics = metrics
+        self.budget_mb = budget_mb
+        self.interval = interval
+        self.leak_checks = leak_checks
+        self.tracemalloc_mode = tracemalloc_mode  # "auto", "always" or "off"
+        self.top_sites = top_sites
+        self.subsystems: Dict[str, Dict[str, Any]] = {}
+        self.leak_reports: deque = deque(maxlen=20)
+        self.is_running = False
+        self._history: Dict[str, deque] = {}
+        self._snapshot = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, count: Callable[[], int],
+                 trim: Optional[Callable[[], None]] = None, leak_check: bool = True):
+        """Track a subsystem's object count and optionally how to shrink it
+
+        Pass leak_check=False for counts that legitimately grow with use
+        (such as chat history) so they don't raise leak suspicions.
+        """
+        with self._lock:
+            self.subsystems[name] = {"count": count, "trim": trim}
+            if leak_check:
+                self._history[name] = deque(maxlen=self.leak_checks + 1)
+
+    def unregister(self, name: str):
+        """Stop tracking a subsystem"""
+        with self._lock:
+            self.subsystems.pop(name, None)
+            self._history.pop(name, None)
+
+    def start(self):
+        """Start periodic checks on a background thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._stop_event.clear()
+        if self.tracemalloc_mode == "always":
+            self._start_tracing()
+        threading.Thread(target=self._run, name="memory-monitor", daemon=True).start()
+
+    def stop(self):
+        """Stop checking"""
+        self.is_running = False
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                log.exception("Memory monitor error: %s", e)
+
+    def check(self) -> Dict[str, Any]:
+        """Sample memory, enforce the budget and look for leaks"""
+        rss = current_rss_mb()
+        if rss is not None:
+            self.metrics.set_gauge('memory.rss_mb', round(rss, 1))
+
+        with self._lock:
+            subsystems = dict(self.subsystems)
+
+        counts = {}
+        for name, subsystem in subsystems.items():
+            try:
+                counts[name] = subsystem["count"]()
+            except Exception:
+                continue
+            self.metrics.set_gauge(f'memory.objects.{name}', counts[name])
+            history = self._history.get(name)
+            if history is not None:
+                history.append(counts[name])
+
+        if rss is not None and rss > self.budget_mb:
+            self.enforce_budget(subsystems)
+
+        with self._lock:
+            histories = list(self._history.items())
+        suspects = [name for name, history in histories if self._is_growing(history)]
+        if suspects:
+            self._report_leak(suspects, counts)
+        elif self.tracemalloc_mode == "auto" and tracemalloc.is_tracing():
+            # Nothing suspicious any more; drop the tracing overhead
+            tracemalloc.stop()
+            self._snapshot = None
+
+        return {"rss_mb": rss, "counts": counts, "suspects": suspects}
+
+    def enforce_budget(self, subsystems: Optional[Dict[str, Dict[str, Any]]] = None):
+        """Ask every subsystem to shrink, then collect garbage"""
+        if subsystems is None:
+            with self._lock:
+                subsystems = dict(self.subsystems)
+
+        for name, subsystem in subsystems.items():
+            if subsystem["trim"]:
+                try:
+                    subsystem["trim"]()
+                except Exception as e:
+                    log.exception("Error trimming %s: %s", name, e)
+        gc.collect()
+        self.metrics.increment('memory.budget_trims')
+
+    def _is_growing(self, history: deque) -> bool:
+        if len(history) <= self.leak_checks:
+            return False
+        values = list(history)
+        return all(later > earlier for earlier, later in zip(values, values[1:]))
+
+    def _start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        self._snapshot = self._take_snapshot()
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def _report_leak(self, suspects: List[str], counts: Dict[str, int]):
+        if self.tracemalloc_mode == "off":
+            sites = []
+        elif not tracemalloc.is_tracing() or self._snapshot is None:
+            # First suspicion: start tracing so the next check can show sites
+            self._start_tracing()
+            return
+        else:
+            snapshot = self._take_snapshot()
+            stats = snapshot.compare_to(self._snapshot, 'traceback')
+            self._snapshot = snapshot
+            sites = [
+                {"size_diff_kb": round(stat.size_diff / 1024, 1),
+                 "count_diff": stat.count_diff,
+                 "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback][-4:]}
+                for stat in stats[:self.top_sites] if stat.size_diff > 0
+            ]
+
+        report = {
+            "time": time.time(),
+            "subsystems": {name: counts.get(name) for name in suspects},
+            "sites": sites
+        }
+        self.leak_reports.append(report)
+        self.metrics.increment('memory.leak_suspects')
+
+        log.warning("Suspected memory leak in %s: %s", ', '.join(suspects), report['subsystems'],
+                    sites=sites)
@@ -0,0 +1,114 @@
+"""
+Metrics
+Lightweight in-process counters and timing samples for performance reporting.
+"""
+
+import bisect
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Sequence
+
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 16, 33, 50, 100, 250, 500, 1000, 2500)
+
+
+class Histogram:
+    """Counts of values per fixed upper-bound bucket
+
+    With a window, only the most recent ``window`` values are counted.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS, window: Optional[int] = None):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last bucket is overflow
+        self.total = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window) if window else None
+
+    def record(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if self._recent is not None:
+            if len(self._recent) == self._recent.maxlen:
+                old_index, old_value = self._recent[0]
+                self.counts[old_index] -= 1
+                self.total -= 1
+                self.sum -= old_value
+            self._recent.append((index, value))
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+    def as_dict(self) -> Dict[str, int]:
+        labels = [f"<={bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        return dict(zip(labels, self.counts))
+
+
+class Metrics:
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self.counters: Dict[str, int] = {}
+        self.timings: Dict[str, deque] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1):
+        """Increment a named counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """Set a named point-in-time value"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record a timing sample (milliseconds by convention)"""
+        with self._lock:
+            samples = self.timings.get(name)
+            if samples is None:
+                samples = self.timings[name] = deque(maxlen=self.max_samples)
+            samples.append(value)
+
+    def record_histogram(self, name: str, value: float,
+                         buckets: Sequence[float] = DEFAULT_BUCKETS_MS,
+                         window: Optional[int] = None):
+        """Add a value to a named histogram (created on first use)"""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets, window)
+            histogram.record(value)
+
+    def summary(self, name: str) -> Dict[str, float]:
+        """Get count, mean and percentiles for a timing series"""
+        with self._lock:
+            samples = sorted(self.timings.get(name, ()))
+
+        if not samples:
+            return {"count": 0}
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+        return {
+            "count": len(samples),
+            "mean": sum(samples) / len(samples),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "max": samples[-1]
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get a copy of all counters and timing summaries"""
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            names = list(self.timings)
+            histograms = {name: h.as_dict() for name, h in self.histograms.items()}
+
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "timings": {name: self.summary(name) for name in names},
+            "histograms": histograms
+        }
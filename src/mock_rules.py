@@ -0,0 +1,316 @@
+"""
+Mock Response Rules
+Keyword and regex rules that pick the mock provider's replies (also used for
+offline answers), loaded from a JSON file and reloaded when it changes.
+
+All keyword rules are compiled into one Aho-Corasick automaton, so matching
+a message costs about the same with five keyword rules or five thousand.
+Regex rules are combined into one pattern per priority level; those that
+start with a literal word are only tried when the message contains it.
+
+Rules file format::
+
+    {
+      "rules": [
+        {"keywords": ["refund", "money back"], "response": "...", "priority": 10},
+        {"pattern": "order #?(\\\\d+)", "response": ["...", "..."], "word": false}
+      ],
+      "fallback": ["Generic reply about {message}"]
+    }
+
+The highest priority match wins; ties go to the match earliest in the
+message, then to the rule listed first. A list of responses picks one at
+random. Responses may use {message} (the user's text) and {match} (the
+matched text).
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from .logger import get_logger
+
+log = get_logger('mock_rules')
+
+# The built-in replies, used when no rules file is configured
+DEFAULT_RULES = [
+    {"keywords": ["hello", "hi", "hey"], "priority": 5,
+     "response": "Hello! I'm your AI assistant. How can I help you today?"},
+    {"keywords": ["help"], "priority": 4,
+     "response": ("I'm here to help! I can assist with various topics like answering questions, "
+                  "brainstorming ideas, explaining concepts, or just having a conversation. "
+                  "What would you like to discuss?")},
+    {"keywords": ["weather"], "priority": 3,
+     "response": ("I don't have access to real-time weather data, but I'd recommend checking "
+                  "a weather app or website for current conditions. Is there anything else I can help with?")},
+    {"keywords": ["python"], "priority": 2,
+     "response": ("Python is a great programming language! It's known for its simplicity and readability. "
+                  "Are you working on a specific Python project or have questions about Python development?")},
+    {"keywords": ["thank"], "priority": 1,
+     "response": "You're welcome! Is there anything else I can help you with?"},
+]
+
+_FALLBACK_NOTE = ("\n\nYou mentioned: \"{message}\"\n\nThis is a mock response from the Python desktop "
+                  "application. In a production environment, this would be powered by a real AI API like "
+                  "OpenAI's GPT, Anthropic's Claude, or similar services.")
+DEFAULT_FALLBACK = [opening + _FALLBACK_NOTE for opening in (
+    "That's an interesting question! Let me help you with that.",
+    "I understand what you're asking. Here's my perspective on it:",
+    "Great point! I can provide some insights about this topic.",
+    "I'd be happy to help you explore this further.",
+    "That's a thoughtful query. Let me break this down for you:",
+    "I can definitely assist with that. Here's what I think:",
+)]
+
+MIN_LITERAL = 3  # Shorter leading literals are too common to be worth gating on
+_REGEX_SYNTAX = set('.^$*+?{}[]\\|()')
+
+
+@dataclass(frozen=True)
+class Rule:
+    index: int  # Position in the file; breaks priority ties
+    priority: int
+    responses: Tuple[str, ...]
+    word: bool = False  # Keywords must match whole words
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over every rule's keywords (case-insensitive)"""
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, int]]] = [[]]  # (rule index, keyword length) per state
+
+    def add(self, keyword: str, rule_index: int):
+        state = 0
+        for char in keyword.lower():
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][char] = next_state
+            state = next_state
+        self.out[state].append((rule_index, len(keyword)))
+
+    def build(self):
+        """Compute failure links breadth first"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                if state:
+                    fallback = self.fail[state]
+                    while fallback and char not in self.goto[fallback]:
+                        fallback = self.fail[fallback]
+                    self.fail[child] = self.goto[fallback].get(char, 0)
+                # Also report the keywords ending here that are suffixes of this one
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def search(self, text: str):
+        """Yield (start, end, rule index) for every keyword occurrence"""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for rule_index, length in out[state]:
+                yield position + 1 - length, position + 1, rule_index
+
+
+class RuleSet:
+    """Compiled rules: one keyword automaton plus combined regexes per priority level"""
+
+    def __init__(self, rules: List[Dict[str, Any]], fallback: List[str]):
+        self.rules: List[Rule] = []
+        self.keywords = KeywordMatcher()
+        patterns: Dict[int, List[Tuple[str, int, int]]] = {}
+        for data in rules:
+            responses = data.get("response")
+            responses = tuple(responses) if isinstance(responses, list) else (responses,)
+            if not all(isinstance(response, str) for response in responses):
+                log.warning("Skipping mock rule without a response: %r", data)
+                continue
+            index = len(self.rules)
+            rule = Rule(index, int(data.get("priority", 0)), responses, bool(data.get("word", False)))
+            added = False
+            for keyword in data.get("keywords", []):
+                if keyword:
+                    self.keywords.add(keyword, index)
+                    added = True
+            if data.get("pattern"):
+                try:
+                    re.compile(data["pattern"])
+                except re.error as e:
+                    log.warning("Skipping invalid mock rule pattern %r: %s", data["pattern"], e)
+                else:
+                    flags = 0 if data.get("case_sensitive") else re.IGNORECASE
+                    patterns.setdefault(rule.priority, []).append((data["pattern"], flags, index))
+                    added = True
+            if added:
+                self.rules.append(rule)
+        self.keywords.build()
+        self.fallback = fallback or DEFAULT_FALLBACK
+
+        # Highest priority first; a level is only searched if it can still win.
+        # Patterns are grouped by the literal they start with, found with a
+        # second automaton, so a message only runs the regexes it could match.
+        self.literals = KeywordMatcher()
+        literal_ids: Dict[str, int] = {}
+        self.levels: List[Tuple[int, list, Dict[int, list]]] = []
+        for priority in sorted(patterns, reverse=True):
+            ungated, gated = [], {}
+            for entry in patterns[priority]:
+                literal = _literal_prefix(entry[0]).lower()
+                if len(literal) < MIN_LITERAL:
+                    ungated.append(entry)
+                    continue
+                if literal not in literal_ids:
+                    literal_ids[literal] = len(literal_ids)
+                    self.literals.add(literal, literal_ids[literal])
+                gated.setdefault(literal_ids[literal], []).append(entry)
+            self.levels.append((priority, self._compile_level(ungated),
+                                {literal: self._compile_level(entries) for literal, entries in gated.items()}))
+        self.literals.build()
+
+    @staticmethod
+    def _compile_level(entries: List[Tuple[str, int, int]]) -> List[Tuple[re.Pattern, Optional[int]]]:
+        """One alternation for the level, plus any patterns that can't be combined"""
+        # Numbered backreferences would point at the wrong group once combined
+        separate = [entry for entry in entries if re.search(r'\\[1-9]', entry[0])]
+        combinable = [entry for entry in entries if entry not in separate]
+        compiled = []
+        if combinable:
+            try:
+                combined = '|'.join(f"(?P<_r{index}>{'(?i:' if flags else '(?:'}{pattern}))"
+                                    for pattern, flags, index in combinable)
+                compiled.append((re.compile(combined), None))
+            except re.error:
+                # e.g. two rules using the same group name
+                separate = entries
+                compiled = []
+        return compiled + [(re.compile(pattern, flags), index) for pattern, flags, index in separate]
+
+    def match(self, message: str) -> Optional[Tuple[Rule, str]]:
+        """The winning rule and the text it matched"""
+        best = None  # (priority, -start, -rule index), rule, matched text
+        for start, end, rule_index in self.keywords.search(message):
+            rule = self.rules[rule_index]
+            if rule.word and not _at_word_boundaries(message, start, end):
+                continue
+            rank = (rule.priority, -start, -rule.index)
+            if best is None or rank > best[0]:
+                best = (rank, rule, message[start:end])
+
+        present = None
+        for priority, compiled, gated in self.levels:
+            if best is not None and priority < best[0][0]:
+                break
+            if gated:
+                if present is None:
+                    present = {literal for _, _, literal in self.literals.search(message)}
+                compiled = compiled + [pattern for literal in present & gated.keys() for pattern in gated[literal]]
+            for pattern, rule_index in compiled:
+                found = pattern.search(message)
+                if found is None:
+                    continue
+                index = rule_index if rule_index is not None else int(found.lastgroup[2:])
+                rank = (priority, -found.start(), -index)
+                if best is None or rank > best[0]:
+                    best = (rank, self.rules[index], found.group(0))
+        return (best[1], best[2]) if best else None
+
+    def respond(self, message: str) -> str:
+        found = self.match(message)
+        if found is None:
+            template, matched = random.choice(self.fallback), ''
+        else:
+            rule, matched = found
+            template = random.choice(rule.responses)
+        return template.replace('{message}', message).replace('{match}', matched)
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Text every match of pattern must start with ('' if not certain)"""
+    if '|' in pattern:
+        return ''
+    prefix = []
+    for char in pattern:
+        if char in _REGEX_SYNTAX:
+            if char in '?*{' and prefix:
+                prefix.pop()  # The last character is optional
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+
+def _at_word_boundaries(text: str, start: int, end: int) -> bool:
+    return ((start == 0 or not text[start - 1].isalnum())
+            and (end == len(text) or not text[end].isalnum()))
+
+
+def load_rules(path: Path) -> RuleSet:
+    """Compile a rules file (a list of rules, or an object with rules and fallback)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"rules": data}
+    return RuleSet(data.get("rules", []), data.get("fallback", []))
+
+
+class MockResponder:
+    """Answers from the rules file, recompiling it in the background when it changes"""
+
+    def __init__(self, path: Optional[str] = None, reload_interval: float = 2.0):
+        self.path = Path(path).expanduser() if path else None
+        self.reload_interval = reload_interval
+        self.rules = RuleSet(DEFAULT_RULES, DEFAULT_FALLBACK)
+        self.compile_ms = None
+        self._mtime = None
+        self._checked = 0.0
+        self._reloading = False
+        if self.path is not None:
+            self._reload()
+
+    def respond(self, message: str) -> str:
+        self._check_file()
+        return self.rules.respond(message)
+
+    def _check_file(self):
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval or self._reloading:
+            return
+        self._checked = now
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._reloading = True
+            threading.Thread(target=self._reload, name="mock-rules", daemon=True).start()
+
+    def _reload(self):
+        """Compile the rules file and swap it in; keep the old rules if it is invalid"""
+        started = time.perf_counter()
+        try:
+            self._mtime = self.path.stat().st_mtime
+            rules = load_rules(self.path)
+            self.rules = rules
+            self.compile_ms = (time.perf_counter() - started) * 1000
+            log.info("Loaded %d mock rules from %s in %.0f ms", len(rules.rules), self.path, self.compile_ms)
+        except (OSError, ValueError, TypeError, re.error) as e:
+            log.error("Error loading mock rules from %s: %s", self.path, e)
+        finally:
+            self._reloading = False
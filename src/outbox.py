@@ -0,0 +1,245 @@
+"""
+Outbound Queue
+Durable queue for prompts sent while the AI provider is unreachable.
+
+Queued sends are stored in SQLite under their user message id, which doubles
+as an idempotency key: a send is claimed before delivery and removed once its
+reply is recorded, so neither a crash nor an overlapping flush answers the
+same prompt twice. While sends are pending, a cheap probe checks the endpoint
+with exponential backoff; once it answers, the queue is flushed oldest first,
+one send at a time per conversation and a bounded number at once overall.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .attachments import Attachment
+from .logger import get_logger
+from .providers import NetworkError
+
+log = get_logger('outbox')
+
+
+@dataclass
+class QueuedSend:
+    key: str  # The user message id; also the idempotency key
+    conversation_id: str
+    content: str
+    created: datetime = field(default_factory=datetime.now)
+    attachments: List[Attachment] = field(default_factory=list)
+    parent_id: Optional[str] = None  # Head of the conversation when it was queued
+    recorded: bool = False  # The user message is already in history
+    attempts: int = 0
+
+
+class Outbox:
+    """SQLite table of sends waiting for the network"""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path or Path.home() / ".ai_chat_app" / "outbox.db"
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use; called with the lock held"""
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS outbox (
+                                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                    key TEXT NOT NULL UNIQUE,
+                                    conversation_id TEXT NOT NULL,
+                                    content TEXT NOT NULL,
+                                    attachments TEXT NOT NULL,
+                                    created TEXT NOT NULL,
+                                    parent_id TEXT,
+                                    recorded INTEGER NOT NULL,
+                                    attempts INTEGER NOT NULL DEFAULT 0,
+                                    status TEXT NOT NULL DEFAULT 'pending')""")
+            # Sends claimed by a previous run that never finished go back in line
+            self._db.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+            self._db.commit()
+        return self._db
+
+    def add(self, item: QueuedSend):
+        """Queue a send; adding the same key again is a no-op"""
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT OR IGNORE INTO outbox (key, conversation_id, content, attachments, created, "
+                       "parent_id, recorded) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (item.key, item.conversation_id, item.content,
+                        json.dumps([attachment.to_dict() for attachment in item.attachments]),
+                        item.created.isoformat(), item.parent_id, int(item.recorded)))
+            db.commit()
+
+    def pending(self) -> List[QueuedSend]:
+        """Unclaimed sends, oldest first"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT key, conversation_id, content, attachments, created, parent_id, recorded, attempts "
+                "FROM outbox WHERE status = 'pending' ORDER BY seq").fetchall()
+        return [QueuedSend(key, conversation_id, content, datetime.fromisoformat(created),
+                           [Attachment.from_dict(data) for data in json.loads(attachments)],
+                           parent_id, bool(recorded), attempts)
+                for key, conversation_id, content, attachments, created, parent_id, recorded, attempts in rows]
+
+    def claim(self, key: str) -> bool:
+        """Mark a send as being delivered; False if someone else already has it"""
+        with self._lock:
+            db = self._connect()
+            claimed = db.execute("UPDATE outbox SET status = 'sending', attempts = attempts + 1 "
+                                 "WHERE key = ? AND status = 'pending'", (key,)).rowcount == 1
+            db.commit()
+            return claimed
+
+    def release(self, key: str):
+        """Put a claimed send back in line"""
+        with self._lock:
+            db = self._connect()
+            db.execute("UPDATE outbox SET status = 'pending' WHERE key = ?", (key,))
+            db.commit()
+
+    def mark_recorded(self, key: str):
+        """Note that the send's user message is now in history, so a retry doesn't add it again"""
+        with self._lock:
+            db = self._connect()
+            db.execute("UPDATE outbox SET recorded = 1 WHERE key = ?", (key,))
+            db.commit()
+
+    def remove(self, key: str):
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM outbox WHERE key = ?", (key,))
+            db.commit()
+
+    def count(self, conversation_id: Optional[str] = None) -> int:
+        """Sends not yet delivered (optionally for one conversation)"""
+        with self._lock:
+            db = self._connect()
+            if conversation_id is None:
+                return db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+            return db.execute("SELECT COUNT(*) FROM outbox WHERE conversation_id = ?",
+                              (conversation_id,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class OutboundQueue:
+    """Watches connectivity while sends are queued and flushes them when it returns
+
+    on_delivered(item, text, ok) is called on a flush thread for every send
+    that got a reply (ok) or failed for a reason other than the network.
+    """
+
+    def __init__(self, controller, outbox: Outbox, on_delivered: Optional[Callable] = None,
+                 probe_interval: float = 5, max_backoff: float = 120, max_concurrent: int = 2):
+        self.controller = controller
+        self.outbox = outbox
+        self.on_delivered = on_delivered
+        self.probe_interval = probe_interval
+        self.max_backoff = max_backoff
+        self.max_concurrent = max_concurrent
+        self.online = True
+        self.is_running = False
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the flush thread; sends left from the last session go first"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name="outbound-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop flushing; undelivered sends stay queued on disk"""
+        self.is_running = False
+        self._wake.set()
+
+    def wake(self):
+        """A send was queued; start probing (or flushing) now"""
+        self._wake.set()
+
+    def report_offline(self):
+        """A request failed to reach the provider"""
+        self.online = False
+        self._wake.set()
+
+    # Background loop
+
+    def _run(self):
+        backoff = self.probe_interval
+        while self.is_running:
+            self._wake.clear()
+            items = self.outbox.pending()
+            if not items:
+                self._wake.wait()
+                continue
+
+            try:
+                self.controller.get_provider().probe()
+            except Exception as e:
+                self.online = False
+                self.controller.metrics.increment('outbox.probe_failed')
+                log.info("Provider unreachable (%s); %d send(s) queued, retrying in %.0f s",
+                         e, len(items), backoff)
+            else:
+                self.online = True
+                self._flush(items)
+                if self.online:
+                    backoff = self.probe_interval
+                    continue
+
+            # Jittered so several clients on the same VPN don't retry in lockstep
+            self._wake.wait(backoff * random.uniform(0.8, 1.2))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _flush(self, items: List[QueuedSend]):
+        """Deliver sends: conversations in parallel, each one in order"""
+        by_conversation: Dict[str, List[QueuedSend]] = {}
+        for item in items:
+            by_conversation.setdefault(item.conversation_id, []).append(item)
+
+        log.info("Back online; flushing %d queued send(s)", len(items))
+        with ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="outbound") as pool:
+            list(pool.map(self._flush_conversation, by_conversation.values()))
+
+    def _flush_conversation(self, items: List[QueuedSend]):
+        for item in items:
+            if not self.is_running or not self.online:
+                return
+            if not self.outbox.claim(item.key):
+                continue
+            try:
+                text = self.controller.deliver_queued(item)
+            except NetworkError as e:
+                # Still (or again) offline: keep this and everything after it queued
+                self.outbox.release(item.key)
+                self.online = False
+                log.info("Queued send %s failed again: %s", item.key, e)
+                return
+            except Exception as e:
+                self.outbox.remove(item.key)
+                self.controller.metrics.increment('outbox.failed')
+                log.error("Queued send %s failed: %s", item.key, e)
+                if self.on_delivered:
+                    self.on_delivered(item, f"Sorry, I encountered an error: {str(e)}", False)
+                continue
+            self.outbox.remove(item.key)
+            self.controller.metrics.increment('outbox.delivered')
+            # None: answered before a crash, nothing new to show
+            if self.on_delivered and text is not None:
+                self.on_delivered(item, text, True)
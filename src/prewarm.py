@@ -0,0 +1,141 @@
+"""
+Connection Pre-warming
+Resolves the provider host, opens a pooled connection and loads the adapter
+in the background while the user is still signing in.
+"""
+
+import json
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .logger import get_logger
+
+log = get_logger('prewarm')
+
+
+class DnsCache:
+    """Persistent getaddrinfo cache for provider hosts
+
+    Only hosts registered with track() are cached. Fresh entries skip the
+    resolver entirely; stale entries are refreshed, and reused if the resolver
+    fails (e.g. while offline).
+    """
+
+    def __init__(self, path: Optional[Path] = None, ttl: float = 3600):
+        self.path = path or Path.home() / ".ai_chat_app" / "dns_cache.json"
+        self.ttl = ttl
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hosts = set()
+        self._original_getaddrinfo = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load cached entries from disk"""
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """Write cached entries to disk"""
+        try:
+            with self._lock:
+                data = json.dumps(self.entries)
+            self.path.parent.mkdir(exist_ok=True)
+            with open(self.path, 'w') as f:
+                f.write(data)
+        except OSError as e:
+            log.error("Error saving DNS cache: %s", e)
+
+    def track(self, host: str):
+        """Cache lookups for a host"""
+        self.hosts.add(host)
+
+    def install(self):
+        """Route socket.getaddrinfo through the cache"""
+        if self._original_getaddrinfo is not None:
+            return
+        self._original_getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        """Restore the original resolver"""
+        if self._original_getaddrinfo is not None:
+            socket.getaddrinfo = self._original_getaddrinfo
+            self._original_getaddrinfo = None
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        resolve = self._original_getaddrinfo or socket.getaddrinfo
+        if host not in self.hosts:
+            return resolve(host, port, family, type, proto, flags)
+
+        key = f"{host}:{port}:{family}:{type}"
+        with self._lock:
+            entry = self.entries.get(key)
+
+        if entry and entry["expires"] > time.time():
+            return self._decode(entry["results"])
+
+        try:
+            results = resolve(host, port, family, type, proto, flags)
+        except socket.gaierror:
+            if entry:
+                return self._decode(entry["results"])
+            raise
+
+        with self._lock:
+            self.entries[key] = {"expires": time.time() + self.ttl,
+                                 "results": self._encode(results)}
+        return results
+
+    @staticmethod
+    def _encode(results) -> List[list]:
+        return [[int(fam), int(kind), proto, canon, list(addr)]
+                for fam, kind, proto, canon, addr in results]
+
+    @staticmethod
+    def _decode(rows) -> List[Tuple]:
+        return [(socket.AddressFamily(fam), socket.SocketKind(kind), proto, canon, tuple(addr))
+                for fam, kind, proto, canon, addr in rows]
+
+
+class Prewarmer:
+    def __init__(self, controller):
+        self.controller = controller
+        self.dns_cache = DnsCache(ttl=controller.config.get('network.dns_cache_ttl', 3600))
+        self.dns_cache.load()
+        self.dns_cache.install()
+        self.last_warmed = 0.0
+        self._thread = None
+
+    def start(self, min_interval: float = 0):
+        """Warm up in the background unless a warm-up ran within min_interval seconds"""
+        if self._thread and self._thread.is_alive():
+            return
+        if time.monotonic() - self.last_warmed < min_interval:
+            return
+        self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            # Importing and constructing the adapter also loads its transport
+            provider = self.controller.get_provider()
+            if provider.base_url:
+                self.dns_cache.track(urlsplit(provider.base_url).hostname)
+            provider.warm()
+            if self.controller.config.get('tools.enabled', False):
+                self.controller.get_tool_executor().warm()
+            self.dns_cache.save()
+            self.last_warmed = time.monotonic()
+            self.controller.metrics.observe('prewarm.total_ms', (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            # Best effort: the first request will simply do the work itself
+            self.controller.metrics.increment('prewarm.failed')
+            log.info("Pre-warm failed: %s", e)
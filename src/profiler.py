@@ -0,0 +1,154 @@
+"""
+Sampling Profiler
+On-demand, low-overhead stack sampler covering every Python thread.
+
+Samples are aggregated in memory and written on stop as collapsed stacks
+(compatible with flamegraph.pl / speedscope) plus a plain-text top-N summary.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class SamplingProfiler:
+    def __init__(self, output_dir: Optional[Path] = None, interval: float = 0.005,
+                 max_overhead: float = 0.02, top_n: int = 25):
+        self.output_dir = output_dir or Path.home() / ".ai_chat_app" / "profiles"
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.top_n = top_n
+        self.is_running = False
+        self.last_output: Optional[Path] = None
+        self._stacks: Counter = Counter()
+        self._labels: Dict[object, str] = {}
+        self._thread_names: Dict[int, str] = {}
+        self._sample_count = 0
+        self._sample_time = 0.0
+        self._started_at = 0.0
+        self._duration = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start sampling on a background thread"""
+        with self._lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            self._stacks = Counter()
+            self._sample_count = 0
+            self._sample_time = 0.0
+            self._started_at = time.perf_counter()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> Optional[Path]:
+        """Stop sampling and write the profile; returns the collapsed-stack path"""
+        with self._lock:
+            if not self.is_running:
+                return None
+            self.is_running = False
+            self._stop_event.set()
+            thread = self._thread
+
+        thread.join()
+        self._duration = time.perf_counter() - self._started_at
+        self.last_output = self._write_output()
+        return self.last_output
+
+    def toggle(self) -> Optional[Path]:
+        """Start if stopped, otherwise stop and return the output path"""
+        if self.is_running:
+            return self.stop()
+        self.start()
+        return None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.is_set():
+            started = time.perf_counter()
+            self._sample(own_id)
+            cost = time.perf_counter() - started
+            self._sample_time += cost
+            self._sample_count += 1
+
+            # Sampling holds the GIL, so stretch the interval to keep the
+            # fraction of wall time spent sampling under max_overhead
+            self._stop_event.wait(max(self.interval, cost / self.max_overhead))
+
+    def _sample(self, own_id: int):
+        frames = sys._current_frames()
+        if any(thread_id not in self._thread_names for thread_id in frames):
+            self._thread_names = {t.ident: t.name for t in threading.enumerate()}
+
+        for thread_id, frame in frames.items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(self._thread_names.get(thread_id, f"thread-{thread_id}"))
+            stack.reverse()
+            self._stacks[tuple(stack)] += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, 'co_qualname', code.co_name)
+            label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _write_output(self) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stem = self.output_dir / f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        collapsed_path = stem.with_suffix('.folded')
+        summary_path = stem.with_suffix('.txt')
+
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(';'.join(frame.replace(';', ':') for frame in stack))
+                f.write(f" {count}\n")
+
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(self.summary())
+
+        return collapsed_path
+
+    def summary(self) -> str:
+        """Top functions by self and inclusive samples"""
+        elapsed = time.perf_counter() - self._started_at if self.is_running else self._duration
+        total = sum(self._stacks.values())
+        self_counts: Counter = Counter()
+        inclusive_counts: Counter = Counter()
+        for stack, count in self._stacks.items():
+            if len(stack) > 1:
+                self_counts[stack[-1]] += count
+            for frame in set(stack[1:]):
+                inclusive_counts[frame] += count
+
+        overhead = self._sample_time / max(1e-9, elapsed)
+        lines = [
+            f"Samples: {self._sample_count} ({total} thread stacks)",
+            f"Duration: {elapsed:.2f}s",
+            f"Sampler overhead: {overhead * 100:.2f}% of wall time",
+            "",
+            f"Top {self.top_n} by self samples:",
+        ]
+        for frame, count in self_counts.most_common(self.top_n):
+            lines.append(f"  {count / max(1, total) * 100:6.2f}%  {count:7d}  {frame}")
+
+        lines += ["", f"Top {self.top_n} by inclusive samples:"]
+        for frame, count in inclusive_counts.most_common(self.top_n):
+            lines.append(f"  {count / max(1, total) * 100:6.2f}%  {count:7d}  {frame}")
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,53 @@
+"""
+AI Provider Adapters
+Registry of provider adapters selected by the ``ai.api_provider`` setting.
+
+Adapter modules (and anything heavy they depend on, such as ``requests``)
+are imported only when their provider is selected, so unused providers cost
+nothing at startup.
+"""
+
+import importlib
+from typing import Dict, Any, Tuple
+
+from .base import BaseProvider, ProviderCapabilities, GenerationCancelled, NetworkError, ToolCall, Usage
+
+# provider name -> (module, class name)
+PROVIDER_REGISTRY: Dict[str, Tuple[str, str]] = {
+    'mock': ('.mock', 'MockProvider'),
+    'openai': ('.openai_compat', 'OpenAICompatibleProvider'),
+    'anthropic': ('.anthropic_compat', 'AnthropicCompatibleProvider'),
+    'local': ('.local', 'LocalProvider'),
+    'replay': ('.replay', 'ReplayProvider'),
+}
+
+
+def register_provider(name: str, module: str, class_name: str):
+    """Register an additional adapter without importing it"""
+    PROVIDER_REGISTRY[name] = (module, class_name)
+
+
+def available_providers() -> list:
+    """Get the names of all registered providers"""
+    return list(PROVIDER_REGISTRY)
+
+
+def get_provider_class(name: str) -> type:
+    """Import and return the adapter class for a provider name"""
+    if name not in PROVIDER_REGISTRY:
+        raise ValueError(f"Unknown AI provider: {name}")
+
+    module_name, class_name = PROVIDER_REGISTRY[name]
+    module = importlib.import_module(module_name, __name__)
+    return getattr(module, class_name)
+
+
+def create_provider(name: str, settings: Dict[str, Any], **kwargs) -> BaseProvider:
+    """Create an adapter instance for the given provider"""
+    return get_provider_class(name)(settings, **kwargs)
+
+
+__all__ = ['BaseProvider', 'ProviderCapabilities', 'GenerationCancelled', 'NetworkError', 'ToolCall', 'Usage',
+           'PROVIDER_REGISTRY',
+           'register_provider', 'available_providers', 'get_provider_class',
+           'create_provider']
@@ -0,0 +1,107 @@
+"""
+Anthropic-Compatible Provider
+Adapter for the Anthropic Messages API and compatible servers.
+"""
+
+from typing import Dict, Any, Iterator, List, Optional, Union
+
+from .base import BaseProvider, ProviderCapabilities, ToolCall, Usage, parse_tool_arguments
+from .transport import post_stream, iter_sse, warm_connection
+
+
+class AnthropicCompatibleProvider(BaseProvider):
+    name = 'anthropic'
+    capabilities = ProviderCapabilities(streaming=True, batching=False,
+                                        max_context=200_000, tokenizer='approx', tools=True)
+    default_base_url = 'https://api.anthropic.com/v1'
+    api_version = '2023-06-01'
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "x-api-key": self.api_key,
+            "anthropic-version": self.api_version
+        }
+
+    def build_payload(self, messages: List[Dict[str, Any]], tools: Optional[list] = None) -> Dict[str, Any]:
+        # The Messages API takes the system prompt separately
+        system = '\n'.join(m['content'] for m in messages if m['role'] == 'system')
+        payload = {
+            "model": self.model,
+            "messages": [m for m in messages if m['role'] != 'system'],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": True
+        }
+        if system:
+            payload["system"] = system
+        if tools:
+            payload["tools"] = tools
+        return payload
+
+    def warm(self):
+        """Load the tokenizer and open a pooled connection to the endpoint"""
+        super().warm()
+        warm_connection(self.base_url)
+
+    def stream_chat(self, messages: List[Dict[str, str]], generation=None) -> Iterator[str]:
+        """Stream text deltas from /messages"""
+        return (chunk for chunk in self.stream_turn(messages, None, generation) if isinstance(chunk, str))
+
+    def stream_turn(self, messages: List[Dict[str, Any]], tools: Optional[list] = None,
+                    generation=None) -> Iterator[Union[str, ToolCall, Usage]]:
+        """Stream text deltas; each tool_use block becomes a ToolCall when it closes"""
+        self.check_ready()
+        response = post_stream(self.base_url, '/messages', self.headers(),
+                               self.build_payload(messages, tools), generation)
+
+        blocks: Dict[int, Dict[str, Any]] = {}
+        prompt_tokens = completion_tokens = None
+        for event in iter_sse(response, generation):
+            if event is None or event.get('type') == 'message_stop':
+                break
+            kind = event.get('type')
+            if kind == 'message_start':
+                # Input tokens come first; cached prompt tokens are counted separately
+                usage = event.get('message', {}).get('usage') or {}
+                prompt_tokens = sum(usage.get(name) or 0 for name in
+                                    ('input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'))
+                completion_tokens = usage.get('output_tokens')
+            elif kind == 'message_delta':
+                # Output tokens so far; the last delta has the final count
+                completion_tokens = (event.get('usage') or {}).get('output_tokens', completion_tokens)
+            elif kind == 'content_block_start':
+                block = event.get('content_block', {})
+                if block.get('type') == 'tool_use':
+                    blocks[event.get('index', 0)] = {"id": block.get('id', ''), "name": block.get('name', ''),
+                                                     "input": []}
+            elif kind == 'content_block_delta':
+                delta = event.get('delta', {})
+                if delta.get('type') == 'input_json_delta':
+                    if event.get('index', 0) in blocks:
+                        blocks[event.get('index', 0)]["input"].append(delta.get('partial_json', ''))
+                elif delta.get('text'):
+                    yield delta['text']
+            elif kind == 'content_block_stop' and event.get('index', 0) in blocks:
+                block = blocks.pop(event.get('index', 0))
+                yield ToolCall(block["id"], block["name"], parse_tool_arguments(block["input"]))
+            elif kind == 'error':
+                raise Exception(f"API error: {event.get('error', {}).get('message', 'unknown')}")
+        if prompt_tokens is not None:
+            yield Usage(prompt_tokens, completion_tokens or 0)
+
+    def format_tools(self, specs: list) -> Optional[list]:
+        return [{"name": spec.name, "description": spec.description,
+                 "input_schema": spec.parameters} for spec in specs] or None
+
+    def tool_messages(self, text: str, calls: List[ToolCall], results: list) -> List[Dict[str, Any]]:
+        content = [{"type": "text", "text": text}] if text else []
+        content += [{"type": "tool_use", "id": call.id, "name": call.name, "input": call.arguments or {}}
+                    for call in calls]
+        return [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": result.call_id,
+                                          "content": result.content, "is_error": result.error}
+                                         for result in results]}
+        ]
+
@@ -0,0 +1,136 @@
+"""
+Provider Base
+Common adapter interface and capability declaration for AI providers.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, Iterator, List, Optional, Union
+
+
+class GenerationCancelled(Exception):
+    """Raised inside a worker once its generation has been stopped"""
+
+
+class NetworkError(Exception):
+    """Raised when a provider cannot be reached"""
+
+
+@dataclass(frozen=True)
+class ProviderCapabilities:
+    streaming: bool
+    batching: bool
+    max_context: int  # tokens
+    tokenizer: str  # tokenizer family used by count_tokens
+    tools: bool = False  # supports stream_turn() tool calling
+
+
+@dataclass(frozen=True)
+class ToolCall:
+    """A tool invocation requested by the model"""
+    id: str
+    name: str
+    arguments: Optional[Dict[str, Any]]  # None if the model sent invalid JSON
+
+
+@dataclass(frozen=True)
+class Usage:
+    """Token counts the provider reported for one model turn"""
+    prompt_tokens: int
+    completion_tokens: int
+
+
+def parse_tool_arguments(fragments: List[str]) -> Optional[Dict[str, Any]]:
+    """Join streamed argument fragments into a dict; None if they aren't a JSON object"""
+    text = ''.join(fragments).strip()
+    if not text:
+        return {}
+    try:
+        arguments = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return arguments if isinstance(arguments, dict) else None
+
+
+class BaseProvider:
+    """Base class for AI provider adapters
+
+    Subclasses implement stream_chat(); everything else has a usable default.
+    """
+
+    name = 'base'
+    capabilities = ProviderCapabilities(streaming=False, batching=False,
+                                        max_context=4096, tokenizer='approx')
+    default_base_url = ''
+    requires_api_key = True
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.model = settings.get('model', '')
+        self.max_tokens = settings.get('max_tokens', 500)
+        self.temperature = settings.get('temperature', 0.7)
+        self.api_key = settings.get('api_key', '')
+        self.base_url = (settings.get('base_url') or self.default_base_url).rstrip('/')
+
+    def stream_chat(self, messages: List[Dict[str, str]], generation=None) -> Iterator[str]:
+        """Yield response text chunks for a list of role/content messages"""
+        raise NotImplementedError
+
+    def stream_turn(self, messages: List[Dict[str, Any]], tools: Optional[list] = None,
+                    generation=None) -> Iterator[Union[str, ToolCall, Usage]]:
+        """Stream one model turn that may end in tool calls
+
+        Yields text chunks, then a ToolCall for each tool the model wants
+        run, then a Usage if the provider reports token counts. tools is the
+        provider-formatted list from format_tools(); adapters without tool
+        support just stream text.
+        """
+        return self.stream_chat(messages, generation)
+
+    def format_tools(self, specs: list) -> Optional[list]:
+        """Tool definitions in this provider's request format"""
+        return None
+
+    def tool_messages(self, text: str, calls: List[ToolCall], results: list) -> List[Dict[str, Any]]:
+        """Messages recording a turn's tool calls and their results, to send back"""
+        raise NotImplementedError
+
+    def complete(self, messages: List[Dict[str, str]], generation=None) -> str:
+        """Get the full response for a list of role/content messages"""
+        return ''.join(self.stream_chat(messages, generation))
+
+    def batch_complete(self, conversations: List[List[Dict[str, str]]]) -> List[str]:
+        """Complete several independent conversations
+
+        Providers without native batching run them concurrently over the
+        shared connection pool.
+        """
+        if not conversations:
+            return []
+        with ThreadPoolExecutor(max_workers=min(4, len(conversations))) as pool:
+            return list(pool.map(self.complete, conversations))
+
+    def count_tokens(self, text: str) -> int:
+        """Estimate the number of tokens in text"""
+        # Roughly four characters per token for English text
+        return max(1, len(text) // 4)
+
+    def check_ready(self):
+        """Raise if the adapter cannot make requests with its current settings"""
+        if self.requires_api_key and not self.api_key:
+            raise Exception("API key not configured")
+
+    def warm(self):
+        """Open connections and load anything needed for the first request"""
+        self.count_tokens("warm up")
+
+    def probe(self, timeout: float = 3):
+        """Raise NetworkError if the endpoint can't be reached (cheap HEAD request)"""
+        if self.base_url:
+            from .transport import warm_connection
+            warm_connection(self.base_url, timeout)
+
+    def close(self):
+        """Release any resources held by the adapter"""
+        pass
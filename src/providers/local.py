@@ -0,0 +1,20 @@
+"""
+Local Provider
+Adapter for locally hosted OpenAI-compatible servers (Ollama, llama.cpp, vLLM).
+"""
+
+from .base import ProviderCapabilities
+from .openai_compat import OpenAICompatibleProvider
+
+
+class LocalProvider(OpenAICompatibleProvider):
+    name = 'local'
+    capabilities = ProviderCapabilities(streaming=True, batching=False,
+                                        max_context=8192, tokenizer='approx')
+    default_base_url = 'http://localhost:11434/v1'
+    requires_api_key = False
+    stream_usage = False  # Not every local server accepts stream_options; usage is estimated
+
+    def count_tokens(self, text: str) -> int:
+        # Local model vocabularies vary; avoid loading tiktoken for them
+        return max(1, len(text) // 4)
@@ -0,0 +1,58 @@
+"""
+Mock Provider
+Offline adapter that streams canned responses with simulated latency.
+"""
+
+import random
+from typing import Dict, Any, Iterator, List, Callable, Optional
+
+from .base import BaseProvider, ProviderCapabilities, GenerationCancelled
+
+
+class MockProvider(BaseProvider):
+    name = 'mock'
+    capabilities = ProviderCapabilities(streaming=True, batching=True,
+                                        max_context=1_000_000, tokenizer='whitespace')
+    requires_api_key = False
+
+    def __init__(self, settings: Dict[str, Any], responder: Optional[Callable[[str], str]] = None,
+                 latency: Optional[Dict[str, Any]] = None):
+        super().__init__(settings)
+        self.responder = responder or (lambda message: f"You said: {message}")
+        latency = latency or {}
+        self.first_token_ms = latency.get('first_token_ms', 500)
+        self.ms_per_char = latency.get('ms_per_char', 10)  # "Reading" time for the prompt
+        # Capped so long prompts (inlined attachments) don't stall for minutes
+        self.max_think_ms = latency.get('max_think_ms', 2000)
+        self.token_ms = latency.get('token_ms', 25)
+        self.words_per_chunk = max(1, latency.get('words_per_chunk', 1))
+        self.jitter = latency.get('jitter', 0.0)  # Random +/- fraction applied to every delay
+
+    def _delay(self, ms: float) -> float:
+        if self.jitter:
+            ms *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.0, ms / 1000)
+
+    def stream_chat(self, messages: List[Dict[str, str]], generation=None) -> Iterator[str]:
+        """Stream the mock response in word chunks, honouring cancellation"""
+        message = messages[-1]['content'] if messages else ''
+
+        # Simulate AI processing time; waiting on the event lets Stop interrupt it
+        think = self._delay(self.first_token_ms + min(len(message) * self.ms_per_char, self.max_think_ms))
+        if generation is not None and generation.cancel_event.wait(think):
+            raise GenerationCancelled()
+
+        words = self.responder(message).split(' ')
+        for start in range(0, len(words), self.words_per_chunk):
+            chunk = ' '.join(words[start:start + self.words_per_chunk])
+            yield chunk if start == 0 else ' ' + chunk
+            if generation is not None and generation.cancel_event.wait(self._delay(self.token_ms)):
+                raise GenerationCancelled()
+
+    def batch_complete(self, conversations: List[List[Dict[str, str]]]) -> List[str]:
+        """Answer every conversation immediately"""
+        return [self.responder(messages[-1]['content'] if messages else '')
+                for messages in conversations]
+
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
@@ -0,0 +1,120 @@
+"""
+OpenAI-Compatible Provider
+Adapter for the OpenAI chat completions API and compatible servers.
+"""
+
+import json
+from typing import Dict, Any, Iterator, List, Optional, Union
+
+from .base import BaseProvider, ProviderCapabilities, ToolCall, Usage, parse_tool_arguments
+from .transport import post_stream, iter_sse, warm_connection
+
+
+class OpenAICompatibleProvider(BaseProvider):
+    name = 'openai'
+    capabilities = ProviderCapabilities(streaming=True, batching=False,
+                                        max_context=16_385, tokenizer='tiktoken', tools=True)
+    default_base_url = 'https://api.openai.com/v1'
+    stream_usage = True  # Ask for a final chunk with token counts (stream_options)
+
+    def __init__(self, settings: Dict[str, Any]):
+        super().__init__(settings)
+        self._encoding = None
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def build_payload(self, messages: List[Dict[str, Any]], tools: Optional[list] = None) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": True
+        }
+        if tools:
+            payload["tools"] = tools
+        if self.stream_usage:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def warm(self):
+        """Load the tokenizer and open a pooled connection to the endpoint"""
+        super().warm()
+        warm_connection(self.base_url)
+
+    def stream_chat(self, messages: List[Dict[str, str]], generation=None) -> Iterator[str]:
+        """Stream content deltas from /chat/completions"""
+        return (chunk for chunk in self.stream_turn(messages, None, generation) if isinstance(chunk, str))
+
+    def stream_turn(self, messages: List[Dict[str, Any]], tools: Optional[list] = None,
+                    generation=None) -> Iterator[Union[str, ToolCall, Usage]]:
+        """Stream content deltas, then the tool calls assembled from their fragments"""
+        self.check_ready()
+        response = post_stream(self.base_url, '/chat/completions', self.headers(),
+                               self.build_payload(messages, tools), generation)
+
+        # Tool calls arrive as fragments keyed by index: id and name first,
+        # then the JSON arguments a few characters at a time
+        calls: Dict[int, Dict[str, Any]] = {}
+        usage = None
+        for event in iter_sse(response, generation):
+            if event is None:
+                break
+            # Sent in a last chunk with no choices
+            usage = event.get('usage') or usage
+            choices = event.get('choices') or [{}]
+            delta = choices[0].get('delta') or {}
+            content = delta.get('content')
+            if content:
+                yield content
+            for fragment in delta.get('tool_calls') or []:
+                call = calls.setdefault(fragment.get('index', 0), {"id": "", "name": "", "arguments": []})
+                function = fragment.get('function') or {}
+                call["id"] = fragment.get('id') or call["id"]
+                call["name"] = function.get('name') or call["name"]
+                if function.get('arguments'):
+                    call["arguments"].append(function['arguments'])
+
+        for index in sorted(calls):
+            call = calls[index]
+            yield ToolCall(call["id"] or f"call_{index}", call["name"], parse_tool_arguments(call["arguments"]))
+        if usage:
+            yield Usage(usage.get('prompt_tokens') or 0, usage.get('completion_tokens') or 0)
+
+    def format_tools(self, specs: list) -> Optional[list]:
+        return [{"type": "function",
+                 "function": {"name": spec.name, "description": spec.description,
+                              "parameters": spec.parameters}} for spec in specs] or None
+
+    def tool_messages(self, text: str, calls: List[ToolCall], results: list) -> List[Dict[str, Any]]:
+        assistant = {
+            "role": "assistant",
+            "content": text or None,
+            "tool_calls": [{"id": call.id, "type": "function",
+                            "function": {"name": call.name,
+                                         "arguments": json.dumps(call.arguments or {})}}
+                           for call in calls]
+        }
+        return [assistant] + [{"role": "tool", "tool_call_id": result.call_id, "content": result.content}
+                              for result in results]
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with tiktoken when it is installed"""
+        if self._encoding is None:
+            try:
+                import tiktoken
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding('cl100k_base')
+            except ImportError:
+                self._encoding = False
+
+        if self._encoding:
+            return len(self._encoding.encode(text))
+        return super().count_tokens(text)
+
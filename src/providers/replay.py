@@ -0,0 +1,77 @@
+"""
+Replay Provider
+Offline adapter that answers from a captured trace file, reproducing each
+exchange's chunks at the original arrival times (scaled by ``replay_speed``).
+"""
+
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Any, Iterator, List
+
+from .base import BaseProvider, ProviderCapabilities, GenerationCancelled, NetworkError
+from ..tracing import load_traces, payload_hash
+
+
+class ReplayProvider(BaseProvider):
+    name = 'replay'
+    requires_api_key = False
+
+    def __init__(self, settings: Dict[str, Any]):
+        super().__init__(settings)
+        # 1.0 = original pace, 4.0 = four times faster, 0 = no delays at all
+        self.speed = settings.get('replay_speed', 1.0)
+        trace_file = settings.get('trace_file', '')
+        self.traces = load_traces(Path(trace_file).expanduser()) if trace_file else []
+        self.by_hash: Dict[str, deque] = {}
+        for trace in self.traces:
+            self.by_hash.setdefault(trace.get("hash"), deque()).append(trace)
+        self.remaining = deque(self.traces)
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Build contexts the same way as the captured provider did
+        first = self.traces[0] if self.traces else {}
+        self.capabilities = ProviderCapabilities(streaming=True, batching=False,
+                                                 max_context=first.get("max_context", 1_000_000),
+                                                 tokenizer='approx')
+        self.max_tokens = first.get("max_tokens", self.max_tokens)
+
+    def next_trace(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """The captured exchange for a request
+
+        Matches on the payload hash; if the conversation has drifted from
+        the capture, falls back to the next exchange in capture order.
+        """
+        with self._lock:
+            matches = self.by_hash.get(payload_hash(messages))
+            if matches:
+                trace = matches[0]
+            elif self.remaining:
+                self.misses += 1
+                trace = self.remaining[0]
+            else:
+                raise NetworkError("Trace exhausted: no captured exchange left to replay")
+            self.by_hash[trace.get("hash")].remove(trace)
+            self.remaining.remove(trace)
+            return trace
+
+    def stream_chat(self, messages: List[Dict[str, str]], generation=None) -> Iterator[str]:
+        """Yield the captured chunks with their original spacing"""
+        trace = self.next_trace(messages)
+        started = time.perf_counter()
+
+        for offset_ms, chunk in zip(trace.get("offsets_ms", []), trace.get("chunks", [])):
+            if self.speed > 0:
+                delay = offset_ms / 1000 / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    if generation is not None:
+                        if generation.cancel_event.wait(delay):
+                            raise GenerationCancelled()
+                    else:
+                        time.sleep(delay)
+            yield chunk
+
+        if trace.get("status") == "error":
+            raise NetworkError(trace.get("error", "Captured request failed"))
@@ -0,0 +1,99 @@
+"""
+HTTP Transport
+Shared keep-alive connection pools and server-sent-event parsing for adapters.
+"""
+
+import json
+import threading
+from typing import Dict, Iterator, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .base import NetworkError
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(base_url: str) -> requests.Session:
+    """Get the pooled session for a provider endpoint
+
+    Sessions are shared by every adapter talking to the same endpoint so that
+    TCP/TLS connections are reused across requests, models and windows.
+    """
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[base_url] = session
+        return session
+
+
+def warm_connection(base_url: str, timeout: float = 5):
+    """Open a connection to the endpoint and leave it idle in the pool
+
+    Any HTTP status is fine; the point is to complete DNS, TCP and TLS setup
+    before the first real request needs them.
+    """
+    try:
+        response = get_session(base_url).head(base_url, timeout=timeout)
+        response.close()
+    except requests.exceptions.RequestException as e:
+        raise NetworkError(f"Network error: {str(e)}")
+
+
+def close_sessions():
+    """Close all pooled sessions"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def post_stream(base_url: str, path: str, headers: Dict[str, str],
+                payload: Dict[str, Any], generation=None, timeout: float = 30):
+    """POST a streaming request and register it with the generation for aborting"""
+    try:
+        response = get_session(base_url).post(
+            f"{base_url}{path}",
+            headers=headers,
+            json=payload,
+            timeout=timeout,
+            stream=True
+        )
+    except requests.exceptions.RequestException as e:
+        raise NetworkError(f"Network error: {str(e)}")
+
+    if generation is not None:
+        generation.attach_response(response)
+
+    if response.status_code != 200:
+        response.close()
+        raise Exception(f"API error: {response.status_code}")
+
+    return response
+
+
+def iter_sse(response, generation=None) -> Iterator[Optional[Dict[str, Any]]]:
+    """Yield decoded JSON events from a server-sent-event stream
+
+    Yields None for the terminal ``[DONE]`` marker.
+    """
+    try:
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if generation is not None:
+                    generation.check_cancelled()
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    yield None
+                    return
+                yield json.loads(data)
+    except requests.exceptions.RequestException as e:
+        raise NetworkError(f"Network error: {str(e)}")
@@ -0,0 +1,175 @@
+"""
+Retrieval Responder
+Offline BM25 index over past prompt/reply pairs for answering without a network.
+
+Postings are kept in growable NumPy arrays so that scoring a query is a few
+vectorized operations per query term, independent of Python-level loops over
+documents. A pure-Python fallback is used when NumPy is not installed.
+"""
+
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i in is it me my of on "
+    "or so that the this to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class _Postings:
+    """Growable (doc id, term frequency) arrays for one term"""
+
+    __slots__ = ('doc_ids', 'tfs', 'size')
+
+    def __init__(self):
+        self.doc_ids = np.empty(4, dtype=np.int32)
+        self.tfs = np.empty(4, dtype=np.float32)
+        self.size = 0
+
+    def append(self, doc_id: int, tf: int):
+        if self.size == len(self.doc_ids):
+            # Amortized doubling keeps incremental adds O(1)
+            self.doc_ids = np.resize(self.doc_ids, self.size * 2)
+            self.tfs = np.resize(self.tfs, self.size * 2)
+        self.doc_ids[self.size] = doc_id
+        self.tfs[self.size] = tf
+        self.size += 1
+
+
+class RetrievalResponder:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.answers: List[str] = []
+        self.postings: Dict[str, object] = {}
+        self.total_length = 0
+        self.is_ready = False
+        self._lock = threading.Lock()
+
+        if NUMPY_AVAILABLE:
+            self.doc_lengths = np.empty(1024, dtype=np.float32)
+        else:
+            self.doc_lengths = []
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def build(self, pairs):
+        """Index an iterable of (prompt, answer) pairs, then mark the index ready"""
+        for prompt, answer in pairs:
+            self.add(prompt, answer)
+        self.is_ready = True
+
+    def add(self, prompt: str, answer: str):
+        """Add one prompt/answer pair to the index"""
+        terms = tokenize(prompt)
+        if not terms or not answer:
+            return
+
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+
+        with self._lock:
+            doc_id = len(self.answers)
+            self.answers.append(answer)
+            self.total_length += len(terms)
+
+            if NUMPY_AVAILABLE:
+                if doc_id == len(self.doc_lengths):
+                    self.doc_lengths = np.resize(self.doc_lengths, doc_id * 2)
+                self.doc_lengths[doc_id] = len(terms)
+                for term, tf in counts.items():
+                    postings = self.postings.get(term)
+                    if postings is None:
+                        postings = self.postings[term] = _Postings()
+                    postings.append(doc_id, tf)
+            else:
+                self.doc_lengths.append(len(terms))
+                for term, tf in counts.items():
+                    self.postings.setdefault(term, []).append((doc_id, tf))
+
+    def lookup(self, query: str, min_score: float = 0.35) -> Optional[Tuple[str, float]]:
+        """Find the best past answer for a query
+
+        Returns (answer, confidence) where confidence is the BM25 score divided
+        by its upper bound for this query, or None if nothing scores high enough.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return None
+
+        with self._lock:
+            doc_count = len(self.answers)
+            if doc_count == 0:
+                return None
+
+            avg_length = self.total_length / doc_count
+            idfs = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                df = (postings.size if NUMPY_AVAILABLE else len(postings)) if postings else 0
+                idfs[term] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+            if NUMPY_AVAILABLE:
+                best, score = self._score_numpy(terms, idfs, doc_count, avg_length)
+            else:
+                best, score = self._score_python(terms, idfs, avg_length)
+
+            if best is None:
+                return None
+            answer = self.answers[best]
+
+        upper_bound = sum(idfs.values()) * (self.k1 + 1)
+        confidence = score / upper_bound if upper_bound else 0.0
+        if confidence < min_score:
+            return None
+        return answer, confidence
+
+    def _score_numpy(self, terms, idfs, doc_count, avg_length):
+        id_parts = []
+        score_parts = []
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            ids = postings.doc_ids[:postings.size]
+            tfs = postings.tfs[:postings.size]
+            length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / avg_length)
+            id_parts.append(ids)
+            score_parts.append(idfs[term] * tfs * (self.k1 + 1) / (tfs + length_norm))
+
+        if not id_parts:
+            return None, 0.0
+
+        # Sum per-term contributions by doc id; only touches matching docs
+        scores = np.bincount(np.concatenate(id_parts), weights=np.concatenate(score_parts),
+                             minlength=0)
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def _score_python(self, terms, idfs, avg_length):
+        scores: Dict[int, float] = {}
+        for term in terms:
+            for doc_id, tf in self.postings.get(term, ()):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idfs[term] * tf * (self.k1 + 1) / (tf + norm)
+
+        if not scores:
+            return None, 0.0
+        best = max(scores, key=scores.get)
+        return best, scores[best]
@@ -0,0 +1,346 @@
+"""
+Prompt Scheduler
+Runs recurring and deferred prompts in the background while the app sits in
+the tray. Jobs live in the ``scheduler.jobs`` config list, each with a
+cron-style ``cron`` spec ("0 9 * * 1-5") or a one-shot ``at`` time.
+
+Runs missed while the machine slept (or the app was closed) are coalesced
+into a single run. Jobs execute on a small pool of low-priority threads and
+wait while an interactive chat request is in flight.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Any, FrozenSet, List, Optional
+
+from .logger import get_logger
+
+log = get_logger('scheduler')
+
+STATE_PATH = Path.home() / ".ai_chat_app" / "scheduler.json"
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+
+def _parse_field(text: str, low: int, high: int) -> FrozenSet[int]:
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid step in {text!r}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            # "5/15" means every 15 starting at 5
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"Value out of range in {text!r}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSpec:
+    """A five-field cron expression: minute hour day-of-month month day-of-week"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        fields = ALIASES.get(spec.strip(), spec).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron spec needs five fields: {spec!r}")
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        # 0 and 7 are both Sunday
+        self.weekdays = frozenset(day % 7 for day in _parse_field(fields[4], 0, 7))
+        # As in cron, restricting both day fields matches either of them
+        self._either_day = fields[2] != '*' and fields[4] != '*'
+
+    def _matches_day(self, moment: datetime) -> bool:
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        return in_days or in_weekdays if self._either_day else in_days and in_weekdays
+
+    def next_after(self, after: datetime) -> datetime:
+        """The first matching minute strictly after a time"""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Skips whole months/days/hours, so this takes at most a few thousand steps
+        for _ in range(100000):
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._matches_day(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron spec never matches: {self.spec!r}")
+
+
+_CHECKED_SPECS: Dict[str, Any] = {}  # Spec -> CronSpec, or the error message it raised
+
+
+def _checked_cron(spec: str) -> CronSpec:
+    """Parse a spec and make sure it ever matches (cached: jobs are reloaded every loop)
+
+    Specs such as "0 0 30 2 *" parse but never match; they are rejected here
+    rather than failing in the scheduler thread.
+    """
+    checked = _CHECKED_SPECS.get(spec)
+    if checked is None:
+        try:
+            checked = CronSpec(spec)
+            checked.next_after(datetime.now())
+        except ValueError as e:
+            checked = str(e)
+        _CHECKED_SPECS[spec] = checked
+    if isinstance(checked, str):
+        raise ValueError(checked)
+    return checked
+
+
+@dataclass
+class ScheduledJob:
+    id: str
+    prompt: str
+    name: str
+    cron: Optional[CronSpec] = None
+    at: Optional[datetime] = None
+
+    @classmethod
+    def from_config(cls, data: Dict[str, Any]) -> 'ScheduledJob':
+        job_id = str(data.get("id") or data.get("name") or data["prompt"][:32])
+        cron = _checked_cron(data["cron"]) if data.get("cron") else None
+        at = datetime.fromisoformat(data["at"]) if data.get("at") else None
+        if cron is None and at is None:
+            raise ValueError(f"Job {job_id!r} needs a cron spec or an at time")
+        return cls(job_id, data["prompt"], data.get("name", job_id), cron, at)
+
+    def next_due(self, last_run: Optional[datetime], first_seen: datetime) -> Optional[datetime]:
+        """When the job should next run, given its last run"""
+        if self.at is not None:
+            return None if last_run is not None else self.at
+        return self.cron.next_after(last_run or first_seen)
+
+
+@dataclass
+class ScheduledResult:
+    job_id: str
+    name: str
+    prompt: str
+    text: str
+    ok: bool
+    finished: datetime = field(default_factory=datetime.now)
+    coalesced: int = 1  # Due runs this result stands for
+
+
+def load_jobs(config) -> List[ScheduledJob]:
+    """Enabled jobs from the config; invalid entries are logged and skipped"""
+    jobs = []
+    for data in config.get('scheduler.jobs', []):
+        if not data.get("enabled", True):
+            continue
+        try:
+            jobs.append(ScheduledJob.from_config(data))
+        except (KeyError, ValueError) as e:
+            log.warning("Skipping scheduled job %r: %s", data.get("id", data), e)
+    return jobs
+
+
+def load_state(path: Path = STATE_PATH) -> Dict[str, Dict[str, str]]:
+    """Per-job run times kept across launches"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def next_runs(config, state: Optional[Dict[str, Dict[str, str]]] = None) -> List[tuple]:
+    """(job, next due time or None) for every enabled job"""
+    state = load_state() if state is None else state
+    now = datetime.now()
+    runs = []
+    for job in load_jobs(config):
+        job_state = state.get(job.id, {})
+        last_run = job_state.get("last_run")
+        first_seen = job_state.get("first_seen")
+        runs.append((job, job.next_due(datetime.fromisoformat(last_run) if last_run else None,
+                                       datetime.fromisoformat(first_seen) if first_seen else now)))
+    return runs
+
+
+def _lower_thread_priority():
+    """Pool initializer: deprioritise the worker thread where the OS allows it"""
+    try:
+        # On Linux a thread's native id works as a pid for setpriority
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+class Scheduler:
+    def __init__(self, controller, on_result: Callable[[ScheduledResult], None],
+                 state_path: Optional[Path] = None, max_concurrent: int = 1):
+        self.controller = controller
+        self.on_result = on_result
+        self.state_path = state_path or STATE_PATH
+        self.max_concurrent = max_concurrent
+        self.is_running = False
+        self._state: Dict[str, Dict[str, str]] = {}
+        self._running_jobs = set()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pool = None
+
+    def start(self):
+        """Start the scheduling thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._state = load_state(self.state_path)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="scheduled",
+                                        initializer=_lower_thread_priority)
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop scheduling; jobs already running finish in the background"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        self._wake.set()
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def reload(self):
+        """Re-read the job list now rather than at the next tick"""
+        self._wake.set()
+
+    def next_runs(self) -> List[tuple]:
+        """(job, next due time or None) for every enabled job"""
+        return next_runs(self.controller.config, self._state)
+
+    # Background loop
+
+    def _run(self):
+        while self.is_running:
+            self._wake.clear()
+            now = datetime.now()
+            wait = self.controller.config.get('scheduler.max_sleep', 60)
+            for job in load_jobs(self.controller.config):
+                try:
+                    due = self._due(job, now)
+                except Exception as e:
+                    # One broken job must not stop the others
+                    log.exception("Error scheduling job %r: %s", job.id, e)
+                    continue
+                if due is None:
+                    continue
+                if due > now:
+                    wait = min(wait, (due - now).total_seconds())
+                    continue
+                with self._lock:
+                    if job.id in self._running_jobs:
+                        continue
+                    self._running_jobs.add(job.id)
+                self._submit(job, self._missed(job, due, now))
+            # Capped, because a timed wait doesn't notice that the machine slept
+            # and the wall clock jumped past a job's due time
+            self._wake.wait(max(1.0, wait))
+
+    def _due(self, job: ScheduledJob, now: datetime) -> Optional[datetime]:
+        job_state = self._state.setdefault(job.id, {})
+        if "first_seen" not in job_state:
+            job_state["first_seen"] = now.isoformat()
+            self._save_state()
+        last_run = job_state.get("last_run")
+        due = job.next_due(datetime.fromisoformat(last_run) if last_run else None,
+                           datetime.fromisoformat(job_state["first_seen"]))
+        if due is not None and due <= now and not self.controller.config.get('scheduler.catch_up', True):
+            # Drop runs missed while asleep or closed; only run what is due now
+            if now - due > timedelta(minutes=1):
+                job_state["last_run"] = now.isoformat()
+                self._save_state()
+                return job.next_due(now, now)
+        return due
+
+    def _missed(self, job: ScheduledJob, due: datetime, now: datetime) -> int:
+        """How many due times a run at now stands for"""
+        if job.cron is None:
+            return 1
+        count = 1
+        moment = job.cron.next_after(due)
+        while moment <= now and count < 1000:
+            count += 1
+            moment = job.cron.next_after(moment)
+        return count
+
+    def _submit(self, job: ScheduledJob, coalesced: int):
+        # Recorded up front so a crash mid-run doesn't repeat the job on restart
+        self._state[job.id]["last_run"] = datetime.now().isoformat()
+        self._save_state()
+        if coalesced > 1:
+            log.info("Job %s missed %d runs; running once", job.id, coalesced - 1)
+        try:
+            self._pool.submit(self._execute, job, coalesced)
+        except (RuntimeError, AttributeError):
+            # Stopped in the meantime
+            with self._lock:
+                self._running_jobs.discard(job.id)
+
+    def _execute(self, job: ScheduledJob, coalesced: int):
+        started = time.perf_counter()
+        try:
+            # Interactive chat always goes first
+            while self.controller.is_typing and self.is_running:
+                time.sleep(0.25)
+            if not self.is_running:
+                return
+            text = self.controller.run_background_prompt(job.prompt, f"scheduled-{job.id}")
+            result = ScheduledResult(job.id, job.name, job.prompt, text, True, coalesced=coalesced)
+            self.controller.metrics.increment('scheduler.completed')
+        except Exception as e:
+            log.error("Scheduled job %s failed: %s", job.id, e)
+            result = ScheduledResult(job.id, job.name, job.prompt, f"Error: {e}", False,
+                                     coalesced=coalesced)
+            self.controller.metrics.increment('scheduler.failed')
+        finally:
+            with self._lock:
+                self._running_jobs.discard(job.id)
+        self.controller.metrics.observe('scheduler.run_ms', (time.perf_counter() - started) * 1000)
+        self.on_result(result)
+
+    def _save_state(self):
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            temp = self.state_path.with_suffix('.tmp')
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(self._state, f)
+            os.replace(temp, self.state_path)
+        except OSError as e:
+            log.error("Error saving scheduler state: %s", e)
@@ -0,0 +1,162 @@
+"""
+Single Instance
+Process lock and local IPC channel so relaunches talk to the running app.
+
+The running app holds an exclusive lock file and listens on a Unix socket
+(POSIX) or named pipe (Windows). A second launch, or ``main.py send``, connects
+to that channel instead of starting another GUI.
+"""
+
+import os
+import secrets
+import sys
+import threading
+from multiprocessing.connection import Listener, Client
+from pathlib import Path
+from typing import Callable, Dict, Any, Optional
+
+from .logger import get_logger
+
+log = get_logger('ipc')
+
+APP_DIR = Path.home() / ".ai_chat_app"
+
+
+def _ipc_address() -> str:
+    if sys.platform == 'win32':
+        user = os.environ.get('USERNAME', 'user')
+        return rf'\\.\pipe\ai_chat_app-{user}'
+    return str(APP_DIR / "ipc.sock")
+
+
+def _ipc_family() -> str:
+    return 'AF_PIPE' if sys.platform == 'win32' else 'AF_UNIX'
+
+
+def _auth_key(create: bool = False) -> Optional[bytes]:
+    """Per-user secret that authenticates IPC clients"""
+    key_file = APP_DIR / "ipc.key"
+    if create:
+        APP_DIR.mkdir(exist_ok=True)
+        key = secrets.token_bytes(32)
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+    try:
+        return key_file.read_bytes()
+    except OSError:
+        return None
+
+
+class SingleInstance:
+    """Exclusive per-user lock held for the lifetime of the running app"""
+
+    def __init__(self, lock_path: Optional[Path] = None):
+        self.lock_path = lock_path or APP_DIR / "instance.lock"
+        self._lock_file = None
+
+    def acquire(self) -> bool:
+        """Try to take the lock; returns False if another instance holds it"""
+        self.lock_path.parent.mkdir(exist_ok=True)
+        lock_file = open(self.lock_path, 'a+')
+
+        try:
+            if sys.platform == 'win32':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        # The OS drops the lock if we crash, so a stale file is harmless
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        """Release the lock"""
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class IpcServer:
+    """Accepts requests from other launches and dispatches them to a handler"""
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        self.handler = handler
+        self.address = _ipc_address()
+        self.listener = None
+        self.is_running = False
+
+    def start(self):
+        """Start listening on a background thread"""
+        if _ipc_family() == 'AF_UNIX' and os.path.exists(self.address):
+            # We hold the instance lock, so any existing socket is stale
+            os.unlink(self.address)
+
+        self.listener = Listener(self.address, family=_ipc_family(),
+                                 authkey=_auth_key(create=True))
+        self.is_running = True
+        threading.Thread(target=self._accept_loop, name="ipc-server", daemon=True).start()
+
+    def stop(self):
+        """Stop accepting connections"""
+        self.is_running = False
+        if self.listener:
+            try:
+                self.listener.close()
+            except OSError:
+                pass
+            self.listener = None
+
+    def _accept_loop(self):
+        while self.is_running:
+            try:
+                conn = self.listener.accept()
+            except Exception as e:
+                # Failed authentication or shutdown; keep serving unless stopped
+                if self.is_running:
+                    log.warning("IPC accept error: %s", e)
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name="ipc-client",
+                             daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                request = conn.recv()
+                conn.send(self.handler(request))
+            except (EOFError, OSError):
+                pass
+            except Exception as e:
+                try:
+                    conn.send({"ok": False, "error": str(e)})
+                except OSError:
+                    pass
+
+
+def send_request(request: Dict[str, Any], timeout: float = 120) -> Optional[Dict[str, Any]]:
+    """Send a request to the running instance
+
+    Returns the reply, or None if no instance is listening.
+    """
+    key = _auth_key()
+    if key is None:
+        return None
+
+    try:
+        conn = Client(_ipc_address(), family=_ipc_family(), authkey=key)
+    except (OSError, EOFError):
+        return None
+
+    with conn:
+        conn.send(request)
+        if not conn.poll(timeout):
+            return {"ok": False, "error": "Timed out waiting for the running app"}
+        return conn.recv()
@@ -0,0 +1,337 @@
+"""
+Prompt Snippets
+Reusable prompt templates (slash commands such as ``/summarize``) and
+frequent past prompts, offered as completions while typing.
+
+Entries are indexed in a radix trie whose nodes keep their best completions
+precomputed, so a lookup only walks the typed prefix: its cost does not grow
+with the number of entries. The index is built in the background; lookups
+return nothing until it is ready.
+
+Templates may contain variables: ``{name}`` becomes a ‹name› field to fill
+in, ``{name:default}`` is filled with the default, and ``{date}``/``{time}``
+are filled automatically.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .logger import get_logger
+
+log = get_logger('snippets')
+
+SNIPPETS_PATH = Path.home() / ".ai_chat_app" / "snippets.json"
+
+# Written to snippets.json the first time, as a starting point to edit
+DEFAULT_SNIPPETS = [
+    {"trigger": "/summarize", "text": "Summarize the following in {count:3} bullet points: {text}"},
+    {"trigger": "/explain", "text": "Explain {topic} as if I were new to the subject."},
+    {"trigger": "/translate", "text": "Translate into {language:English}: {text}"},
+    {"trigger": "/fix", "text": "Fix the grammar and spelling, keeping the meaning: {text}"},
+    {"trigger": "/email", "text": "Draft a short, friendly email to {recipient} about {subject}."},
+    {"trigger": "/standup", "text": "Draft my standup notes for {date}: yesterday {done}, today {plan}."},
+]
+
+SNIPPET_SCORE = 1_000_000  # Snippets rank above any past prompt
+FIELD_PATTERN = re.compile(r'‹[^›]*›')
+_VARIABLE = re.compile(r'\{(\w+)(?::([^{}]*))?\}')
+
+
+@dataclass
+class Completion:
+    key: str  # Lowercased text the prefix is matched against
+    text: str  # Template (snippets) or prompt (history)
+    kind: str  # 'snippet' or 'history'
+    score: float
+
+    @property
+    def label(self) -> str:
+        """One-line text for the suggestion list"""
+        text = ' '.join(self.text.split())
+        text = text if len(text) <= 80 else text[:77] + '...'
+        return f"{self.key}  —  {text}" if self.kind == 'snippet' else text
+
+
+def expand(template: str, now: Optional[datetime] = None) -> str:
+    """Fill a template's variables; unfilled ones become ‹name› fields"""
+    now = now or datetime.now()
+    builtins = {"date": now.strftime('%Y-%m-%d'), "time": now.strftime('%H:%M')}
+
+    def fill(match):
+        name, default = match.group(1), match.group(2)
+        if default is not None:
+            return default
+        return builtins.get(name, f"‹{name}›")
+
+    return _VARIABLE.sub(fill, template)
+
+
+def next_field(text: str, start: int = 0) -> Optional[Tuple[int, int]]:
+    """(start, end) of the first ‹field› at or after start, wrapping around"""
+    match = FIELD_PATTERN.search(text, start) or FIELD_PATTERN.search(text)
+    return match.span() if match else None
+
+
+class _Node:
+    __slots__ = ('edges', 'entry', 'top')
+
+    def __init__(self):
+        self.edges: Dict[str, Tuple[str, '_Node']] = {}  # First character -> (label, child)
+        self.entry: Optional[Completion] = None
+        self.top: List[Completion] = []  # Best completions in this subtree, best first
+
+
+class PrefixTrie:
+    """Radix trie answering "best k completions for this prefix"
+
+    Every node stores its subtree's top k entries, so lookups cost
+    O(len(prefix)) regardless of how many entries are indexed.
+    """
+
+    def __init__(self, k: int = 8):
+        self.k = k
+        self.root = _Node()
+        self.size = 0
+
+    def insert(self, entry: Completion):
+        """Add an entry, or replace the one with the same key"""
+        path = [self.root]
+        node = self.root
+        key = entry.key
+        i = 0
+        while i < len(key):
+            edge = node.edges.get(key[i])
+            if edge is None:
+                child = _Node()
+                node.edges[key[i]] = (key[i:], child)
+                node = child
+                path.append(node)
+                i = len(key)
+                break
+            label, child = edge
+            common = _common_length(label, key, i)
+            if common < len(label):
+                # Split the edge at the point where the keys diverge
+                middle = _Node()
+                middle.top = list(child.top)
+                middle.edges[label[common]] = (label[common:], child)
+                node.edges[key[i]] = (label[:common], middle)
+                child = middle
+            node = child
+            path.append(node)
+            i += common
+
+        replaced = node.entry is not None
+        node.entry = entry
+        if replaced:
+            # The old entry may have pushed others out of the ancestors' lists,
+            # so rebuild them from the children, deepest first
+            for ancestor in reversed(path):
+                self._refill(ancestor)
+        else:
+            self.size += 1
+            for ancestor in path:
+                self._offer(ancestor, entry)
+
+    def update(self, entry: Completion):
+        """Re-rank an entry whose score changed (scores only ever grow)"""
+        for node in self._path(entry.key):
+            if entry in node.top:
+                node.top.sort(key=lambda item: -item.score)
+            else:
+                self._offer(node, entry)
+
+    def lookup(self, prefix: str, limit: Optional[int] = None) -> List[Completion]:
+        """Best entries whose key starts with prefix"""
+        node = self.root
+        i = 0
+        while i < len(prefix):
+            edge = node.edges.get(prefix[i])
+            if edge is None:
+                return []
+            label, child = edge
+            common = _common_length(label, prefix, i)
+            if i + common == len(prefix):
+                # The prefix ends on or inside this edge
+                node = child
+                break
+            if common < len(label):
+                return []
+            node = child
+            i += common
+        return node.top[:limit or self.k]
+
+    def _offer(self, node: _Node, entry: Completion):
+        top = node.top
+        if len(top) >= self.k and entry.score <= top[-1].score:
+            return
+        index = len(top)
+        while index > 0 and top[index - 1].score < entry.score:
+            index -= 1
+        top.insert(index, entry)
+        del top[self.k:]
+
+    def _refill(self, node: _Node):
+        candidates = [node.entry] if node.entry is not None else []
+        for _, child in node.edges.values():
+            candidates.extend(child.top)
+        candidates.sort(key=lambda item: -item.score)
+        node.top = candidates[:self.k]
+
+    def _path(self, key: str) -> List[_Node]:
+        path = [self.root]
+        node = self.root
+        i = 0
+        while i < len(key):
+            edge = node.edges.get(key[i])
+            if edge is None or not key.startswith(edge[0], i):
+                break
+            node = edge[1]
+            path.append(node)
+            i += len(edge[0])
+        return path
+
+
+def _common_length(label: str, key: str, start: int) -> int:
+    length = min(len(label), len(key) - start)
+    for index in range(length):
+        if label[index] != key[start + index]:
+            return index
+    return length
+
+
+def load_snippets(path: Path = SNIPPETS_PATH) -> List[Dict[str, str]]:
+    """Snippets from snippets.json, creating it with the defaults if missing"""
+    if not path.exists():
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(DEFAULT_SNIPPETS, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            log.error("Error writing default snippets: %s", e)
+        return list(DEFAULT_SNIPPETS)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log.error("Error loading snippets: %s", e)
+        return []
+    return [item for item in data if isinstance(item, dict) and item.get("trigger") and item.get("text")]
+
+
+class SnippetLibrary:
+    """Snippets plus frequent past prompts, searchable by prefix"""
+
+    def __init__(self, path: Optional[Path] = None, history_prompts: int = 5000,
+                 min_prompt_count: int = 2, k: int = 8):
+        self.path = path or SNIPPETS_PATH
+        self.history_prompts = history_prompts
+        self.min_prompt_count = min_prompt_count
+        self.k = k
+        self.trie = None  # Swapped in whole once built
+        self.build_ms = None
+        self._prompt_counts: Counter = Counter()
+        self._entries: Dict[str, Completion] = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._building = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.trie is not None
+
+    def build_async(self, prompts: Iterable[str]):
+        """Build the index on a background thread from past user prompts"""
+        if self._building:
+            return
+        self._building = True
+        threading.Thread(target=self._build, args=(prompts,), name="snippet-index", daemon=True).start()
+
+    def _build(self, prompts: Iterable[str]):
+        started = time.perf_counter()
+        try:
+            if isinstance(prompts, Counter):
+                counts = prompts
+            else:
+                counts = Counter(prompt.strip() for prompt in prompts if len(prompt.strip()) >= 8)
+            snippets = load_snippets(self.path)
+            self._mtime = self._stat()
+            trie = PrefixTrie(self.k)
+            entries = {}
+            # Case variants share a key: keep the most frequent one (seen first)
+            for prompt, count in counts.most_common():
+                if count < self.min_prompt_count or len(entries) >= self.history_prompts:
+                    break
+                if prompt.lower() in entries:
+                    continue
+                entry = Completion(prompt.lower(), prompt, 'history', count)
+                entries[entry.key] = entry
+                trie.insert(entry)
+            for item in snippets:
+                entry = Completion(item["trigger"].lower(), item["text"], 'snippet', SNIPPET_SCORE)
+                entries[entry.key] = entry
+                trie.insert(entry)
+            with self._lock:
+                self._prompt_counts = counts
+                self._entries = entries
+                self.trie = trie
+            self.build_ms = (time.perf_counter() - started) * 1000
+            log.info("Indexed %d snippets and past prompts in %.0f ms", trie.size, self.build_ms)
+        except Exception as e:
+            log.exception("Error building snippet index: %s", e)
+        finally:
+            self._building = False
+
+    def lookup(self, prefix: str, limit: Optional[int] = None) -> List[Completion]:
+        """Completions for the text typed so far, best first"""
+        trie = self.trie
+        if trie is None or not prefix.strip():
+            return []
+        self._check_file()
+        return [entry for entry in trie.lookup(prefix.lower(), limit) if entry.key != prefix.lower()
+                or entry.kind == 'snippet']
+
+    def record_prompt(self, prompt: str):
+        """Count a sent prompt; repeated ones become suggestions"""
+        prompt = prompt.strip()
+        if len(prompt) < 8:
+            return
+        with self._lock:
+            self._prompt_counts[prompt] += 1
+            count = self._prompt_counts[prompt]
+            if self.trie is None or count < self.min_prompt_count:
+                return
+            entry = self._entries.get(prompt.lower())
+            if entry is None:
+                entry = Completion(prompt.lower(), prompt, 'history', count)
+                self._entries[entry.key] = entry
+                self.trie.insert(entry)
+            elif entry.kind == 'history' and count > entry.score:
+                # A case variant counts towards the entry only once it overtakes it
+                entry.score = count
+                self.trie.update(entry)
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return self.path.stat().st_mtime
+        except OSError:
+            return None
+
+    def _check_file(self):
+        """Rebuild in the background if snippets.json was edited (checked every few seconds)"""
+        now = time.monotonic()
+        if now - self._checked < 3:
+            return
+        self._checked = now
+        if self._stat() != self._mtime and not self._building:
+            with self._lock:
+                counts = Counter(self._prompt_counts)
+            self.build_async(counts)
@@ -0,0 +1,501 @@
+"""
+Sync Engine
+Background sync of chat history to the Supabase kv_store edge function.
+
+New messages are queued durably in SQLite, batched per conversation into
+compressed deltas and pushed with conditional (versioned) writes. Each
+conversation has a head record listing its delta keys; concurrent updates
+from other machines are merged and retried. On start and then periodically,
+deltas written by other machines are pulled and handed to on_pull.
+
+Attachment blobs are queued the same way and uploaded, streamed from the
+local blob store, before the messages that reference them.
+"""
+
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+import queue
+from pathlib import Path
+from typing import Callable, Dict, Any, BinaryIO, List, Optional, Set, Tuple
+
+from .logger import get_logger
+
+log = get_logger('sync')
+
+
+def encode_delta(records: List[Dict[str, Any]]) -> str:
+    """Compress a list of message records"""
+    raw = json.dumps(records, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.b64encode(zlib.compress(raw, 6)).decode('ascii')
+
+
+def decode_delta(payload: str) -> List[Dict[str, Any]]:
+    """Decompress a list of message records"""
+    return json.loads(zlib.decompress(base64.b64decode(payload)).decode('utf-8'))
+
+
+class LocalKvTransport:
+    """In-process stand-in for the edge function's /sync endpoints"""
+
+    def __init__(self):
+        self.store: Dict[str, Dict[str, Any]] = {}
+        self.blobs: Dict[str, int] = {}  # Digest -> size; contents are only verified
+        self.push_count = 0
+        self.offline = False
+        self._lock = threading.Lock()
+
+    def push(self, writes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.offline:
+            raise ConnectionError("Local kv stand-in is offline")
+
+        results = []
+        with self._lock:
+            self.push_count += 1
+            for write in writes:
+                stored = self.store.get(write["key"])
+                stored_version = stored["version"] if stored else 0
+                if stored_version != write["expectedVersion"]:
+                    results.append({"key": write["key"], "status": "conflict", "current": stored})
+                    continue
+                self.store[write["key"]] = {"key": write["key"], "version": stored_version + 1,
+                                            "data": write["data"]}
+                results.append({"key": write["key"], "status": "ok", "version": stored_version + 1})
+        return results
+
+    def pull(self, prefix: str) -> List[Dict[str, Any]]:
+        if self.offline:
+            raise ConnectionError("Local kv stand-in is offline")
+
+        with self._lock:
+            return [dict(v) for k, v in self.store.items() if k.startswith(prefix)]
+
+    def put_blob(self, digest: str, stream: BinaryIO):
+        if self.offline:
+            raise ConnectionError("Local kv stand-in is offline")
+
+        hasher = hashlib.sha256()
+        size = 0
+        for chunk in iter(lambda: stream.read(65536), b''):
+            hasher.update(chunk)
+            size += len(chunk)
+        if hasher.hexdigest() != digest:
+            raise ValueError(f"Blob {digest[:12]} does not match its digest")
+        with self._lock:
+            self.blobs[digest] = size
+
+
+class SyncAuthError(Exception):
+    """The server refused the session; retrying won't help until the user signs in again"""
+
+
+def _token_expiry(token: str) -> float:
+    """The exp claim of a JWT (0 if it can't be read)"""
+    try:
+        payload = token.split('.')[1]
+        return float(json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))["exp"])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return 0.0
+
+
+class SyncSession:
+    """The user's Supabase auth session, refreshed shortly before it expires
+
+    on_refresh(access_token, refresh_token) is called after each refresh so
+    the rotated tokens can be saved; the old refresh token stops working.
+    """
+
+    def __init__(self, auth_url: str, api_key: str, access_token: str, refresh_token: str = '',
+                 on_refresh: Optional[Callable[[str, str], None]] = None, timeout: float = 15):
+        self.auth_url = auth_url.rstrip('/')
+        self.api_key = api_key
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = _token_expiry(access_token) if access_token else 0.0
+        self.on_refresh = on_refresh
+        self.timeout = timeout
+        self._lock = threading.Lock()
+
+    def token(self) -> str:
+        """A current access token, refreshing it first if it is about to expire"""
+        with self._lock:
+            if self.refresh_token and time.time() > self.expires_at - 60:
+                self._refresh()
+            return self.access_token
+
+    def invalidate(self):
+        """The server rejected the token: refresh on the next token() call"""
+        with self._lock:
+            self.expires_at = 0.0
+
+    def _refresh(self):
+        from .providers.transport import get_session
+
+        response = get_session(self.auth_url).post(f"{self.auth_url}/token",
+                                                   params={"grant_type": "refresh_token"},
+                                                   headers={"apikey": self.api_key},
+                                                   json={"refresh_token": self.refresh_token},
+                                                   timeout=self.timeout)
+        if response.status_code in (400, 401, 403):
+            raise SyncAuthError("Sync session could not be refreshed; sign in again")
+        response.raise_for_status()
+        data = response.json()
+        self.access_token = data["access_token"]
+        self.refresh_token = data.get("refresh_token", self.refresh_token)
+        self.expires_at = data.get("expires_at") or time.time() + data.get("expires_in", 3600)
+        if self.on_refresh:
+            self.on_refresh(self.access_token, self.refresh_token)
+
+
+class HttpKvTransport:
+    """Client for the edge function's /sync endpoints"""
+
+    def __init__(self, base_url: str, api_key: str, session: SyncSession, timeout: float = 15):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.session = session  # The user's auth session; the server scopes keys by its user
+        self.timeout = timeout
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.session.token()}", "apikey": self.api_key,
+                "Content-Type": "application/json"}
+
+    def _request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, **kwargs):
+        """Send a request, refreshing the session and retrying once on 401"""
+        from .providers.transport import get_session
+
+        for attempt in range(2):
+            data = kwargs.get("data")
+            if attempt and hasattr(data, "seek"):
+                data.seek(0)
+            response = get_session(self.base_url).request(method, url,
+                                                          headers=dict(self._headers(), **(headers or {})),
+                                                          timeout=self.timeout, **kwargs)
+            if response.status_code != 401:
+                return response
+            self.session.invalidate()
+        raise SyncAuthError("Sync was refused: the session has expired; sign in again")
+
+    def push(self, writes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        response = self._request("POST", f"{self.base_url}/sync/push", json={"writes": writes})
+        # 409: some writes lost a version race; the results say which ones
+        if response.status_code != 409:
+            response.raise_for_status()
+        return response.json()["results"]
+
+    def pull(self, prefix: str) -> List[Dict[str, Any]]:
+        response = self._request("GET", f"{self.base_url}/sync/pull", params={"prefix": prefix})
+        response.raise_for_status()
+        return response.json()["values"]
+
+    def put_blob(self, digest: str, stream: BinaryIO):
+        """Upload an attachment blob, streaming the body from an open file"""
+        url = f"{self.base_url}/blobs/{digest}"
+        # Blobs are content-addressed: one already on the server is identical
+        existing = self._request("HEAD", url)
+        if existing.status_code == 200:
+            return
+        response = self._request("PUT", url, headers={"Content-Type": "application/octet-stream"},
+                                 data=stream)
+        response.raise_for_status()
+
+
+class SyncEngine:
+    def __init__(self, transport, user_id: str, db_path: Optional[Path] = None,
+                 batch_size: int = 50, interval: float = 5, max_backoff: float = 300,
+                 blob_store=None, pull_interval: float = 60,
+                 on_pull: Optional[Callable[[Dict[str, List[Dict[str, Any]]]], None]] = None):
+        self.transport = transport
+        self.blob_store = blob_store
+        self.pull_interval = pull_interval
+        self.on_pull = on_pull  # Called on the sync thread with records new to this machine
+        # Keys are scoped per user without exposing the email address
+        self.user_key = hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:16]
+        self.db_path = db_path or Path.home() / ".ai_chat_app" / "sync.db"
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.head_versions: Dict[str, int] = {}
+        self.head_deltas: Dict[str, List[str]] = {}
+        self.last_error = None
+        self.auth_error = None  # Set when the server refuses the session; syncing pauses
+        self.is_running = False
+        self._incoming = queue.Queue()
+        self._incoming_blobs = queue.Queue()
+        self._wake = threading.Event()
+        self._force_push = False
+        self._thread = None
+        self._db = None
+
+    def start(self):
+        """Start the background sync thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name="sync-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Signal the thread to persist queued messages, attempt a final push and stop
+
+        Returns at once; call join() where waiting can't block the UI.
+        """
+        if not self.is_running:
+            return
+        self.is_running = False
+        self._wake.set()
+
+    def join(self, timeout: float = 5):
+        """Wait for a stopped sync thread to finish its final push"""
+        if self._thread:
+            self._thread.join(timeout)
+
+    def enqueue(self, record: Dict[str, Any]):
+        """Queue a message record for sync (never blocks)"""
+        self._incoming.put(record)
+        if self._incoming.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def enqueue_blob(self, digest: str):
+        """Queue an attachment blob for upload (never blocks)"""
+        if self.blob_store is not None:
+            self._incoming_blobs.put(digest)
+
+    def flush(self):
+        """Push pending messages now, skipping any offline backoff"""
+        self._force_push = True
+        self._wake.set()
+
+    def pending_count(self) -> int:
+        """Number of messages not yet acknowledged by the server"""
+        try:
+            with sqlite3.connect(self.db_path) as db:
+                queued = db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        except sqlite3.OperationalError:
+            # The sync thread has not created the outbox yet
+            queued = 0
+        return queued + self._incoming.qsize()
+
+    def conversation_prefix(self, conversation_id: str = "") -> str:
+        return f"chat:{self.user_key}:{conversation_id}"
+
+    # Background loop
+
+    def _open_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""CREATE TABLE IF NOT EXISTS outbox (
+                          seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                          conversation_id TEXT NOT NULL,
+                          message_id TEXT NOT NULL,
+                          record TEXT NOT NULL)""")
+        db.execute("CREATE TABLE IF NOT EXISTS blob_outbox (digest TEXT PRIMARY KEY)")
+        # Deltas already merged locally (or pushed from here), so pulls skip them
+        db.execute("CREATE TABLE IF NOT EXISTS pulled_deltas (key TEXT PRIMARY KEY)")
+        db.commit()
+        return db
+
+    def _run(self):
+        self._db = self._open_db()
+        backoff = self.interval
+        next_push = 0.0
+        next_pull = 0.0
+
+        while True:
+            running = self.is_running
+            if running:
+                self._wake.wait(timeout=self.interval)
+                self._wake.clear()
+            self._persist_incoming()
+
+            now = time.monotonic()
+            if self.auth_error is not None:
+                # Retrying with a refused session only fails again; rows stay queued
+                if not running:
+                    break
+                continue
+            if now >= next_push or not running or self._force_push:
+                self._force_push = False
+                try:
+                    self._push_blobs()
+                    while self._push_batch():
+                        pass
+                    backoff = self.interval
+                    next_push = now
+                    self.last_error = None
+                except SyncAuthError as e:
+                    self._auth_failed(e)
+                except Exception as e:
+                    # Offline or server error: keep rows queued and back off
+                    self.last_error = str(e)
+                    next_push = now + backoff
+                    backoff = min(backoff * 2, self.max_backoff)
+
+            if running and self.on_pull is not None and self.auth_error is None and now >= next_pull:
+                try:
+                    self._pull()
+                    next_pull = now + self.pull_interval
+                except SyncAuthError as e:
+                    self._auth_failed(e)
+                except Exception as e:
+                    self.last_error = str(e)
+                    next_pull = now + backoff
+
+            if not running:
+                break
+
+        self._db.close()
+
+    def _auth_failed(self, error: SyncAuthError):
+        self.auth_error = self.last_error = str(error)
+        log.error("Sync paused: %s", error)
+
+    def _persist_incoming(self):
+        rows = []
+        while True:
+            try:
+                record = self._incoming.get_nowait()
+            except queue.Empty:
+                break
+            rows.append((record["conversation_id"], record["id"], json.dumps(record)))
+
+        digests = []
+        while True:
+            try:
+                digests.append((self._incoming_blobs.get_nowait(),))
+            except queue.Empty:
+                break
+
+        if digests:
+            self._db.executemany("INSERT OR IGNORE INTO blob_outbox (digest) VALUES (?)", digests)
+        if rows:
+            self._db.executemany(
+                "INSERT INTO outbox (conversation_id, message_id, record) VALUES (?, ?, ?)", rows)
+        if rows or digests:
+            self._db.commit()
+
+    def _push_blobs(self):
+        """Upload queued attachment blobs, one streamed request each"""
+        for (digest,) in self._db.execute("SELECT digest FROM blob_outbox").fetchall():
+            try:
+                stream = self.blob_store.open(digest)
+            except FileNotFoundError:
+                # Removed locally; nothing left to upload
+                stream = None
+            if stream is not None:
+                with stream:
+                    self.transport.put_blob(digest, stream)
+            self._db.execute("DELETE FROM blob_outbox WHERE digest = ?", (digest,))
+            self._db.commit()
+
+    def _push_batch(self) -> bool:
+        """Push one batch; returns True if more rows may be pending"""
+        rows = self._db.execute("SELECT seq, conversation_id, record FROM outbox ORDER BY seq LIMIT ?",
+                                (self.batch_size,)).fetchall()
+        if not rows:
+            return False
+
+        by_conversation: Dict[str, List[Dict[str, Any]]] = {}
+        for _, conversation_id, record in rows:
+            by_conversation.setdefault(conversation_id, []).append(json.loads(record))
+
+        writes = []
+        new_deltas: Dict[str, str] = {}
+        for conversation_id, records in by_conversation.items():
+            # Delta keys are derived from their contents, so a retried push of
+            # the same rows is idempotent
+            key = f"{self.conversation_prefix(conversation_id)}:{records[0]['id']}-{records[-1]['id']}"
+            new_deltas[conversation_id] = key
+            writes.append({"key": key, "expectedVersion": 0,
+                           "data": {"count": len(records), "encoding": "zlib+base64",
+                                    "payload": encode_delta(records)}})
+            writes.append(self._head_write(conversation_id, [key]))
+
+        results = {r["key"]: r for r in self.transport.push(writes)}
+        self._resolve_heads(results, new_deltas)
+
+        self._db.executemany("INSERT OR IGNORE INTO pulled_deltas (key) VALUES (?)",
+                             [(key,) for key in new_deltas.values()])
+        self._db.execute("DELETE FROM outbox WHERE seq <= ?", (rows[-1][0],))
+        self._db.commit()
+        return len(rows) == self.batch_size
+
+    def _head_key(self, conversation_id: str) -> str:
+        return f"{self.conversation_prefix(conversation_id)}:head"
+
+    def _head_write(self, conversation_id: str, added: List[str]) -> Dict[str, Any]:
+        deltas = self.head_deltas.get(conversation_id, [])
+        deltas = deltas + [key for key in added if key not in deltas]
+        return {"key": self._head_key(conversation_id),
+                "expectedVersion": self.head_versions.get(conversation_id, 0),
+                "data": {"deltas": deltas, "updated": time.time()}}
+
+    def _resolve_heads(self, results: Dict[str, Dict[str, Any]], new_deltas: Dict[str, str],
+                       attempts: int = 3):
+        """Record accepted head versions, merging and retrying conflicting ones"""
+        for _ in range(attempts):
+            retries = []
+            for conversation_id, delta_key in new_deltas.items():
+                result = results.get(self._head_key(conversation_id))
+                if result is None:
+                    continue
+                if result["status"] == "ok":
+                    write = self._head_write(conversation_id, [delta_key])
+                    self.head_versions[conversation_id] = result["version"]
+                    self.head_deltas[conversation_id] = write["data"]["deltas"]
+                    continue
+
+                # Another client moved the head: adopt its list, then append ours
+                current = result.get("current") or {"version": 0, "data": {"deltas": []}}
+                self.head_versions[conversation_id] = current["version"]
+                self.head_deltas[conversation_id] = list(current["data"].get("deltas", []))
+                retries.append(self._head_write(conversation_id, [delta_key]))
+
+            if not retries:
+                return
+            results = {r["key"]: r for r in self.transport.push(retries)}
+
+        raise Exception("Sync head update kept conflicting; will retry")
+
+    def pull_history(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch all synced messages for this user, grouped by conversation"""
+        return self.pull_deltas()[0]
+
+    def pull_deltas(self, skip: Optional[Set[str]] = None) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
+        """Fetch synced messages from deltas not in skip; returns (history, delta keys read)"""
+        skip = skip or set()
+        values = self.transport.pull(self.conversation_prefix())
+        deltas = {v["key"]: v for v in values}
+
+        history: Dict[str, List[Dict[str, Any]]] = {}
+        read = []
+        for value in values:
+            if not value["key"].endswith(":head"):
+                continue
+            conversation_id = value["key"].split(":")[2]
+            records = {}
+            for delta_key in value["data"].get("deltas", []):
+                delta = deltas.get(delta_key)
+                if delta and delta_key not in skip:
+                    read.append(delta_key)
+                    for record in decode_delta(delta["data"]["payload"]):
+                        records[record["id"]] = record
+            if records:
+                history[conversation_id] = sorted(records.values(), key=lambda r: r["timestamp"])
+        return history, read
+
+    def _pull(self):
+        """Merge deltas other machines pushed since the last pull"""
+        applied = {key for (key,) in self._db.execute("SELECT key FROM pulled_deltas")}
+        history, read = self.pull_deltas(applied)
+        if history:
+            self.on_pull(history)
+        if read:
+            self._db.executemany("INSERT OR IGNORE INTO pulled_deltas (key) VALUES (?)",
+                                 [(key,) for key in read])
+            self._db.commit()
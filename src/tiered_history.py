@@ -0,0 +1,205 @@
+"""
+Tiered History
+Cold storage for old messages of very long conversations. Messages are
+packed into fixed-size blocks, compressed (zstd with a dictionary trained on
+the conversation itself, or zlib) and appended to a single byte buffer.
+Reading a message decompresses only its block, and a small cache keeps the
+most recently read blocks.
+
+Only the newest messages stay live in the conversation tree; older ones of
+the active branch move here instead of being dropped from memory.
+"""
+
+import bisect
+import json
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Sequence
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+from .attachments import Attachment
+
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+CODEC_ZSTD_DICT = 2
+
+
+class ColdHistory:
+    def __init__(self, message_factory: Callable, block_size: int = 64,
+                 cache_blocks: int = 4, dict_size: int = 16384):
+        self.message_factory = message_factory
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.dict_size = dict_size
+        self.buffer = bytearray()
+        self.offsets = array('Q', [0])  # Block i spans offsets[i]:offsets[i + 1]
+        self.ends = array('Q')  # Message count up to and including block i
+        self.codecs = array('B')
+        self._tail: List[list] = []  # Rows not yet packed into a full block
+        self._cache: OrderedDict = OrderedDict()
+        self._samples: List[bytes] = []
+        self._dictionary = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return (self.ends[-1] if self.ends else 0) + len(self._tail)
+
+    @property
+    def compressed_bytes(self) -> int:
+        return len(self.buffer)
+
+    def extend(self, messages: Sequence):
+        """Append messages (oldest first)"""
+        with self._lock:
+            for message in messages:
+                row = [message.id, message.sender, message.content, message.timestamp.isoformat()]
+                if message.attachments:
+                    row.append([attachment.to_dict() for attachment in message.attachments])
+                self._tail.append(row)
+                if len(self._tail) >= self.block_size:
+                    self._pack(self._tail)
+                    self._tail = []
+
+    def _pack(self, rows: List[list]):
+        raw = json.dumps(rows, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        codec, data = self._compress(raw, rows)
+        self.buffer += data
+        self.offsets.append(len(self.buffer))
+        self.ends.append((self.ends[-1] if self.ends else 0) + len(rows))
+        self.codecs.append(codec)
+
+    def _compress(self, raw: bytes, rows: List[list]):
+        if not ZSTD_AVAILABLE:
+            return CODEC_ZLIB, zlib.compress(raw, 6)
+
+        if self._dictionary is None and self._samples is not None:
+            # Chat messages are short and repetitive; a dictionary built from
+            # the first few blocks captures the shared vocabulary
+            self._samples.extend(json.dumps(row, ensure_ascii=False).encode('utf-8') for row in rows)
+            if len(self._samples) >= self.block_size * 4:
+                try:
+                    self._dictionary = zstandard.train_dictionary(self.dict_size, self._samples)
+                except zstandard.ZstdError:
+                    pass
+                self._samples = None
+
+        if self._dictionary is not None:
+            compressor = zstandard.ZstdCompressor(level=3, dict_data=self._dictionary)
+            return CODEC_ZSTD_DICT, compressor.compress(raw)
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compress(raw)
+
+    def _decompress(self, codec: int, data: bytes) -> bytes:
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(data)
+        if codec == CODEC_ZSTD_DICT:
+            return zstandard.ZstdDecompressor(dict_data=self._dictionary).decompress(data)
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    def _block(self, index: int) -> List[list]:
+        rows = self._cache.get(index)
+        if rows is not None:
+            self._cache.move_to_end(index)
+            return rows
+
+        data = bytes(self.buffer[self.offsets[index]:self.offsets[index + 1]])
+        rows = json.loads(self._decompress(self.codecs[index], data))
+        self._cache[index] = rows
+        if len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return rows
+
+    def _row(self, index: int) -> list:
+        packed = self.ends[-1] if self.ends else 0
+        if index >= packed:
+            return self._tail[index - packed]
+        block = bisect.bisect_right(self.ends, index)
+        start = self.ends[block - 1] if block else 0
+        return self._block(block)[index - start]
+
+    def _to_message(self, row: list):
+        message_id, sender, content, timestamp = row[:4]
+        message = self.message_factory(id=message_id, content=content, sender=sender,
+                                       timestamp=datetime.fromisoformat(timestamp))
+        if len(row) > 4:
+            message.attachments = [Attachment.from_dict(data) for data in row[4]]
+        return message
+
+    def __getitem__(self, index):
+        with self._lock:
+            if isinstance(index, slice):
+                return [self._to_message(self._row(i)) for i in range(*index.indices(len(self)))]
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("cold history index out of range")
+            return self._to_message(self._row(index))
+
+    def iter_reversed(self) -> Iterator:
+        """Yield messages newest first, one block at a time"""
+        for index in range(len(self) - 1, -1, -1):
+            yield self[index]
+
+    def drop_oldest(self, count: int):
+        """Discard whole blocks from the front until at least count messages are gone"""
+        with self._lock:
+            blocks = bisect.bisect_left(self.ends, count) + 1 if self.ends else 0
+            blocks = min(blocks, len(self.ends))
+            if not blocks:
+                return
+            removed_bytes = self.offsets[blocks]
+            removed_messages = self.ends[blocks - 1]
+            del self.buffer[:removed_bytes]
+            self.offsets = array('Q', (offset - removed_bytes for offset in self.offsets[blocks:]))
+            self.ends = array('Q', (end - removed_messages for end in self.ends[blocks:]))
+            self.codecs = self.codecs[blocks:]
+            self._cache.clear()
+
+    def clear(self):
+        with self._lock:
+            self.buffer = bytearray()
+            self.offsets = array('Q', [0])
+            self.ends = array('Q')
+            self.codecs = array('B')
+            self._tail = []
+            self._cache.clear()
+
+
+class HistoryView:
+    """Read-only sequence over cold messages followed by the live ones"""
+
+    def __init__(self, cold: ColdHistory, hot: List, limit: Optional[int] = None):
+        self.cold = cold
+        self.hot = hot
+        self._cold_len = len(cold)
+        self._len = self._cold_len + len(hot) if limit is None else min(limit, self._cold_len + len(hot))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            cold = self.cold[start:min(stop, self._cold_len)] if start < self._cold_len else []
+            hot = self.hot[max(0, start - self._cold_len):max(0, stop - self._cold_len)]
+            return cold + hot
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        if index < self._cold_len:
+            return self.cold[index]
+        return self.hot[index - self._cold_len]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -0,0 +1,381 @@
+"""
+Tool Execution
+Local tools the model can call (calculator, file search, history lookup) and
+the executor that runs them.
+
+Tools run in a pool of worker processes with a per-call timeout and an
+address-space limit, so a runaway tool cannot hang or exhaust the app.
+Independent calls from one model turn run in parallel, and identical calls
+are answered from a short-lived cache.
+"""
+
+import ast
+import fnmatch
+import json
+import math
+import multiprocessing
+import operator
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    # Windows: no address-space limit, timeouts are enforced by the parent
+    RESOURCE_AVAILABLE = False
+
+from .logger import get_logger
+from .providers import GenerationCancelled, ToolCall
+
+log = get_logger('tools')
+
+MAX_RESULT_CHARS = 8000  # Longer tool output is truncated before it reaches the model
+DEFAULT_ROOTS = ['~/Documents']
+# Never readable, whatever the roots: the config holds API keys
+DENIED_PATHS = ['~/.ai_chat_app']
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    name: str
+    description: str
+    parameters: Dict[str, Any]  # JSON schema of the arguments
+    function: Callable[..., Any]  # Module-level, so worker processes can import it
+    cacheable: bool = True  # Same arguments always give the same answer (for a while)
+
+
+@dataclass(frozen=True)
+class ToolResult:
+    call_id: str
+    content: str
+    error: bool = False
+
+
+TOOL_REGISTRY: Dict[str, ToolSpec] = {}
+
+
+def register_tool(name: str, description: str, parameters: Dict[str, Any], cacheable: bool = True):
+    """Decorator registering a function as a tool the model can call"""
+    def decorator(function):
+        TOOL_REGISTRY[name] = ToolSpec(name, description, parameters, function, cacheable)
+        return function
+    return decorator
+
+
+def _schema(properties: Dict[str, Any], required: List[str]) -> Dict[str, Any]:
+    return {"type": "object", "properties": properties, "required": required}
+
+
+# Worker process state
+
+_ROOTS: List[Path] = []
+_DENIED: List[Path] = []
+
+
+def _init_worker(roots: List[str], memory_mb: int):
+    """Pool initializer: apply the memory limit and the allowed search roots"""
+    global _ROOTS, _DENIED
+    _DENIED = [Path(path).expanduser().resolve() for path in DENIED_PATHS]
+    _ROOTS = [root for root in (Path(root).expanduser().resolve() for root in roots)
+              if not any(denied == root or denied in root.parents for denied in _DENIED)]
+    if RESOURCE_AVAILABLE and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError) as e:
+            log.warning("Could not limit tool worker memory: %s", e)
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError("Tool call timed out")
+
+
+def _invoke(function: Callable[..., Any], arguments: Dict[str, Any], timeout: float) -> Tuple[bool, str]:
+    """Run one tool call in a worker; returns (ok, text)"""
+    alarm = hasattr(signal, 'setitimer')
+    if alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        value = function(**arguments)
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        ok = True
+    except TimeoutError:
+        text, ok = f"Timed out after {timeout:g} s", False
+    except MemoryError:
+        text, ok = "Ran out of memory", False
+    except TypeError as e:
+        text, ok = f"Invalid arguments: {e}", False
+    except Exception as e:
+        text, ok = f"{type(e).__name__}: {e}", False
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    if len(text) > MAX_RESULT_CHARS:
+        text = text[:MAX_RESULT_CHARS] + f"\n[truncated, {len(text) - MAX_RESULT_CHARS} more characters]"
+    return ok, text
+
+
+def _allowed_path(path: str) -> Path:
+    """Resolve a path the model asked for, refusing anything outside the roots
+
+    Hidden files and folders (.ssh, .env, ...) are refused even inside a
+    root, checked both as given and after following symlinks.
+    """
+    given = Path(path).expanduser()
+    resolved = given.resolve()
+    root = next((root for root in _ROOTS if resolved == root or root in resolved.parents), None)
+    if root is None:
+        raise PermissionError(f"{path} is outside the allowed folders")
+    if any(denied == resolved or denied in resolved.parents for denied in _DENIED):
+        raise PermissionError(f"{path} is not readable by tools")
+    if any(part.startswith('.') and part not in ('.', '..') for part in given.parts) or \
+            any(part.startswith('.') for part in resolved.relative_to(root).parts):
+        raise PermissionError(f"{path} is hidden")
+    return resolved
+
+
+# Built-in tools
+
+_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+    ast.Pow: operator.pow, ast.USub: operator.neg, ast.UAdd: operator.pos,
+}
+_MATH_NAMES = {name: getattr(math, name) for name in dir(math) if not name.startswith('_')}
+
+
+def _evaluate(node):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow) and abs(right) > 1000:
+            raise ValueError("Exponent too large")
+        return _OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.Name) and node.id in _MATH_NAMES:
+        return _MATH_NAMES[node.id]
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        function = _MATH_NAMES.get(node.func.id)
+        if callable(function):
+            return function(*(_evaluate(arg) for arg in node.args))
+    raise ValueError(f"Unsupported expression: {ast.dump(node)[:60]}")
+
+
+@register_tool("calculate", "Evaluate an arithmetic expression; math module functions such as sqrt "
+               "and log are available.",
+               _schema({"expression": {"type": "string", "description": "e.g. (3 + 4) * sqrt(2)"}},
+                       ["expression"]))
+def calculate(expression: str):
+    return _evaluate(ast.parse(expression, mode='eval'))
+
+
+@register_tool("current_time", "Get the current local date and time.", _schema({}, []), cacheable=False)
+def current_time():
+    return datetime.now().astimezone().isoformat(timespec='seconds')
+
+
+@register_tool("search_files", "Find files whose names match a glob pattern.",
+               _schema({"pattern": {"type": "string", "description": "e.g. *.pdf or report*"},
+                        "folder": {"type": "string", "description": "Folder to search (optional)"},
+                        "max_results": {"type": "integer"}},
+                       ["pattern"]))
+def search_files(pattern: str, folder: Optional[str] = None, max_results: int = 50):
+    folders = [_allowed_path(folder)] if folder else _ROOTS
+    matches = []
+    for top in folders:
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            visible = [name for name in filenames if not name.startswith('.')]
+            for name in fnmatch.filter(visible, pattern):
+                matches.append(os.path.join(dirpath, name))
+                if len(matches) >= max_results:
+                    return matches
+    return matches
+
+
+@register_tool("read_file", "Read the start of a text file.",
+               _schema({"path": {"type": "string"},
+                        "max_bytes": {"type": "integer", "description": "Default 16384"}},
+                       ["path"]))
+def read_file(path: str, max_bytes: int = 16384):
+    with open(_allowed_path(path), 'rb') as f:
+        data = f.read(min(max_bytes, 1 << 20))
+    return data.decode('utf-8', errors='replace')
+
+
+@register_tool("search_history", "Search past chat messages for a phrase.",
+               _schema({"query": {"type": "string"},
+                        "limit": {"type": "integer", "description": "Default 10"}},
+                       ["query"]))
+def search_history(query: str, limit: int = 10):
+    from .history_store import HistoryStore
+
+    needle = query.lower()
+    found = []
+    for record in HistoryStore().iter_records():
+        if needle in record.get("content", "").lower():
+            found.append({"sender": record.get("sender"), "timestamp": record.get("timestamp"),
+                          "content": record["content"][:500]})
+    return found[-limit:]
+
+
+class ToolExecutor:
+    """Runs tool calls in a process pool with timeouts, limits and a result cache
+
+    The pool is shared by every conversation; each call holds a worker for
+    at most its timeout, after which the pool is replaced.
+    """
+
+    def __init__(self, workers: int = 4, timeout: float = 10.0, memory_mb: int = 256,
+                 cache_ttl: float = 60.0, roots: Optional[List[str]] = None,
+                 cache_size: int = 256, metrics=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cache_ttl = cache_ttl
+        self.roots = DEFAULT_ROOTS if roots is None else roots
+        self.cache_size = cache_size
+        self.metrics = metrics
+        self._cache: 'OrderedDict[Tuple[str, str], Tuple[float, ToolResult]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs Tk threads is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_worker,
+                                                 initargs=(self.roots, self.memory_mb))
+            return self._pool
+
+    def warm(self):
+        """Start the worker processes ahead of the first call"""
+        pool = self._get_pool()
+        wait([pool.submit(_invoke, current_time, {}, self.timeout) for _ in range(self.workers)])
+
+    def run(self, calls: List[ToolCall], allowed: Optional[List[str]] = None,
+            generation=None) -> List[ToolResult]:
+        """Run a turn's tool calls in parallel; results are in call order"""
+        results: Dict[int, ToolResult] = {}
+        pending: Dict[Tuple[str, str], List[int]] = {}
+        now = time.monotonic()
+        for index, call in enumerate(calls):
+            spec = TOOL_REGISTRY.get(call.name)
+            if spec is None or (allowed is not None and call.name not in allowed):
+                results[index] = ToolResult(call.id, f"Unknown tool: {call.name}", True)
+            elif call.arguments is None:
+                results[index] = ToolResult(call.id, "Arguments were not a valid JSON object", True)
+            else:
+                key = (call.name, json.dumps(call.arguments, sort_keys=True))
+                cached = self._cached(key, now) if spec.cacheable else None
+                if cached is not None:
+                    results[index] = ToolResult(call.id, cached.content, cached.error)
+                    if self.metrics:
+                        self.metrics.increment('tools.cache_hits')
+                else:
+                    # Identical calls in one turn run once
+                    pending.setdefault(key, []).append(index)
+
+        if pending:
+            for key, (ok, text) in self._execute(pending, calls, generation).items():
+                for index in pending[key]:
+                    results[index] = ToolResult(calls[index].id, text, not ok)
+                if ok and TOOL_REGISTRY[key[0]].cacheable:
+                    self._store(key, ToolResult('', text, False))
+
+        return [results[index] for index in range(len(calls))]
+
+    def _execute(self, pending: Dict[Tuple[str, str], List[int]], calls: List[ToolCall],
+                 generation) -> Dict[Tuple[str, str], Tuple[bool, str]]:
+        pool = self._get_pool()
+        started = time.perf_counter()
+        futures = {}
+        for key, indexes in pending.items():
+            call = calls[indexes[0]]
+            futures[pool.submit(_invoke, TOOL_REGISTRY[call.name].function, call.arguments,
+                                self.timeout)] = key
+
+        # Workers time themselves out; this backstop covers hung workers
+        # and platforms without SIGALRM
+        rounds = -(-len(futures) // self.workers)
+        deadline = time.monotonic() + self.timeout * rounds + 2.0
+        outcomes = {}
+        remaining = set(futures)
+        while remaining:
+            if generation is not None and generation.cancelled:
+                for future in remaining:
+                    future.cancel()
+                raise GenerationCancelled()
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            done, remaining = wait(remaining, timeout=min(left, 0.1), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    outcomes[futures[future]] = future.result()
+                except BrokenProcessPool:
+                    outcomes[futures[future]] = (False, "Tool process crashed")
+                    self._recycle(pool)
+                except Exception as e:
+                    outcomes[futures[future]] = (False, f"{type(e).__name__}: {e}")
+
+        if remaining:
+            log.warning("%d tool call(s) overran the deadline; restarting the tool pool", len(remaining))
+            for future in remaining:
+                outcomes[futures[future]] = (False, f"Timed out after {self.timeout:g} s")
+            self._recycle(pool)
+
+        if self.metrics:
+            self.metrics.observe('tools.call_ms', (time.perf_counter() - started) * 1000)
+            self.metrics.increment('tools.calls', len(futures))
+        return outcomes
+
+    def _cached(self, key: Tuple[str, str], now: float) -> Optional[ToolResult]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] < now:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key: Tuple[str, str], result: ToolResult):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _recycle(self, pool: ProcessPoolExecutor):
+        """Kill a pool with stuck or crashed workers; the next call starts a fresh one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
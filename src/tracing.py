@@ -0,0 +1,147 @@
+"""
+Request Tracing
+Records every provider exchange (payload hash, chunk arrival times and the
+streamed text) so real sessions can be replayed offline through the replay
+provider, at their original pace or faster.
+
+Traces are JSON lines under ``~/.ai_chat_app/traces``. Capture is enabled
+with ``ai.trace_mode = "capture"``; replay by selecting the ``replay``
+provider with ``ai.trace_file`` pointing at a capture.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+
+from .logger import get_logger
+
+log = get_logger('tracing')
+
+TRACE_DIR = Path.home() / ".ai_chat_app" / "traces"
+
+
+def payload_hash(messages: List[Dict[str, str]]) -> str:
+    """Stable hash of a provider request's message list"""
+    raw = json.dumps(messages, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def load_traces(path: Path) -> List[Dict[str, Any]]:
+    """Read the exchanges from a trace file, in capture order"""
+    traces = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                traces.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return traces
+
+
+class TraceRecorder:
+    """Appends one record per provider exchange to a session trace file"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or TRACE_DIR / f"trace-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+        self._lock = threading.Lock()
+        self._file = None
+        self._closed = False
+
+    def start(self, provider, messages: List[Dict[str, str]]) -> 'TraceCapture':
+        """Begin recording one exchange"""
+        return TraceCapture(self, provider, messages)
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self._closed:
+                    # An exchange that was still streaming at close time
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(line)
+                    return
+                if self._file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(line)
+                self._file.flush()
+        except OSError as e:
+            log.error("Error writing trace: %s", e)
+
+    def close(self):
+        """Flush and close the trace file"""
+        with self._lock:
+            self._closed = True
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError as e:
+                    log.error("Error closing trace: %s", e)
+                self._file = None
+
+
+class TraceCapture:
+    """Timing and content of a single exchange while it streams"""
+
+    def __init__(self, recorder: TraceRecorder, provider, messages: List[Dict[str, str]]):
+        self.recorder = recorder
+        self.record = {
+            "hash": payload_hash(messages),
+            "time": time.time(),
+            "provider": provider.name,
+            "model": provider.model,
+            "max_context": provider.capabilities.max_context,
+            "max_tokens": provider.max_tokens,
+            "prompt": messages[-1]["content"] if messages else "",
+            "context_messages": len(messages),
+            "offsets_ms": [],
+            "chunks": []
+        }
+        self._started = time.perf_counter()
+
+    def chunk(self, text: str):
+        """Note a chunk's arrival"""
+        self.record["offsets_ms"].append(round((time.perf_counter() - self._started) * 1000, 3))
+        self.record["chunks"].append(text)
+
+    def finish(self, status: str = "completed", error: Optional[str] = None):
+        """Write the exchange to the trace file"""
+        self.record["status"] = status
+        self.record["total_ms"] = round((time.perf_counter() - self._started) * 1000, 3)
+        self.record["bytes"] = sum(len(chunk.encode('utf-8')) for chunk in self.record["chunks"])
+        if error:
+            self.record["error"] = error
+        self.recorder.write(self.record)
+
+
+def replay_workload(controller, traces: List[Dict[str, Any]],
+                    timeout: float = 120) -> Iterator[Dict[str, Any]]:
+    """Resend each captured prompt through the controller, one at a time
+
+    Run with the replay provider selected so answers come from the same
+    traces. Yields per-exchange timings for comparison across builds.
+    """
+    for trace in traces:
+        done = threading.Event()
+        first_chunk = []
+        started = time.perf_counter()
+
+        def on_chunk(chunk: str):
+            if not first_chunk:
+                first_chunk.append(time.perf_counter())
+
+        controller.send_message_to_ai(trace.get("prompt", ""), lambda response: done.set(),
+                                      on_chunk=on_chunk, interactive=False)
+        completed = done.wait(timeout)
+        finished = time.perf_counter()
+        yield {
+            "hash": trace.get("hash"),
+            "completed": completed,
+            "ttft_ms": (first_chunk[0] - started) * 1000 if first_chunk else None,
+            "total_ms": (finished - started) * 1000,
+            "captured_total_ms": trace.get("total_ms")
+        }
@@ -3,164 +3,210 @@ System Tray Manager
 Handles system tray integration for Windows and Mac.
 """
 
+import importlib.util
+import json
+import subprocess
 import sys
 import threading
+import time
 from pathlib import Path
 
-try:
-    import pystray
-    from pystray import MenuItem as item
-    from PIL import Image, ImageDraw
-    TRAY_AVAILABLE = True
-except ImportError:
-    TRAY_AVAILABLE = False
-    print("Warning: pystray not available. Install with: pip install pystray Pillow")
+from .logger import get_logger, dump_recent
+
+log = get_logger('tray')
+
+# Check without importing: pystray and Pillow are only loaded by the helper process
+TRAY_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('pystray', 'PIL'))
+if not TRAY_AVAILABLE:
+    log.warning("pystray not available. Install with: pip install pystray Pillow")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 class TrayManager:
-    def __init__(self, app):
+    """Controls the tray icon running in a helper process (see tray_process)
+
+    Menu events arrive on a reader thread and are handed to the Tk thread
+    with root.after, so Tk is never called from a foreign thread.
+    """
+    
+    def __init__(self, app, max_restarts: int = 3):
         self.app = app
-        self.icon = None
+        self.max_restarts = max_restarts
+        self.process = None
         self.is_running = False
         self.unread_count = 0
+        self.restarts = 0
+        self._send_lock = threading.Lock()
+        self.handlers = {
+            'restore': self.restore_window,
+            'quick_message': self.show_quick_message,
+            'settings': self.show_settings,
+            'toggle_profiler': self.toggle_profiler,
+            'dump_log': self.dump_diagnostic_log,
+            'about': self.show_about,
+            'quit': self.quit_application
+        }
+    
+    def start(self):
+        """Start the tray helper process"""
+        if self.is_running:
+            return
         
-        if TRAY_AVAILABLE:
-            self.setup_icon()
+        self.is_running = True
+        self._spawn()
     
-    def setup_icon(self):
-        """Setup the system tray icon"""
-        # Create a simple colored circle icon
-        image = self.create_icon_image()
+    def _helper_command(self):
+        """main.py --tray-helper; a frozen build is its own main.py"""
+        if getattr(sys, 'frozen', False):
+            return [sys.executable, '--tray-helper']
+        return [sys.executable, str(PROJECT_ROOT / 'main.py'), '--tray-helper']
+
+    def _spawn(self):
+        try:
+            self.process = subprocess.Popen(
+                self._helper_command(),
+                cwd=str(PROJECT_ROOT),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                bufsize=1
+            )
+        except OSError as e:
+            log.exception("Tray manager error: %s", e)
+            self.is_running = False
+            return
         
-        # Define the menu
-        menu = pystray.Menu(
-            item('Open Chat', self.restore_window, default=True),
-            item('New Message', self.show_quick_message),
-            pystray.Menu.SEPARATOR,
-            item('Settings', self.show_settings),
-            item('About', self.show_about),
-            pystray.Menu.SEPARATOR,
-            item('Quit', self.quit_application)
-        )
+        # Bring a restarted helper up to date
+        if self.unread_count:
+            self.send({"cmd": "badge", "count": self.unread_count})
+        if self.is_profiling():
+            self.send({"cmd": "profiling", "active": True})
         
-        # Create the icon
-        self.icon = pystray.Icon(
-            "AI Chat Assistant",
-            image,
-            "AI Chat Assistant",
-            menu
-        )
-    
-    def create_icon_image(self, color='blue'):
-        """Create the tray icon image"""
-        # Create a simple 64x64 icon
-        width = 64
-        height = 64
+        threading.Thread(target=self._read_events, args=(self.process,),
+                         name="tray-events", daemon=True).start()
+    
+    def _read_events(self, process):
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            
+            event = message.get("event")
+            handler = self.handlers.get(event)
+            if handler and self.app:
+                self.app.root.after(0, handler)
+            elif event == "error":
+                log.warning("Tray helper error: %s", message.get("error"))
         
-        # Create image
-        image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(image)
+        code = process.wait()
+        if not self.is_running:
+            return
         
-        # Draw a circle
-        margin = 8
-        if color == 'blue':
-            fill_color = (0, 123, 255, 255)  # Blue
-        elif color == 'red':
-            fill_color = (220, 53, 69, 255)   # Red for notifications
+        # The helper crashed; the app keeps running without it until it's back
+        log.warning("Tray helper exited unexpectedly (code %s)", code)
+        if self.app:
+            self.app.controller.metrics.increment('tray.crashes')
+        if self.restarts < self.max_restarts:
+            self.restarts += 1
+            time.sleep(min(2 ** self.restarts, 30))
+            if self.is_running:
+                self._spawn()
         else:
-            fill_color = (108, 117, 125, 255)  # Gray
-        
-        draw.ellipse([margin, margin, width-margin, height-margin], 
-                    fill=fill_color, outline=(255, 255, 255, 255), width=2)
-        
-        # Add chat bubble indicator
-        draw.ellipse([width-24, height-24, width-8, height-8], 
-                    fill=(255, 255, 255, 255))
-        
-        # Add unread count if any
-        if self.unread_count > 0:
-            # Draw red notification badge
-            badge_size = 20
-            badge_x = width - badge_size - 2
-            badge_y = 2
-            
-            draw.ellipse([badge_x, badge_y, badge_x + badge_size, badge_y + badge_size],
-                        fill=(220, 53, 69, 255))
-            
-            # Add count text (simplified for small numbers)
-            count_text = str(min(self.unread_count, 9)) if self.unread_count < 10 else "9+"
-            # Note: For proper text rendering, you'd want to use a font
-            # This is a simplified version
-        
-        return image
+            self.is_running = False
     
-    def start(self):
-        """Start the tray icon"""
-        if not TRAY_AVAILABLE or self.is_running:
+    def send(self, command: dict):
+        """Send a command to the helper process"""
+        process = self.process
+        if not process or process.poll() is not None:
             return
         
-        self.is_running = True
-        
-        try:
-            # Run the icon (this blocks)
-            if self.icon:
-                self.icon.run()
-        except Exception as e:
-            print(f"Tray manager error: {e}")
-            self.is_running = False
+        with self._send_lock:
+            try:
+                process.stdin.write(json.dumps(command) + '\n')
+                process.stdin.flush()
+            except (OSError, ValueError):
+                pass
     
     def stop(self):
         """Stop the tray icon"""
-        if not TRAY_AVAILABLE or not self.is_running:
+        if not self.is_running:
             return
         
         self.is_running = False
+        process = self.process
+        if not process:
+            return
         
-        if self.icon:
-            self.icon.stop()
+        self.send({"cmd": "stop"})
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
     
     def update_unread_count(self, count: int):
         """Update unread message count"""
         self.unread_count = count
-        
-        if self.icon and self.is_running:
-            # Update icon with new count
-            new_image = self.create_icon_image('red' if count > 0 else 'blue')
-            self.icon.icon = new_image
+        self.send({"cmd": "badge", "count": count})
     
     def show_notification(self, title: str, message: str = None):
         """Show system notification"""
-        if not TRAY_AVAILABLE:
-            print(f"Notification: {title} - {message}")
+        if not self.is_running:
+            log.info("Notification: %s - %s", title, message)
             return
         
-        try:
-            if self.icon:
-                self.icon.notify(message or title, title)
-        except Exception as e:
-            print(f"Notification error: {e}")
+        self.send({"cmd": "notify", "title": title, "message": message})
     
-    def restore_window(self, icon=None, item=None):
+    def restore_window(self):
         """Restore the main window"""
         if self.app:
             self.app.restore_from_tray()
     
-    def show_quick_message(self, icon=None, item=None):
-        """Show quick message dialog"""
-        # This would open a small popup for quick messages
-        self.restore_window()
-        self.show_notification("Quick Message", "Feature coming soon!")
+    def show_quick_message(self):
+        """Show the quick message popup"""
+        if self.app:
+            self.app.show_quick_message()
     
-    def show_settings(self, icon=None, item=None):
+    def show_settings(self):
         """Show settings"""
         self.restore_window()
         # Focus on settings - would need to communicate with main app
     
-    def show_about(self, icon=None, item=None):
+    def is_profiling(self) -> bool:
+        """Whether the sampling profiler is running"""
+        return bool(self.app and self.app.controller.profiler.is_running)
+    
+    def toggle_profiler(self):
+        """Start or stop the sampling profiler"""
+        if not self.app:
+            return
+        
+        output = self.app.controller.profiler.toggle()
+        self.send({"cmd": "profiling", "active": self.is_profiling()})
+        if output:
+            self.show_notification("Profile saved", str(output))
+        else:
+            self.show_notification("Profiling started", "Choose Stop Profiling to save the profile")
+    
+    def dump_diagnostic_log(self):
+        """Write the last few minutes of log records to a file"""
+        seconds = self.app.config.get('logging.dump_seconds', 300) if self.app else 300
+        try:
+            path = dump_recent(seconds)
+            self.show_notification("Diagnostic log saved", str(path))
+        except OSError as e:
+            log.error("Error saving diagnostic log: %s", e)
+    
+    def show_about(self):
         """Show about dialog"""
         self.show_notification("AI Chat Assistant", 
                              "Python desktop application with AI chat capabilities")
     
-    def quit_application(self, icon=None, item=None):
+    def quit_application(self):
         """Quit the entire application"""
         if self.app:
             self.app.quit_application()
@@ -168,23 +214,23 @@ class TrayManager:
 class MockTrayManager:
     """Mock tray manager for when pystray is not available"""
     
-    def __init__(self, app):
+    def __init__(self, app, max_restarts: int = 3):
         self.app = app
         self.unread_count = 0
-        print("Mock tray manager initialized (pystray not available)")
+        log.info("Mock tray manager initialized (pystray not available)")
     
     def start(self):
-        print("Mock tray: Started")
+        log.info("Mock tray: Started")
     
     def stop(self):
-        print("Mock tray: Stopped")
+        log.info("Mock tray: Stopped")
     
     def update_unread_count(self, count: int):
         self.unread_count = count
-        print(f"Mock tray: Unread count updated to {count}")
+        log.debug("Mock tray: Unread count updated to %d", count)
     
     def show_notification(self, title: str, message: str = None):
-        print(f"Mock notification: {title} - {message}")
+        log.info("Mock notification: %s - %s", title, message)
 
 # Use mock if pystray not available
 if not TRAY_AVAILABLE:
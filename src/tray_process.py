@@ -0,0 +1,140 @@
+"""
+Tray Helper Process
+Runs the pystray icon in its own process so icon rendering and the tray event
+loop never hold the main app's GIL or touch Tk from a foreign thread.
+
+The parent talks to this process over stdin/stdout with one JSON object per
+line. Commands from the app:
+
+    {"cmd": "badge", "count": 3}
+    {"cmd": "notify", "title": "...", "message": "..."}
+    {"cmd": "profiling", "active": true}
+    {"cmd": "stop"}
+
+Menu clicks are reported back as events, e.g. {"event": "restore"}. The
+helper exits when told to stop or when its stdin closes (the app went away).
+
+Started by the app as ``main.py --tray-helper`` (or ``python -m src.tray_process``).
+"""
+
+import json
+import sys
+import threading
+
+import pystray
+from pystray import MenuItem as item
+from PIL import Image, ImageDraw
+
+
+def create_icon_image(unread_count: int = 0):
+    """Create the tray icon image"""
+    # Create a simple 64x64 icon
+    width = 64
+    height = 64
+
+    image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+
+    # Draw a circle, red while there are unread messages
+    margin = 8
+    fill_color = (220, 53, 69, 255) if unread_count > 0 else (0, 123, 255, 255)
+    draw.ellipse([margin, margin, width-margin, height-margin],
+                fill=fill_color, outline=(255, 255, 255, 255), width=2)
+
+    # Add chat bubble indicator
+    draw.ellipse([width-24, height-24, width-8, height-8],
+                fill=(255, 255, 255, 255))
+
+    if unread_count > 0:
+        # Draw red notification badge
+        badge_size = 20
+        badge_x = width - badge_size - 2
+        badge_y = 2
+        draw.ellipse([badge_x, badge_y, badge_x + badge_size, badge_y + badge_size],
+                    fill=(220, 53, 69, 255))
+        count_text = str(unread_count) if unread_count < 10 else "9+"
+        draw.text((badge_x + 5, badge_y + 4), count_text, fill=(255, 255, 255, 255))
+
+    return image
+
+
+class TrayProcess:
+    def __init__(self, stdin=None, stdout=None):
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self.profiling = False
+        self._send_lock = threading.Lock()
+
+        menu = pystray.Menu(
+            item('Open Chat', self._emit('restore'), default=True),
+            item('New Message', self._emit('quick_message')),
+            pystray.Menu.SEPARATOR,
+            item('Settings', self._emit('settings')),
+            item(lambda _: 'Stop Profiling' if self.profiling else 'Start Profiling',
+                 self._emit('toggle_profiler')),
+            item('Save Diagnostic Log', self._emit('dump_log')),
+            item('About', self._emit('about')),
+            pystray.Menu.SEPARATOR,
+            item('Quit', self._emit('quit'))
+        )
+        self.icon = pystray.Icon("AI Chat Assistant", create_icon_image(),
+                                 "AI Chat Assistant", menu)
+
+    def _emit(self, event: str):
+        return lambda icon=None, menu_item=None: self.send({"event": event})
+
+    def send(self, message: dict):
+        """Write a message to the app"""
+        with self._send_lock:
+            try:
+                self.stdout.write(json.dumps(message) + '\n')
+                self.stdout.flush()
+            except (OSError, ValueError):
+                # The app is gone; the reader will see EOF and stop the icon
+                pass
+
+    def run(self):
+        """Run the icon until told to stop (blocks)"""
+        self.icon.run(setup=self._setup)
+
+    def _setup(self, icon):
+        icon.visible = True
+        threading.Thread(target=self._read_commands, name="tray-commands", daemon=True).start()
+        self.send({"event": "ready"})
+
+    def _read_commands(self):
+        for line in self.stdin:
+            try:
+                command = json.loads(line)
+            except ValueError:
+                continue
+            if command.get("cmd") == "stop":
+                break
+            try:
+                self.handle(command)
+            except Exception as e:
+                self.send({"event": "error", "error": str(e)})
+        self.icon.stop()
+
+    def handle(self, command: dict):
+        """Apply a command from the app"""
+        name = command.get("cmd")
+        if name == "badge":
+            self.icon.icon = create_icon_image(command.get("count", 0))
+        elif name == "notify":
+            self.icon.notify(command.get("message") or command.get("title", ""),
+                             command.get("title", ""))
+        elif name == "profiling":
+            self.profiling = bool(command.get("active"))
+            self.icon.update_menu()
+
+
+def main():
+    # Keep stdout for the protocol; stray prints from libraries go to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    TrayProcess(stdout=protocol_out).run()
+
+
+if __name__ == "__main__":
+    main()
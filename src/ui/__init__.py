@@ -5,5 +5,7 @@ Contains all user interface components for the application.
 
 from .auth_window import AuthWindow
 from .chat_window import ChatWindow
+from .compare_window import CompareWindow
+from .quick_message import QuickMessageWindow
 
-__all__ = ['AuthWindow', 'ChatWindow']
\ No newline at end of file
+__all__ = ['AuthWindow', 'ChatWindow', 'CompareWindow', 'QuickMessageWindow']
\ No newline at end of file
@@ -21,7 +21,8 @@ class AuthWindow:
         """Setup the authentication UI"""
         # Clear parent window
         for widget in self.parent.winfo_children():
-            widget.destroy()
+            if not getattr(widget, 'persistent', False):
+                widget.destroy()
         
         # Main container
         main_frame = ttk.Frame(self.parent, padding="40")
@@ -222,4 +223,5 @@ class AuthWindow:
         
         # Clear widgets
         for widget in self.parent.winfo_children():
-            widget.destroy()
\ No newline at end of file
+            if not getattr(widget, 'persistent', False):
+                widget.destroy()
\ No newline at end of file
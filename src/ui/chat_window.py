@@ -4,29 +4,67 @@ Provides the main chat interface with message history and input.
 """
 
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 from datetime import datetime
+import os
 import threading
-from typing import Optional
+import time
+import weakref
+from typing import Optional, Callable, List, Dict
+
+from ..attachments import Attachment
+from ..providers import available_providers
+from ..snippets import expand, next_field
+from .compare_window import CompareWindow
+from .usage_window import UsageWindow
+from .render_snapshot import SnapshotStore, capture, paint
 
 class ChatWindow:
+    # Live windows, for leak detection by the memory monitor
+    instances = weakref.WeakSet()
+    
     def __init__(self, parent, controller, user_email: str):
+        ChatWindow.instances.add(self)
         self.parent = parent
         self.controller = controller
         self.user_email = user_email
         self.is_typing = False
+        self.current_generation = None
+        self.rendered_lines = 0
+        self.message_marks: List[str] = []  # Where each recorded message starts
+        self.mark_ids: Dict[str, Optional[str]] = {}  # Mark name -> message id, where known
+        self.edit_target = None  # Id of the message being edited
+        self.pending_attachments: List[Attachment] = []  # Attached to the next message
+        self.importing_attachments = 0
+        self.thumbnail_images: Dict[str, tk.PhotoImage] = {}  # By digest; Tk needs the references
+        # Messages above the transcript not rendered yet: earlier_source[:earlier_end]
+        self.earlier_source = []
+        self.earlier_end = 0
+        self._mark_counter = 0
+        self._earlier_scheduled = False
+        self.snapshot_store = SnapshotStore()
+        self.compare_window = None
+        self.queued_keys = set()  # Ids of sent messages waiting for the network
+        self.suggestion_items = []  # Completions shown under the composer
+        self.suggestion_chosen = False  # Arrow keys moved into the list
         
         # Add message callback to controller
         self.controller.add_message_callback(self.on_new_message)
         
         self.setup_ui()
-        self.add_welcome_message()
+        if not self.restore_snapshot():
+            self.add_welcome_message()
+        
+        # Sends left queued by an earlier session
+        self.queued_keys.update(item.key for item in self.controller.outbox.pending())
+        self.update_queue_status()
         
     def setup_ui(self):
         """Setup the chat UI"""
         # Clear parent window
         for widget in self.parent.winfo_children():
-            widget.destroy()
+            if not getattr(widget, 'persistent', False):
+                widget.destroy()
         
         # Configure parent
         self.parent.title("AI Chat Assistant")
@@ -53,6 +91,7 @@ class ChatWindow:
         # Bind keyboard shortcuts
         self.parent.bind('<Control-m>', lambda e: self.minimize_to_tray())
         self.parent.bind('<F11>', lambda e: self.toggle_fullscreen())
+        self.parent.bind('<Escape>', lambda e: self.handle_escape())
     
     def setup_header(self, parent):
         """Setup the header with user info and controls"""
@@ -90,20 +129,25 @@ class ChatWindow:
         ttk.Label(user_frame, text=self.user_email, 
                  font=('Segoe UI', 9)).grid(row=0, column=1, padx=(0, 10))
         
+        # Compare button
+        compare_button = ttk.Button(user_frame, text="Compare",
+                                  command=self.show_compare)
+        compare_button.grid(row=0, column=2, padx=(0, 5))
+        
         # Settings button
         settings_button = ttk.Button(user_frame, text="⚙️", width=3,
                                    command=self.show_settings)
-        settings_button.grid(row=0, column=2, padx=(0, 5))
+        settings_button.grid(row=0, column=3, padx=(0, 5))
         
         # Minimize button
         minimize_button = ttk.Button(user_frame, text="−", width=3,
                                    command=self.minimize_to_tray)
-        minimize_button.grid(row=0, column=3, padx=(0, 5))
+        minimize_button.grid(row=0, column=4, padx=(0, 5))
         
         # Sign out button
         signout_button = ttk.Button(user_frame, text="Sign Out",
                                   command=self.handle_signout)
-        signout_button.grid(row=0, column=4)
+        signout_button.grid(row=0, column=5)
     
     def setup_chat_area(self, parent):
         """Setup the scrollable chat message area"""
@@ -125,6 +169,8 @@ class ChatWindow:
             pady=10
         )
         self.chat_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.chat_text.configure(yscrollcommand=self.on_chat_scroll)
+        self.chat_text.bind('<Button-3>', self.show_message_menu)
         
         # Configure text tags for styling
         self.chat_text.tag_configure('user', 
@@ -154,6 +200,15 @@ class ChatWindow:
                                     font=('Segoe UI', 9), 
                                     foreground='gray',
                                     italic=True)
+        
+        self.chat_text.tag_configure('attachment',
+                                    font=('Segoe UI', 9),
+                                    foreground='#4a4a8a')
+        
+        self.chat_text.tag_configure('pending',
+                                    font=('Segoe UI', 8),
+                                    foreground='orange',
+                                    justify='right')
     
     def setup_input_area(self, parent):
         """Setup the message input area"""
@@ -161,9 +216,13 @@ class ChatWindow:
         input_frame.grid(row=2, column=0, sticky=(tk.W, tk.E))
         input_frame.columnconfigure(0, weight=1)
         
+        # Attachments waiting to be sent
+        self.attachments_frame = ttk.Frame(input_frame)
+        self.attachments_frame.grid(row=0, column=0, sticky=tk.W)
+        
         # Input field and send button container
         input_container = ttk.Frame(input_frame)
-        input_container.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        input_container.grid(row=1, column=0, sticky=(tk.W, tk.E))
         input_container.columnconfigure(0, weight=1)
         
         # Message input
@@ -171,19 +230,39 @@ class ChatWindow:
         self.message_entry = ttk.Entry(input_container, textvariable=self.message_var,
                                      font=('Segoe UI', 10))
         self.message_entry.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(0, 10))
-        self.message_entry.bind('<Return>', self.handle_send_message)
+        self.message_entry.bind('<Return>', self.handle_return)
         self.message_entry.bind('<KeyRelease>', self.on_input_change)
+        self.message_entry.bind('<Control-o>', lambda e: self.choose_attachments())
+        self.message_entry.bind('<Tab>', self.handle_tab)
+        self.message_entry.bind('<Down>', lambda e: self.move_suggestion(1))
+        self.message_entry.bind('<Up>', lambda e: self.move_suggestion(-1))
+        
+        # Snippet and past-prompt completions, shown over the chat just above the input
+        self.suggestion_list = tk.Listbox(self.parent, font=('Segoe UI', 9), activestyle='none',
+                                          exportselection=False, borderwidth=1, relief='solid')
+        self.suggestion_list.bind('<ButtonRelease-1>', lambda e: self.accept_suggestion())
+        
+        # Attach button
+        self.attach_button = ttk.Button(input_container, text="📎", width=3,
+                                      command=self.choose_attachments)
+        self.attach_button.grid(row=0, column=1, padx=(0, 5))
         
         # Send button
         self.send_button = ttk.Button(input_container, text="Send", 
                                     command=self.handle_send_message)
-        self.send_button.grid(row=0, column=1)
+        self.send_button.grid(row=0, column=2)
+        
+        # Stop button (enabled only while a response is being generated)
+        self.stop_button = ttk.Button(input_container, text="Stop",
+                                    command=self.handle_stop_generation,
+                                    state='disabled')
+        self.stop_button.grid(row=0, column=3, padx=(5, 0))
         
         # Help text
         help_label = ttk.Label(input_frame, 
-                              text="Press Enter to send • Ctrl+M to minimize to tray",
+                              text="Press Enter to send • Esc to stop • Tab to complete • Ctrl+O to attach • Ctrl+M to minimize to tray",
                               font=('Segoe UI', 8), foreground='gray')
-        help_label.grid(row=1, column=0, pady=(5, 0))
+        help_label.grid(row=2, column=0, pady=(5, 0))
         
         # Focus on input
         self.message_entry.focus()
@@ -191,14 +270,23 @@ class ChatWindow:
     def add_welcome_message(self):
         """Add welcome message to chat"""
         welcome_text = "Hello! I'm your AI assistant. How can I help you today?"
-        self.add_message_to_chat("🤖", welcome_text, "ai")
+        self.add_message_to_chat("🤖", welcome_text, "ai", recorded=False)
     
-    def add_message_to_chat(self, sender: str, message: str, msg_type: str):
-        """Add a message to the chat display"""
+    def add_message_to_chat(self, sender: str, message: str, msg_type: str, recorded: bool = True,
+                            message_id: Optional[str] = None,
+                            attachments: Optional[List[Attachment]] = None) -> Optional[str]:
+        """Add a message to the chat display
+
+        recorded is False for text that isn't in the controller's history
+        (the welcome message, scheduled results). Returns the message's
+        mark for recorded messages.
+        """
+        mark = None
         self.chat_text.config(state=tk.NORMAL)
         
         # Add timestamp
         timestamp = datetime.now().strftime("%H:%M")
+        start = self.chat_text.index('end-1c')
         
         if msg_type == "user":
             # User message (right-aligned)
@@ -209,39 +297,419 @@ class ChatWindow:
             self.chat_text.insert(tk.END, f"\n{sender} ({timestamp})\n", 'timestamp')
             self.chat_text.insert(tk.END, f"{message}\n", 'ai')
         
+        for attachment in attachments or []:
+            if attachment.is_image:
+                # The thumbnail goes in front of the label once it's rendered
+                self._mark_counter += 1
+                image_mark = f"thumbnail-{self._mark_counter}"
+                self.chat_text.mark_set(image_mark, 'end-1c')
+                self.chat_text.mark_gravity(image_mark, tk.LEFT)
+                self.show_thumbnail(attachment, lambda image, mark=image_mark, label=attachment.label:
+                                    self.insert_thumbnail(mark, image, label))
+            self.chat_text.insert(tk.END, f"{attachment.label}\n", 'attachment')
+        
+        if recorded:
+            # Just past the header's leading newline
+            mark = self.add_message_mark(f"{start}+1c", message_id=message_id)
+        
         self.chat_text.config(state=tk.DISABLED)
         self.chat_text.see(tk.END)
+        self.rendered_lines += message.count('\n') + 3 + len(attachments or [])
         
         # Update message count
-        message_count = len(self.controller.get_message_history())
+        message_count = self.controller.message_count()
         self.message_count_label.config(text=f"{message_count} messages")
+        return mark
     
     def handle_send_message(self, event=None):
         """Handle sending a message"""
         message = self.message_var.get().strip()
-        if not message or self.is_typing:
+        if (not message and not self.pending_attachments) or self.is_typing or self.importing_attachments:
             return
         
         # Clear input
         self.message_var.set("")
+        self.hide_suggestions()
+        attachments = self.pending_attachments
+        self.set_pending_attachments([])
+        
+        if self.edit_target:
+            # The edited text becomes a new version of that message
+            self.controller.branch_from(self.edit_target)
+            self.edit_target = None
+            self.render_active_branch()
         
         # Add user message to chat
-        self.add_message_to_chat("You", message, "user")
+        mark = self.add_message_to_chat("You", message, "user", attachments=attachments)
         
         # Show typing indicator
         self.show_typing_indicator()
         
-        # Send to AI
-        self.controller.send_message_to_ai(message, self.on_ai_response)
+        # Send to AI; the response arrives on a worker thread
+        generation = None
+        
+        def on_response(response: str):
+            self.parent.after(0, lambda: self.on_ai_response(response, generation))
+        
+        def on_queued():
+            self.parent.after(0, lambda: self.on_message_queued(generation))
+        
+        generation = self.controller.send_message_to_ai(message, on_response, attachments=attachments,
+                                                        on_queued=on_queued)
+        self.current_generation = generation
+        self.mark_ids[mark] = generation.user_message.id
+    
+    def handle_return(self, event=None):
+        """Take the highlighted completion, or send"""
+        if self.suggestion_items and self.suggestion_chosen:
+            self.accept_suggestion()
+            return 'break'
+        self.handle_send_message()
+        return 'break'
+    
+    def handle_tab(self, event=None):
+        """Complete the input, or jump to the next ‹field› of a template"""
+        if self.suggestion_items:
+            self.accept_suggestion()
+            return 'break'
+        text = self.message_var.get()
+        span = next_field(text, self.message_entry.index(tk.INSERT))
+        if span is None:
+            return None
+        self.select_field(span)
+        return 'break'
+    
+    def update_suggestions(self):
+        """Look up completions for what has been typed so far"""
+        text = self.message_var.get()
+        config = self.controller.config
+        if (not config.get('snippets.enabled', True) or next_field(text) is not None
+                or len(text.strip()) < (1 if text.startswith('/') else 3)):
+            self.hide_suggestions()
+            return
+        started = time.perf_counter()
+        items = self.controller.snippets.lookup(text, config.get('snippets.max_suggestions', 6))
+        self.controller.metrics.observe('snippets.lookup_ms', (time.perf_counter() - started) * 1000)
+        if not items:
+            self.hide_suggestions()
+            return
+        
+        self.suggestion_items = items
+        self.suggestion_chosen = False
+        self.suggestion_list.delete(0, tk.END)
+        self.suggestion_list.insert(tk.END, *(item.label for item in items))
+        self.suggestion_list.config(height=len(items))
+        self.suggestion_list.selection_clear(0, tk.END)
+        self.suggestion_list.selection_set(0)
+        self.suggestion_list.place(in_=self.message_entry, relx=0, rely=0, relwidth=1, anchor='sw')
+        self.suggestion_list.lift()
+    
+    def move_suggestion(self, step: int):
+        """Arrow keys move through the completion list"""
+        if not self.suggestion_items:
+            return None
+        current = self.suggestion_list.curselection()
+        index = (current[0] + step if current and self.suggestion_chosen else 0) % len(self.suggestion_items)
+        self.suggestion_chosen = True
+        self.suggestion_list.selection_clear(0, tk.END)
+        self.suggestion_list.selection_set(index)
+        self.suggestion_list.see(index)
+        return 'break'
+    
+    def accept_suggestion(self):
+        """Put the selected completion in the input, selecting its first field"""
+        if not self.suggestion_items:
+            return
+        current = self.suggestion_list.curselection()
+        item = self.suggestion_items[current[0] if current else 0]
+        text = expand(item.text) if item.kind == 'snippet' else item.text
+        self.hide_suggestions()
+        self.message_var.set(text)
+        self.message_entry.focus_set()
+        span = next_field(text)
+        if span is not None:
+            self.select_field(span)
+        else:
+            self.message_entry.icursor(tk.END)
+        self.on_input_change()
+    
+    def select_field(self, span):
+        """Select a ‹field› so typing replaces it"""
+        self.message_entry.selection_range(*span)
+        self.message_entry.icursor(span[1])
+        self.message_entry.xview(span[0])
+    
+    def hide_suggestions(self):
+        if self.suggestion_items:
+            self.suggestion_items = []
+            self.suggestion_list.place_forget()
+        self.suggestion_chosen = False
+    
+    def handle_escape(self):
+        """Close the completion list, stop the response, or leave edit mode"""
+        if self.suggestion_items:
+            self.hide_suggestions()
+        elif self.is_typing:
+            self.handle_stop_generation()
+        elif self.edit_target:
+            self.edit_target = None
+            self.message_var.set("")
+            self.set_pending_attachments([])
+            self.status_label.config(text="Online", foreground='green')
+    
+    def choose_attachments(self):
+        """Pick files to attach; they are hashed and stored in the background"""
+        paths = filedialog.askopenfilenames(parent=self.parent, title="Attach Files")
+        for path in paths:
+            chip = self.add_attachment_chip(f"⏳ {os.path.basename(path)}")
+            self.importing_attachments += 1
+            self.send_button.config(state='disabled')
+            self.controller.add_attachment(
+                path,
+                lambda attachment, chip=chip: self.parent.after(0, self.on_attachment_ready, chip, attachment),
+                lambda error, chip=chip: self.parent.after(0, self.on_attachment_failed, chip, error))
+    
+    def on_attachment_ready(self, chip, attachment: Attachment):
+        """An imported file becomes part of the next message"""
+        self.attachment_import_done()
+        try:
+            if not chip.winfo_exists():
+                # Cleared (sent, edit cancelled) while it was importing
+                return
+        except tk.TclError:
+            return
+        chip.destroy()
+        self.pending_attachments.append(attachment)
+        self.add_attachment_chip(attachment.label, attachment)
+    
+    def on_attachment_failed(self, chip, error: str):
+        self.attachment_import_done()
+        try:
+            chip.destroy()
+        except tk.TclError:
+            return
+        messagebox.showerror("Attachment Failed", f"Could not attach the file:\n{error}")
+    
+    def attachment_import_done(self):
+        self.importing_attachments -= 1
+        if not self.importing_attachments and not self.is_typing:
+            try:
+                self.send_button.config(state='normal')
+            except tk.TclError:
+                pass
+    
+    def set_pending_attachments(self, attachments: List[Attachment]):
+        """Replace the attachments waiting to be sent"""
+        for chip in self.attachments_frame.winfo_children():
+            chip.destroy()
+        self.pending_attachments = list(attachments)
+        for attachment in self.pending_attachments:
+            self.add_attachment_chip(attachment.label, attachment)
+    
+    def add_attachment_chip(self, text: str, attachment: Optional[Attachment] = None) -> ttk.Frame:
+        """Show a pending attachment (or one still importing) above the input"""
+        chip = ttk.Frame(self.attachments_frame, padding=(0, 0, 10, 5))
+        chip.pack(side=tk.LEFT)
+        label = ttk.Label(chip, text=text, font=('Segoe UI', 9), compound=tk.LEFT)
+        label.pack(side=tk.LEFT)
+        if attachment is not None:
+            ttk.Button(chip, text="✕", width=2,
+                       command=lambda: self.remove_attachment(chip, attachment)).pack(side=tk.LEFT, padx=(3, 0))
+            self.show_thumbnail(attachment, lambda image: label.config(image=image))
+        return chip
+    
+    def remove_attachment(self, chip, attachment: Attachment):
+        if attachment in self.pending_attachments:
+            self.pending_attachments.remove(attachment)
+        chip.destroy()
+    
+    def show_thumbnail(self, attachment: Attachment, apply: Callable[[tk.PhotoImage], None]):
+        """Pass an image attachment's thumbnail to apply once it has been rendered"""
+        digest = attachment.digest
+        image = self.thumbnail_images.get(digest)
+        if image is not None:
+            apply(image)
+            return
+        future = self.controller.thumbnails.request(attachment)
+        if future is None:
+            return
+        
+        def loaded(path: str):
+            try:
+                image = self.thumbnail_images.get(digest)
+                if image is None:
+                    image = self.thumbnail_images[digest] = tk.PhotoImage(file=path)
+                apply(image)
+            except tk.TclError:
+                # The widget is gone, or the image can't be read
+                pass
+        
+        def done(future):
+            if not future.cancelled() and future.exception() is None:
+                self.parent.after(0, loaded, future.result())
+        
+        future.add_done_callback(done)
+    
+    def insert_thumbnail(self, mark: str, image: tk.PhotoImage, label: str):
+        """Put a rendered thumbnail above its attachment line in the transcript"""
+        try:
+            # Cleared or trimmed transcripts leave the mark somewhere else
+            if self.chat_text.get(mark, f"{mark} lineend") == label:
+                self.chat_text.config(state=tk.NORMAL)
+                # The mark has left gravity, so the image ends up before the newline
+                self.chat_text.insert(mark, "\n", 'attachment')
+                self.chat_text.image_create(mark, image=image, padx=2, pady=2)
+                self.chat_text.config(state=tk.DISABLED)
+                self.rendered_lines += 1
+            self.chat_text.mark_unset(mark)
+        except tk.TclError:
+            pass
+    
+    def message_at(self, index: str) -> Optional[str]:
+        """Id of the recorded message containing a Text index, if known"""
+        for mark in reversed(self.message_marks):
+            if self.chat_text.compare(mark, '<=', index):
+                return self.mark_ids.get(mark)
+        return None
+    
+    def show_message_menu(self, event):
+        """Context menu for editing a prompt or switching between its versions"""
+        message_id = self.message_at(self.chat_text.index(f"@{event.x},{event.y}"))
+        node = self.controller.conversation.nodes.get(message_id) if message_id else None
+        if node is None or node.message.sender != 'user':
+            return
+        
+        versions = self.controller.message_versions(message_id)
+        position = versions.index(message_id)
+        busy = 'disabled' if self.is_typing else 'normal'
+        
+        menu = tk.Menu(self.chat_text, tearoff=0)
+        menu.add_command(label="Edit and resend", state=busy,
+                         command=lambda: self.start_edit(message_id))
+        if len(versions) > 1:
+            menu.add_separator()
+            menu.add_command(label=f"◀ Previous version ({position + 1}/{len(versions)})",
+                             state=busy if position > 0 else 'disabled',
+                             command=lambda: self.switch_version(versions[position - 1]))
+            menu.add_command(label=f"Next version ({position + 1}/{len(versions)}) ▶",
+                             state=busy if position < len(versions) - 1 else 'disabled',
+                             command=lambda: self.switch_version(versions[position + 1]))
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
+    
+    def start_edit(self, message_id: str):
+        """Load a past prompt into the input; sending it creates a new branch"""
+        node = self.controller.conversation.nodes.get(message_id)
+        if node is None:
+            return
+        self.edit_target = message_id
+        self.message_var.set(node.message.content)
+        self.set_pending_attachments(node.message.attachments)
+        self.status_label.config(text="Editing an earlier message • Esc to cancel", foreground='orange')
+        self.message_entry.focus()
+        self.message_entry.icursor(tk.END)
+    
+    def switch_version(self, message_id: str):
+        """Show another version of a prompt and the replies that follow it"""
+        if self.is_typing:
+            return
+        if self.controller.switch_branch(message_id):
+            self.render_active_branch()
+    
+    def render_active_branch(self, batch: int = 50):
+        """Redraw the transcript from the active branch, paging older messages lazily"""
+        messages = self.controller.get_message_history()
+        self.chat_text.config(state=tk.NORMAL)
+        self.chat_text.delete("1.0", tk.END)
+        self.chat_text.config(state=tk.DISABLED)
+        self.clear_message_marks()
+        self.rendered_lines = 0
+        self.earlier_source = messages
+        self.earlier_end = max(0, len(messages) - batch)
+        self.insert_messages(messages[self.earlier_end:])
+        self.chat_text.see(tk.END)
+        self.message_count_label.config(text=f"{len(messages)} messages")
+    
+    def handle_stop_generation(self):
+        """Abort the in-flight response, keeping whatever text already arrived"""
+        generation = self.current_generation
+        if not self.is_typing or generation is None:
+            return
+        
+        self.current_generation = None
+        partial = self.controller.cancel_generation(generation)
+        self.hide_typing_indicator()
+        
+        if partial:
+            # The controller keeps the partial text as the prompt's reply
+            self.add_message_to_chat("AI Assistant", f"{partial} [stopped]", "ai")
+        
+        self.on_input_change()
+        self.message_entry.focus()
     
-    def on_ai_response(self, response: str):
+    def on_ai_response(self, response: str, generation=None):
         """Handle AI response"""
+        # Ignore late responses from a generation the user already stopped
+        if generation is not None and generation is not self.current_generation:
+            return
+        self.current_generation = None
+        
         # Hide typing indicator
         self.hide_typing_indicator()
+        self.update_queue_status()
         
         # Add AI response to chat
         self.add_message_to_chat("AI Assistant", response, "ai")
     
+    def on_message_queued(self, generation):
+        """The provider is unreachable; the message waits in the outbound queue"""
+        key = generation.user_message.id
+        if generation is self.current_generation:
+            self.current_generation = None
+            self.hide_typing_indicator()
+        
+        self.queued_keys.add(key)
+        self.chat_text.config(state=tk.NORMAL)
+        self.chat_text.insert(tk.END, "⏳ Waiting for connection • sends automatically\n",
+                              ('pending', f"pending-{key}"))
+        self.chat_text.config(state=tk.DISABLED)
+        self.chat_text.see(tk.END)
+        self.rendered_lines += 1
+        self.update_queue_status()
+    
+    def on_queued_reply(self, item, text: str, ok: bool):
+        """A queued message was sent after reconnecting"""
+        ranges = self.chat_text.tag_ranges(f"pending-{item.key}")
+        if ranges:
+            self.chat_text.config(state=tk.NORMAL)
+            self.chat_text.delete(ranges[0], ranges[-1])
+            self.chat_text.config(state=tk.DISABLED)
+            self.rendered_lines -= 1
+        self.queued_keys.discard(item.key)
+        
+        if item.conversation_id == self.controller.conversation_id:
+            self.add_message_to_chat("AI Assistant", text, "ai", recorded=ok)
+        else:
+            self.add_message_to_chat(f"AI Assistant (earlier chat: \"{item.content[:40]}\")", text, "ai",
+                                     recorded=False)
+        self.update_queue_status()
+    
+    def update_queue_status(self):
+        """Show how many sends are waiting for the network"""
+        if self.is_typing:
+            return
+        if self.queued_keys:
+            self.status_label.config(text=f"Offline • {len(self.queued_keys)} queued", foreground='orange')
+        else:
+            self.status_label.config(text="Online", foreground='green')
+    
+    def show_scheduled_result(self, result):
+        """Show the answer to a scheduled prompt (it isn't part of the conversation)"""
+        note = f" (covers {result.coalesced} missed runs)" if result.coalesced > 1 else ""
+        self.add_message_to_chat(f"⏰ {result.name}{note}", result.text, "ai", recorded=False)
+    
     def on_new_message(self, message):
         """Handle new message from controller"""
         # This is called when controller adds messages
@@ -253,6 +721,7 @@ class ChatWindow:
         self.is_typing = True
         self.status_label.config(text="AI is typing...", foreground='blue')
         self.send_button.config(state='disabled')
+        self.stop_button.config(state='normal')
         
         # Add typing dots to chat
         self.chat_text.config(state=tk.NORMAL)
@@ -269,6 +738,7 @@ class ChatWindow:
         self.is_typing = False
         self.status_label.config(text="Online", foreground='green')
         self.send_button.config(state='normal')
+        self.stop_button.config(state='disabled')
         
         # Remove typing indicator from chat
         if hasattr(self, 'typing_end'):
@@ -312,12 +782,17 @@ class ChatWindow:
         has_text = bool(self.message_var.get().strip())
         state = 'normal' if has_text and not self.is_typing else 'disabled'
         self.send_button.config(state=state)
+        
+        # Keys that navigate or accept completions don't change the text
+        if event is not None and event.keysym not in ('Up', 'Down', 'Tab', 'Return', 'Escape',
+                                                      'Shift_L', 'Shift_R', 'Control_L', 'Control_R'):
+            self.update_suggestions()
     
     def show_settings(self):
         """Show settings dialog"""
         settings_window = tk.Toplevel(self.parent)
         settings_window.title("Settings")
-        settings_window.geometry("400x300")
+        settings_window.geometry("420x580")
         settings_window.transient(self.parent)
         settings_window.grab_set()
         
@@ -328,27 +803,77 @@ class ChatWindow:
         ttk.Label(main_frame, text="Chat Settings", 
                  font=('Segoe UI', 14, 'bold')).grid(row=0, column=0, sticky=tk.W, pady=(0, 20))
         
+        # Provider settings
+        ttk.Label(main_frame, text="AI Provider:").grid(row=1, column=0, sticky=tk.W)
+        provider_var = tk.StringVar(value=self.controller.config.get('ai.api_provider', 'mock'))
+        ttk.Combobox(main_frame, textvariable=provider_var, state='readonly',
+                     values=available_providers()).grid(row=2, column=0, pady=(5, 10), sticky=tk.W)
+        
+        ttk.Label(main_frame, text="Model:").grid(row=3, column=0, sticky=tk.W)
+        model_var = tk.StringVar(value=self.controller.config.get('ai.model', ''))
+        ttk.Entry(main_frame, textvariable=model_var, width=50).grid(row=4, column=0, pady=(5, 10), sticky=(tk.W, tk.E))
+        
         # API Key setting
-        ttk.Label(main_frame, text="AI API Key (Optional):").grid(row=1, column=0, sticky=tk.W)
+        ttk.Label(main_frame, text="AI API Key (Optional):").grid(row=5, column=0, sticky=tk.W)
         api_key_var = tk.StringVar()
         api_key_entry = ttk.Entry(main_frame, textvariable=api_key_var, width=50, show="*")
-        api_key_entry.grid(row=2, column=0, pady=(5, 10), sticky=(tk.W, tk.E))
+        api_key_entry.grid(row=6, column=0, pady=(5, 10), sticky=(tk.W, tk.E))
         
         # Clear chat button
         ttk.Button(main_frame, text="Clear Chat History", 
-                  command=self.clear_chat).grid(row=3, column=0, sticky=tk.W, pady=5)
+                  command=self.clear_chat).grid(row=7, column=0, sticky=tk.W, pady=5)
+        
+        # Profiler toggle
+        profiler = self.controller.profiler
+        profiler_frame = ttk.Frame(main_frame)
+        profiler_frame.grid(row=8, column=0, sticky=(tk.W, tk.E), pady=5)
+        profiler_status = ttk.Label(profiler_frame, text="", font=('Segoe UI', 8), foreground='gray')
+        profiler_status.grid(row=1, column=0, columnspan=2, sticky=tk.W)
+        
+        def toggle_profiler():
+            output = profiler.toggle()
+            profiler_button.config(text="Stop Profiling" if profiler.is_running else "Start Profiling")
+            if output:
+                profiler_status.config(text=f"Saved {output}")
+            elif profiler.is_running:
+                profiler_status.config(text="Profiling all threads...")
+        
+        profiler_button = ttk.Button(profiler_frame,
+                                     text="Stop Profiling" if profiler.is_running else "Start Profiling",
+                                     command=toggle_profiler)
+        profiler_button.grid(row=0, column=0, sticky=tk.W)
+        
+        # Usage statistics (read from the rollups, so this is instant)
+        usage_frame = ttk.Frame(main_frame)
+        usage_frame.grid(row=9, column=0, sticky=(tk.W, tk.E), pady=5)
+        
+        def show_usage():
+            # The settings grab would keep the stats window from getting input
+            settings_window.grab_release()
+            UsageWindow(settings_window, self.controller)
+        
+        ttk.Button(usage_frame, text="Usage Statistics...",
+                   command=show_usage).grid(row=0, column=0, sticky=tk.W)
+        if self.controller.analytics is not None:
+            today = self.controller.analytics.recent(1, group_by=())
+            requests = sum(row.requests for row in today)
+            tokens = sum(row.total_tokens for row in today)
+            ttk.Label(usage_frame, text=f"Today: {requests:,} requests, {tokens:,} tokens",
+                      font=('Segoe UI', 8), foreground='gray').grid(row=1, column=0, sticky=tk.W)
         
         # About info
         ttk.Label(main_frame, text="AI Chat Desktop Application v1.0", 
-                 font=('Segoe UI', 9)).grid(row=4, column=0, sticky=tk.W, pady=(20, 5))
+                 font=('Segoe UI', 9)).grid(row=10, column=0, sticky=tk.W, pady=(20, 5))
         ttk.Label(main_frame, text="Built with Python and tkinter", 
-                 font=('Segoe UI', 9), foreground='gray').grid(row=5, column=0, sticky=tk.W)
+                 font=('Segoe UI', 9), foreground='gray').grid(row=11, column=0, sticky=tk.W)
         
         # Buttons
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=6, column=0, pady=(20, 0), sticky=(tk.W, tk.E))
+        button_frame.grid(row=12, column=0, pady=(20, 0), sticky=(tk.W, tk.E))
         
         def save_settings():
+            self.controller.config.set('ai.api_provider', provider_var.get())
+            self.controller.config.set('ai.model', model_var.get().strip())
             api_key = api_key_var.get().strip()
             if api_key:
                 self.controller.set_api_key(api_key)
@@ -359,6 +884,22 @@ class ChatWindow:
         ttk.Button(button_frame, text="Cancel", 
                   command=settings_window.destroy).grid(row=0, column=1, padx=(10, 0))
     
+    def show_compare(self):
+        """Open (or raise) the side-by-side model comparison window"""
+        if self.compare_window is not None:
+            try:
+                if self.compare_window.window.winfo_exists():
+                    self.compare_window.window.lift()
+                    return
+            except tk.TclError:
+                pass
+        self.compare_window = CompareWindow(self.parent, self.controller, on_keep=self.on_comparison_kept)
+    
+    def on_comparison_kept(self, user_message, ai_message):
+        """Show a prompt and reply kept from the compare window"""
+        self.add_message_to_chat("You", user_message.content, "user", message_id=user_message.id)
+        self.add_message_to_chat("AI Assistant", ai_message.content, "ai", message_id=ai_message.id)
+    
     def clear_chat(self):
         """Clear chat history"""
         if messagebox.askyesno("Clear Chat", "Are you sure you want to clear all chat history?"):
@@ -366,9 +907,162 @@ class ChatWindow:
             self.chat_text.config(state=tk.NORMAL)
             self.chat_text.delete("1.0", tk.END)
             self.chat_text.config(state=tk.DISABLED)
+            self.rendered_lines = 0
+            self.clear_message_marks()
+            self.earlier_end = 0
+            self.edit_target = None
+            self.snapshot_store.clear()
             self.add_welcome_message()
             self.message_count_label.config(text="0 messages")
     
+    def rendered_line_count(self) -> int:
+        """Number of lines currently in the transcript widget"""
+        return int(self.chat_text.index('end-1c').split('.')[0])
+    
+    def trim_rendered_history(self, keep_lines: int):
+        """Remove the oldest transcript lines, keeping the most recent ones"""
+        if self.rendered_line_count() <= keep_lines:
+            return
+        cut = self.chat_text.index(f"end-{keep_lines}l")
+        while self.message_marks and self.chat_text.compare(self.message_marks[0], '<', cut):
+            mark = self.message_marks.pop(0)
+            self.mark_ids.pop(mark, None)
+            self.chat_text.mark_unset(mark)
+        self.chat_text.config(state=tk.NORMAL)
+        self.chat_text.delete("1.0", cut)
+        self.chat_text.config(state=tk.DISABLED)
+        self.rendered_lines = keep_lines
+        # Trimmed messages are not paged back in
+        self.earlier_end = 0
+    
+    def add_message_mark(self, index: str, first: bool = False,
+                         message_id: Optional[str] = None) -> str:
+        """Mark where a recorded message starts"""
+        self._mark_counter += 1
+        name = f"message-{self._mark_counter}"
+        self.chat_text.mark_set(name, index)
+        self.mark_ids[name] = message_id
+        if first:
+            self.message_marks.insert(0, name)
+        else:
+            self.message_marks.append(name)
+        return name
+    
+    def clear_message_marks(self):
+        for name in self.message_marks:
+            self.chat_text.mark_unset(name)
+        self.message_marks = []
+        self.mark_ids = {}
+    
+    def restore_snapshot(self) -> bool:
+        """Paint the last session's transcript page and load its history behind it"""
+        if not self.controller.config.get('chat.restore_session', True):
+            return False
+        snapshot = self.snapshot_store.load(self.user_email)
+        if not snapshot:
+            return False
+        
+        started = time.perf_counter()
+        self.chat_text.config(state=tk.NORMAL)
+        starts = paint(self.chat_text, snapshot)
+        self.chat_text.config(state=tk.DISABLED)
+        message_ids = snapshot.get("message_ids") or [None] * len(starts)
+        for index, message_id in zip(starts, message_ids):
+            self.add_message_mark(index, message_id=message_id)
+        self.rendered_lines = self.rendered_line_count()
+        self.controller.metrics.observe('startup.snapshot_paint_ms',
+                                        (time.perf_counter() - started) * 1000)
+        
+        conversation_id = snapshot.get("conversation_id")
+        if conversation_id:
+            covered = len(starts)
+            self.controller.resume_conversation(
+                conversation_id,
+                lambda stored: self.parent.after(0, self.on_history_loaded, stored, covered),
+                head_id=snapshot.get("head_id"))
+        return True
+    
+    def on_history_loaded(self, stored, covered: int):
+        """Keep the stored messages older than the snapshot for paging in on scroll"""
+        try:
+            if not self.chat_text.winfo_exists():
+                return
+        except tk.TclError:
+            return
+        self.earlier_source = stored
+        self.earlier_end = max(0, len(stored) - covered)
+        self.message_count_label.config(text=f"{self.controller.message_count()} messages")
+    
+    def on_chat_scroll(self, first, last):
+        """Scrollbar update; pages in older messages when the top is reached"""
+        self.chat_text.vbar.set(first, last)
+        if float(first) <= 0.0 and self.earlier_end > 0 and not self._earlier_scheduled:
+            self._earlier_scheduled = True
+            self.parent.after_idle(self.load_earlier_messages)
+    
+    def load_earlier_messages(self, batch: int = 50):
+        """Render the next batch of older messages above the transcript"""
+        self._earlier_scheduled = False
+        if self.earlier_end <= 0:
+            return
+        start = max(0, self.earlier_end - batch)
+        messages = self.earlier_source[start:self.earlier_end]
+        self.earlier_end = start
+        
+        top = self.chat_text.index('@0,0')
+        added = self.insert_messages(messages, at_start=True)
+        
+        # Keep the line the user was looking at in place
+        self.chat_text.yview(f"{int(top.split('.')[0]) + added}.0")
+    
+    def insert_messages(self, messages, at_start: bool = False) -> int:
+        """Render stored messages with a single insert; returns the lines added"""
+        first_line = 1 if at_start else int(self.chat_text.index('end-1c').split('.')[0])
+        args = []
+        starts = []
+        line = first_line
+        for message in messages:
+            starts.append((f"{line + 1}.0", message.id))
+            sender = "You" if message.sender == 'user' else "AI Assistant"
+            header = f"\n{sender} ({message.timestamp.strftime('%H:%M')})\n"
+            body = f"{message.content}\n"
+            args.extend((header, 'timestamp', body, 'user' if message.sender == 'user' else 'ai'))
+            line += 2 + message.content.count('\n') + 1
+            if message.attachments:
+                args.extend(("".join(f"{attachment.label}\n" for attachment in message.attachments),
+                             'attachment'))
+                line += len(message.attachments)
+        if not args:
+            return 0
+        
+        self.chat_text.config(state=tk.NORMAL)
+        self.chat_text.insert("1.0" if at_start else tk.END, *args)
+        self.chat_text.config(state=tk.DISABLED)
+        if at_start:
+            for index, message_id in reversed(starts):
+                self.add_message_mark(index, first=True, message_id=message_id)
+        else:
+            for index, message_id in starts:
+                self.add_message_mark(index, message_id=message_id)
+        
+        added = line - first_line
+        self.rendered_lines += added
+        return added
+    
+    def save_snapshot(self):
+        """Persist the visible transcript page for the next launch"""
+        if not self.controller.config.get('chat.restore_session', True):
+            return
+        try:
+            snapshot = capture(self.chat_text, self.message_marks,
+                               self.controller.config.get('chat.snapshot_lines', 300), self.mark_ids)
+        except tk.TclError:
+            return
+        snapshot["user"] = self.user_email
+        snapshot["conversation_id"] = self.controller.conversation_id
+        snapshot["head_id"] = self.controller.conversation.head_id
+        self.snapshot_store.save(snapshot)
+    
     def minimize_to_tray(self):
         """Minimize window to system tray"""
         from main import AIChairApplication
@@ -397,16 +1091,17 @@ class ChatWindow:
     def destroy(self):
         """Clean up the window"""
         # Remove message callback
-        if self in self.controller.message_callbacks:
-            self.controller.message_callbacks.remove(self.on_new_message)
+        self.controller.remove_message_callback(self.on_new_message)
         
         # Unbind events
         try:
             self.parent.unbind('<Control-m>')
             self.parent.unbind('<F11>')
+            self.parent.unbind('<Escape>')
         except:
             pass
         
         # Clear widgets
         for widget in self.parent.winfo_children():
-            widget.destroy()
\ No newline at end of file
+            if not getattr(widget, 'persistent', False):
+                widget.destroy()
\ No newline at end of file
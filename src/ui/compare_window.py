@@ -0,0 +1,201 @@
+"""
+Compare Window
+Sends one prompt to several provider/model pairs side by side. Each answer
+streams into its own column with its time to first token, tokens per second
+and total latency; one of them can then be kept in the conversation.
+"""
+
+import queue
+import tkinter as tk
+from tkinter import ttk, scrolledtext
+from typing import Callable, Dict, List, Optional
+
+
+class CompareWindow:
+    def __init__(self, parent, controller, on_keep: Optional[Callable] = None):
+        self.parent = parent
+        self.controller = controller
+        self.on_keep = on_keep  # Called with the kept (user, ai) messages
+        self.run = None
+        self.columns: List[Dict] = []
+        self._chunks = queue.SimpleQueue()  # (run token, target index, chunk) from worker threads
+        self._flush_scheduled = False
+        self._run_token = None
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Compare Models")
+        self.window.geometry("1000x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.setup_ui()
+
+    def setup_ui(self):
+        """Setup the target list, prompt and result columns"""
+        frame = ttk.Frame(self.window, padding="10")
+        frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(0, weight=1)
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(3, weight=1)
+
+        targets = self.controller.config.get('compare.targets') or [
+            f"{self.controller.config.get('ai.api_provider', 'mock')}:{self.controller.config.get('ai.model', '')}"]
+        ttk.Label(frame, text="Models:").grid(row=0, column=0, sticky=tk.W, padx=(0, 8))
+        self.targets_var = tk.StringVar(value=", ".join(targets))
+        ttk.Entry(frame, textvariable=self.targets_var).grid(row=0, column=1, columnspan=3,
+                                                             sticky=(tk.W, tk.E))
+
+        ttk.Label(frame, text="Prompt:").grid(row=1, column=0, sticky=tk.W, padx=(0, 8), pady=(8, 0))
+        self.prompt_var = tk.StringVar()
+        self.prompt_entry = ttk.Entry(frame, textvariable=self.prompt_var, font=('Segoe UI', 10))
+        self.prompt_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=(8, 0))
+        self.prompt_entry.bind('<Return>', self.handle_run)
+
+        self.run_button = ttk.Button(frame, text="Run", command=self.handle_run)
+        self.run_button.grid(row=1, column=2, padx=(8, 0), pady=(8, 0))
+        self.stop_button = ttk.Button(frame, text="Stop", command=self.handle_stop, state='disabled')
+        self.stop_button.grid(row=1, column=3, padx=(5, 0), pady=(8, 0))
+
+        self.status_label = ttk.Label(frame, text="Targets are provider:model, separated by commas",
+                                      font=('Segoe UI', 8), foreground='gray')
+        self.status_label.grid(row=2, column=0, columnspan=4, sticky=tk.W, pady=(5, 5))
+
+        self.columns_frame = ttk.Frame(frame)
+        self.columns_frame.grid(row=3, column=0, columnspan=4, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.columns_frame.rowconfigure(0, weight=1)
+
+        self.window.bind('<Escape>', lambda e: self.handle_stop())
+        self.prompt_entry.focus_set()
+
+    def build_columns(self, labels: List[str]):
+        """One column per target"""
+        for child in self.columns_frame.winfo_children():
+            child.destroy()
+        self.columns = []
+        for index, label in enumerate(labels):
+            self.columns_frame.columnconfigure(index, weight=1, uniform='compare')
+            column = ttk.LabelFrame(self.columns_frame, text=label, padding="5")
+            column.grid(row=0, column=index, sticky=(tk.W, tk.E, tk.N, tk.S),
+                        padx=(0 if index == 0 else 5, 0))
+            column.columnconfigure(0, weight=1)
+            column.rowconfigure(1, weight=1)
+
+            stats = ttk.Label(column, text="Waiting...", font=('Segoe UI', 8), foreground='gray')
+            stats.grid(row=0, column=0, sticky=tk.W)
+            text = scrolledtext.ScrolledText(column, wrap=tk.WORD, width=30, height=20,
+                                             font=('Segoe UI', 9), state=tk.DISABLED)
+            text.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 5))
+            keep = ttk.Button(column, text="Keep this reply", state='disabled',
+                              command=lambda index=index: self.keep(index))
+            keep.grid(row=2, column=0, sticky=tk.E)
+            self.columns.append({"stats": stats, "text": text, "keep": keep})
+
+    def handle_run(self, event=None):
+        """Send the prompt to every target"""
+        prompt = self.prompt_var.get().strip()
+        if not prompt or (self.run is not None and not self.run.done):
+            return
+        targets = [spec.strip() for spec in self.targets_var.get().split(',') if spec.strip()]
+        if not targets:
+            return
+        if targets != self.controller.config.get('compare.targets'):
+            self.controller.config.set('compare.targets', targets)
+
+        run = None
+        token = self._run_token = object()
+
+        def on_chunk(index: int, chunk: str, result):
+            # Worker threads; batch the deltas into one Tk update
+            self._chunks.put((token, index, chunk))
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                self.schedule(self.flush_chunks)
+
+        def on_done(index: int, result):
+            self.schedule(lambda: self.on_target_done(run, index, result))
+
+        run = self.controller.compare_models(prompt, targets, on_chunk, on_done)
+        self.run = run
+        self.build_columns([target.label for target in run.targets])
+        self.status_label.config(text=f"Running {len(run.targets)} models...", foreground='blue')
+        self.run_button.config(state='disabled')
+        self.stop_button.config(state='normal')
+
+    def schedule(self, callback: Callable):
+        """Run a callback on the Tk thread, unless the window has been closed"""
+        try:
+            self.window.after(0, callback)
+        except (tk.TclError, RuntimeError):
+            pass
+
+    def flush_chunks(self):
+        # Clear the flag before draining, so a chunk put meanwhile schedules another flush
+        self._flush_scheduled = False
+        pending: Dict[int, List[str]] = {}
+        while True:
+            try:
+                token, index, chunk = self._chunks.get_nowait()
+            except queue.Empty:
+                break
+            if token is self._run_token:
+                pending.setdefault(index, []).append(chunk)
+        # Only the current run's chunks are kept, so they belong to self.run
+        run = self.run
+        for index, chunks in pending.items():
+            column = self.columns[index]
+            column["text"].config(state=tk.NORMAL)
+            column["text"].insert(tk.END, ''.join(chunks))
+            column["text"].config(state=tk.DISABLED)
+            column["text"].see(tk.END)
+            result = run.results[index]
+            if result.ttft_ms is not None:
+                column["stats"].config(text=f"TTFT {result.ttft_ms:.0f} ms • streaming...",
+                                       foreground='blue')
+
+    def on_target_done(self, run, index: int, result):
+        """Show a target's final text and timings"""
+        if run is not self.run:
+            return
+        column = self.columns[index]
+        text = column["text"]
+        text.config(state=tk.NORMAL)
+        text.delete("1.0", tk.END)
+        text.insert(tk.END, result.text)
+        if result.error:
+            text.insert(tk.END, f"\n[Error: {result.error}]")
+        text.config(state=tk.DISABLED)
+        column["stats"].config(text=result.summary(),
+                               foreground='red' if result.status == 'error' else 'gray')
+        if result.status == 'completed' and result.text:
+            column["keep"].config(state='normal')
+
+        if run.done or all(r.status != 'running' for r in run.results):
+            self.status_label.config(
+                text=f"Finished in {run.wall_ms:.0f} ms (wall clock)" if run.wall_ms else "Finished",
+                foreground='gray')
+            self.run_button.config(state='normal')
+            self.stop_button.config(state='disabled')
+
+    def handle_stop(self):
+        """Stop every target that is still streaming"""
+        if self.run is not None and not self.run.done:
+            self.run.cancel()
+            self.status_label.config(text="Stopping...", foreground='orange')
+
+    def keep(self, index: int):
+        """Add the prompt and this column's reply to the conversation"""
+        run = self.run
+        if run is None:
+            return
+        result = run.results[index]
+        messages = self.controller.keep_comparison(run.message, result.text, result.target.provider)
+        for column in self.columns:
+            column["keep"].config(state='disabled')
+        self.status_label.config(text=f"Kept the {result.target.label} reply", foreground='green')
+        if self.on_keep:
+            self.on_keep(*messages)
+
+    def close(self):
+        if self.run is not None:
+            self.run.cancel()
+        self.window.destroy()
@@ -0,0 +1,173 @@
+"""
+Quick Message Window
+Small always-on-top prompt opened from the tray. It is built hidden at
+startup so showing it is just a deiconify, and it streams the answer inline
+without touching the main chat transcript.
+"""
+
+import queue
+import time
+import tkinter as tk
+import uuid
+from tkinter import ttk
+
+
+class QuickMessageWindow:
+    def __init__(self, root, controller):
+        self.root = root
+        self.controller = controller
+        self.current_generation = None
+        self._chunks = queue.SimpleQueue()  # (send, chunk) from worker threads
+        self._flush_scheduled = False
+        self._send = None  # Identifies the send whose chunks are shown
+        self._shown_at = None
+
+        self.window = tk.Toplevel(root)
+        # Survives the main window swapping between sign-in and chat screens
+        self.window.persistent = True
+        self.window.withdraw()
+        self.window.title("Quick Message")
+        self.window.resizable(False, False)
+        self.window.attributes('-topmost', True)
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+
+        self.setup_ui()
+
+    def setup_ui(self):
+        """Setup the prompt and answer widgets"""
+        frame = ttk.Frame(self.window, padding="10")
+        frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        frame.columnconfigure(0, weight=1)
+
+        self.message_var = tk.StringVar()
+        self.message_entry = ttk.Entry(frame, textvariable=self.message_var, font=('Segoe UI', 10))
+        self.message_entry.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(0, 8))
+
+        self.send_button = ttk.Button(frame, text="Send", command=self.handle_send)
+        self.send_button.grid(row=0, column=1)
+
+        self.answer_text = tk.Text(frame, width=52, height=10, wrap=tk.WORD,
+                                   font=('Segoe UI', 9), relief='flat',
+                                   background='#ececf0', state=tk.DISABLED)
+        self.answer_text.grid(row=1, column=0, columnspan=2, pady=(8, 0))
+
+        self.status_label = ttk.Label(frame, text="Enter to send • Esc to close",
+                                      font=('Segoe UI', 8), foreground='gray')
+        self.status_label.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+
+        self.message_entry.bind('<Return>', self.handle_send)
+        self.window.bind('<Escape>', lambda e: self.handle_escape())
+
+    def show(self):
+        """Show the popup near the tray and focus the prompt"""
+        self._shown_at = time.perf_counter()
+        self.window.update_idletasks()
+        x = self.window.winfo_screenwidth() - self.window.winfo_reqwidth() - 24
+        y = self.window.winfo_screenheight() - self.window.winfo_reqheight() - 72
+        self.window.geometry(f"+{x}+{y}")
+
+        self.window.deiconify()
+        self.window.lift()
+        self.window.focus_force()
+        self.message_entry.focus_set()
+        self.message_entry.select_range(0, tk.END)
+        self.window.after_idle(self._record_show_latency)
+
+    def _record_show_latency(self):
+        if self._shown_at is not None:
+            self.controller.metrics.observe('quick_message.show_ms',
+                                            (time.perf_counter() - self._shown_at) * 1000)
+            self._shown_at = None
+
+    def hide(self):
+        """Hide the popup, keeping it ready for next time"""
+        self.window.withdraw()
+
+    def is_visible(self) -> bool:
+        return self.window.winfo_viewable()
+
+    def handle_escape(self):
+        """Stop the answer if one is streaming, otherwise close"""
+        if self.current_generation is not None:
+            self.handle_stop()
+        else:
+            self.hide()
+
+    def handle_send(self, event=None):
+        """Send the prompt through the controller"""
+        message = self.message_var.get().strip()
+        if not message or self.current_generation is not None:
+            return
+
+        self.message_var.set("")
+        self.set_answer("")
+        self.status_label.config(text="AI is typing... • Esc to stop", foreground='blue')
+        self.send_button.config(state='disabled')
+
+        generation = None
+        send = self._send = object()
+
+        def on_chunk(chunk: str):
+            # Called per delta on the worker thread; batch them into one Tk update
+            self._chunks.put((send, chunk))
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                self.root.after(0, self._flush_chunks)
+
+        def on_response(response: str):
+            self.root.after(0, lambda: self.on_response(response, generation))
+
+        # Non-interactive: don't take over the chat window's typing slot, and
+        # keep the exchange in its own conversation rather than the chat's
+        generation = self.controller.send_message_to_ai(message, on_response, on_chunk=on_chunk,
+                                                        interactive=False,
+                                                        conversation_id=uuid.uuid4().hex)
+        self.current_generation = generation
+
+    def _flush_chunks(self):
+        # Clear the flag before draining, so a chunk put meanwhile schedules another flush
+        self._flush_scheduled = False
+        chunks = []
+        while True:
+            try:
+                send, chunk = self._chunks.get_nowait()
+            except queue.Empty:
+                break
+            if send is self._send:
+                chunks.append(chunk)
+        if chunks and self.current_generation is not None:
+            self.answer_text.config(state=tk.NORMAL)
+            self.answer_text.insert(tk.END, ''.join(chunks))
+            self.answer_text.config(state=tk.DISABLED)
+            self.answer_text.see(tk.END)
+
+    def on_response(self, response: str, generation=None):
+        """Show the final answer"""
+        if generation is not self.current_generation:
+            return
+        self.current_generation = None
+        self._send = None
+        self.set_answer(response)
+        self.reset_status()
+
+    def handle_stop(self):
+        """Abort the streaming answer, keeping what already arrived"""
+        generation = self.current_generation
+        if generation is None:
+            return
+        self.current_generation = None
+        partial = self.controller.cancel_generation(generation)
+        self._send = None
+        self.set_answer(f"{partial} [stopped]" if partial else "")
+        self.reset_status()
+
+    def set_answer(self, text: str):
+        self.answer_text.config(state=tk.NORMAL)
+        self.answer_text.delete("1.0", tk.END)
+        self.answer_text.insert(tk.END, text)
+        self.answer_text.config(state=tk.DISABLED)
+
+    def reset_status(self):
+        self.status_label.config(text="Enter to send • Esc to close", foreground='gray')
+        self.send_button.config(state='normal')
+        self.message_entry.focus_set()
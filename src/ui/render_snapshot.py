@@ -0,0 +1,131 @@
+"""
+Render Snapshot
+Persists the last page of the chat transcript as styled text runs so a
+restarted app can paint it immediately, before any history is loaded.
+
+A snapshot is the tail of the Text widget dumped as (text, tags) runs, the
+line offsets where recorded messages start, and the scroll position. Lines
+are stored unwrapped: Tk wraps them natively for whatever size the window
+opens at, and painting the runs is a single insert call.
+"""
+
+import json
+import os
+import tkinter as tk
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from ..logger import get_logger
+
+log = get_logger('snapshot')
+
+SNAPSHOT_VERSION = 1
+
+# Transient content that should never be restored
+SKIP_TAGS = {'typing'}
+
+
+def _line(index: str) -> int:
+    return int(index.split('.')[0])
+
+
+def capture(text_widget, message_marks: List[str], max_lines: int = 300,
+            mark_ids: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+    """Dump the tail of a transcript widget
+
+    Starts at a message boundary so every recorded message in the snapshot
+    is complete. Returns the runs, message start offsets (and ids, where
+    known) and scroll position.
+    """
+    mark_ids = mark_ids or {}
+    last_line = _line(text_widget.index('end-1c'))
+    mark_lines = [_line(text_widget.index(mark)) for mark in message_marks]
+
+    start_line = 1
+    candidates = [line for line in mark_lines if line >= last_line - max_lines]
+    if candidates:
+        start_line = candidates[0]
+    elif mark_lines:
+        start_line = mark_lines[-1]
+
+    runs = []
+    active_tags = set()
+    for key, value, index in text_widget.dump(f"{start_line}.0", 'end-1c', text=True, tag=True):
+        if key == 'tagon':
+            active_tags.add(value)
+        elif key == 'tagoff':
+            active_tags.discard(value)
+        elif key == 'text' and not (active_tags & SKIP_TAGS):
+            tags = sorted(active_tags - {'sel'})
+            if runs and runs[-1][1] == tags:
+                runs[-1][0] += value
+            else:
+                runs.append([value, tags])
+
+    included = [(line, mark) for line, mark in zip(mark_lines, message_marks) if line >= start_line]
+    top_line = _line(text_widget.index('@0,0'))
+    return {
+        "version": SNAPSHOT_VERSION,
+        "runs": runs,
+        "messages": [line - start_line for line, _ in included],
+        "message_ids": [mark_ids.get(mark) for _, mark in included],
+        "top_line": max(0, top_line - start_line),
+        "at_end": text_widget.yview()[1] >= 1.0
+    }
+
+
+def paint(text_widget, snapshot: Dict[str, Any]) -> List[str]:
+    """Insert a snapshot into an empty transcript widget
+
+    Returns the Text indices where recorded messages start; the caller turns
+    them into marks.
+    """
+    args = []
+    for text, tags in snapshot.get("runs", []):
+        args.extend((text, tuple(tags)))
+    if args:
+        text_widget.insert(tk.END, *args)
+
+    if snapshot.get("at_end", True):
+        text_widget.see(tk.END)
+    else:
+        text_widget.yview(f"{snapshot.get('top_line', 0) + 1}.0")
+
+    return [f"{offset + 1}.0" for offset in snapshot.get("messages", [])]
+
+
+class SnapshotStore:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or Path.home() / ".ai_chat_app" / "render_snapshot.json"
+
+    def load(self, user: str) -> Optional[Dict[str, Any]]:
+        """Load the snapshot saved for a user, if any"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("user") != user:
+            return None
+        return snapshot
+
+    def save(self, snapshot: Dict[str, Any]):
+        """Write a snapshot atomically"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            log.error("Error saving render snapshot: %s", e)
+
+    def clear(self):
+        """Delete the saved snapshot"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.error("Error deleting render snapshot: %s", e)
@@ -0,0 +1,128 @@
+"""
+Usage Window
+Token usage and latency per model, user and period, read from the
+precomputed analytics rollups, with CSV export.
+"""
+
+import tkinter as tk
+from datetime import datetime, timedelta
+from tkinter import ttk, filedialog, messagebox
+
+from ..analytics import export_csv
+
+# Label -> (resolution, start of the range)
+RANGES = {
+    "Last hour (by minute)": ('minute', lambda now: now - timedelta(hours=1)),
+    "Today (by hour)": ('hour', lambda now: now.replace(hour=0, minute=0, second=0, microsecond=0)),
+    "Last 7 days": ('day', lambda now: now - timedelta(days=6)),
+    "Last 30 days": ('day', lambda now: now - timedelta(days=29)),
+    "All time": ('day', lambda now: None),
+}
+GROUPS = {
+    "Model": ('model',),
+    "User": ('user',),
+    "User and model": ('user', 'model'),
+    "Period": ('period',),
+    "Period and model": ('period', 'model'),
+}
+COLUMNS = (("period", "Period", 120), ("user", "User", 140), ("model", "Model", 160),
+           ("requests", "Requests", 70), ("errors", "Errors", 55), ("prompt", "Prompt tok", 80),
+           ("completion", "Output tok", 80), ("ttft", "Avg TTFT", 70), ("p50", "p50", 60),
+           ("p95", "p95", 60))
+
+
+class UsageWindow:
+    def __init__(self, parent, controller):
+        self.parent = parent
+        self.controller = controller
+        self.rows = []
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Usage Statistics")
+        self.window.geometry("900x420")
+        self.window.transient(parent)
+
+        self.setup_ui()
+        self.refresh()
+
+    def setup_ui(self):
+        """Setup the range/grouping pickers, table and totals"""
+        frame = ttk.Frame(self.window, padding="10")
+        frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(0, weight=1)
+        frame.columnconfigure(4, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        ttk.Label(frame, text="Range:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        self.range_var = tk.StringVar(value="Last 7 days")
+        range_box = ttk.Combobox(frame, textvariable=self.range_var, state='readonly',
+                                 values=list(RANGES), width=22)
+        range_box.grid(row=0, column=1, sticky=tk.W)
+        range_box.bind('<<ComboboxSelected>>', lambda event: self.refresh())
+
+        ttk.Label(frame, text="Group by:").grid(row=0, column=2, sticky=tk.W, padx=(15, 5))
+        self.group_var = tk.StringVar(value="Model")
+        group_box = ttk.Combobox(frame, textvariable=self.group_var, state='readonly',
+                                 values=list(GROUPS), width=18)
+        group_box.grid(row=0, column=3, sticky=tk.W)
+        group_box.bind('<<ComboboxSelected>>', lambda event: self.refresh())
+
+        ttk.Button(frame, text="Export CSV...", command=self.export).grid(row=0, column=5, sticky=tk.E)
+
+        self.table = ttk.Treeview(frame, columns=[name for name, _, _ in COLUMNS], show='headings')
+        for name, heading, width in COLUMNS:
+            self.table.heading(name, text=heading)
+            self.table.column(name, width=width, anchor=tk.W if name in ('period', 'user', 'model') else tk.E)
+        self.table.grid(row=1, column=0, columnspan=6, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 5))
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.table.yview)
+        scrollbar.grid(row=1, column=6, sticky=(tk.N, tk.S), pady=(10, 5))
+        self.table.configure(yscrollcommand=scrollbar.set)
+
+        self.totals_label = ttk.Label(frame, text="", font=('Segoe UI', 9))
+        self.totals_label.grid(row=2, column=0, columnspan=6, sticky=tk.W)
+        ttk.Label(frame, text="Latency percentiles are bucketed; token counts marked ~ include estimates",
+                  font=('Segoe UI', 8), foreground='gray').grid(row=3, column=0, columnspan=6, sticky=tk.W)
+
+    def query(self):
+        resolution, start = RANGES[self.range_var.get()]
+        return self.controller.analytics.query(resolution, start=start(datetime.now()),
+                                               group_by=GROUPS[self.group_var.get()])
+
+    def refresh(self):
+        """Re-read the rollups for the selected range and grouping"""
+        self.table.delete(*self.table.get_children())
+        if self.controller.analytics is None:
+            self.totals_label.config(text="Usage analytics are turned off (analytics.enabled)")
+            return
+        self.rows = self.query()
+        resolution = RANGES[self.range_var.get()][0]
+        period_format = {'minute': '%H:%M', 'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d'}[resolution]
+
+        def ms(value):
+            return f"{value:.0f} ms" if value is not None else "-"
+
+        for row in self.rows:
+            mark = "~" if row.estimated else ""
+            self.table.insert('', tk.END, values=(
+                row.period.strftime(period_format) if row.period else "", row.user, row.model,
+                row.requests, row.errors, f"{mark}{row.prompt_tokens:,}", f"{mark}{row.completion_tokens:,}",
+                ms(row.ttft_avg_ms), ms(row.total_p50_ms), ms(row.total_p95_ms)))
+
+        requests = sum(row.requests for row in self.rows)
+        tokens = sum(row.total_tokens for row in self.rows)
+        errors = sum(row.errors for row in self.rows)
+        self.totals_label.config(text=f"{requests:,} requests, {tokens:,} tokens, {errors:,} errors")
+
+    def export(self):
+        """Save the rows currently shown as CSV"""
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension='.csv',
+                                            filetypes=[("CSV files", "*.csv")],
+                                            initialfile="usage.csv")
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                export_csv(self.rows, f)
+        except OSError as e:
+            messagebox.showerror("Export Failed", str(e), parent=self.window)
@@ -0,0 +1,116 @@
+"""
+Main Loop Watchdog
+Measures Tk event-loop lag and attributes stalls to what the main thread was doing.
+
+A heartbeat scheduled with after() records how late each tick fires. A helper
+thread notices when the heartbeat stops arriving and samples the main
+thread's stack until it resumes, so each stall is reported with the code that
+caused it.
+"""
+
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Dict, Any, List
+
+from .logger import get_logger
+
+log = get_logger('watchdog')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class MainLoopWatchdog:
+    def __init__(self, root, metrics, interval_ms: int = 100, budget_ms: int = 200):
+        self.root = root
+        self.metrics = metrics
+        self.interval = interval_ms / 1000
+        self.budget = budget_ms / 1000
+        self.stalls: deque = deque(maxlen=50)
+        self.is_running = False
+        self._main_thread_id = None
+        self._last_beat = 0.0
+        self._expected = 0.0
+        self._stall_samples: List[traceback.StackSummary] = []
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """Start the heartbeat (call from the Tk thread) and the monitor thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._main_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._expected = self._last_beat + self.interval
+        self._stop_event.clear()
+        self.root.after(int(self.interval * 1000), self._heartbeat)
+        threading.Thread(target=self._monitor, name="ui-watchdog", daemon=True).start()
+
+    def stop(self):
+        """Stop monitoring"""
+        self.is_running = False
+        self._stop_event.set()
+
+    def _heartbeat(self):
+        if not self.is_running:
+            return
+
+        now = time.perf_counter()
+        lag_ms = max(0.0, (now - self._expected) * 1000)
+        # Rolling window of roughly the last minute of ticks
+        self.metrics.record_histogram('ui.frame_delay_ms', lag_ms,
+                                      window=max(1, int(60 / self.interval)))
+
+        if self._stall_samples:
+            self._report_stall((now - self._last_beat) * 1000)
+
+        self._last_beat = now
+        self._expected = now + self.interval
+        try:
+            self.root.after(int(self.interval * 1000), self._heartbeat)
+        except Exception:
+            # Root destroyed during shutdown
+            self.is_running = False
+
+    def _monitor(self):
+        check_every = self.budget / 2
+        while not self._stop_event.wait(check_every):
+            overdue = time.perf_counter() - self._last_beat - self.interval
+            if overdue > self.budget:
+                frame = sys._current_frames().get(self._main_thread_id)
+                if frame is not None and len(self._stall_samples) < 50:
+                    self._stall_samples.append(traceback.extract_stack(frame))
+
+    def _report_stall(self, duration_ms: float):
+        samples, self._stall_samples = self._stall_samples, []
+        culprit = self._attribute(samples)
+        stall = {
+            "time": time.time(),
+            "duration_ms": round(duration_ms, 1),
+            "culprit": culprit,
+            "stack": traceback.format_list(samples[-1]) if samples else []
+        }
+        self.stalls.append(stall)
+        self.metrics.increment('ui.stalls')
+        self.metrics.observe('ui.stall_ms', duration_ms)
+        log.warning("UI stall: main loop blocked %.0f ms in %s", duration_ms, culprit,
+                    duration_ms=stall["duration_ms"], culprit=culprit, stack=stall["stack"])
+
+    @staticmethod
+    def _attribute(samples: List[traceback.StackSummary]) -> str:
+        """Most frequently seen innermost frame from this project's code"""
+        culprits = Counter()
+        for stack in samples:
+            app_frames = [f for f in stack if f.filename.startswith(PROJECT_ROOT)
+                          and not f.filename.endswith('watchdog.py')]
+            frame = app_frames[-1] if app_frames else (stack[-1] if stack else None)
+            if frame is not None:
+                culprits[f"{frame.name} ({os.path.relpath(frame.filename, PROJECT_ROOT)}:{frame.lineno})"] += 1
+        return culprits.most_common(1)[0][0] if culprits else "unknown"
+
+    def recent_stalls(self) -> List[Dict[str, Any]]:
+        """Recent stalls, newest last"""
+        return list(self.stalls)
@@ -1,9 +1,20 @@
 import { Hono } from "npm:hono";
 import { cors } from "npm:hono/cors";
 import { logger } from "npm:hono/logger";
+import { createClient } from "jsr:@supabase/supabase-js@2.49.8";
 import * as kv from "./kv_store.tsx";
 const app = new Hono();
 
+// Attachment blobs live in Storage rather than the kv table
+const BLOB_BUCKET = "make-46ee36be-blobs";
+const admin = () => createClient(
+  Deno.env.get("SUPABASE_URL"),
+  Deno.env.get("SUPABASE_SERVICE_ROLE_KEY"),
+);
+const storage = () => admin().storage;
+// Fails harmlessly when the bucket already exists
+await storage().createBucket(BLOB_BUCKET, { public: false });
+
 // Enable logger
 app.use('*', logger(console.log));
 
@@ -13,7 +24,7 @@ app.use(
   cors({
     origin: "*",
     allowHeaders: ["Content-Type", "Authorization"],
-    allowMethods: ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allowMethods: ["GET", "HEAD", "POST", "PUT", "DELETE", "OPTIONS"],
     exposeHeaders: ["Content-Length"],
     maxAge: 600,
   }),
@@ -24,4 +35,108 @@ app.get("/make-server-46ee36be/health", (c) => {
   return c.json({ status: "ok" });
 });
 
+// Sync and blob routes act for the signed-in user only. The bearer token
+// must be the user's Supabase access token; the anon key is not enough.
+const requireUser = async (c, next) => {
+  const token = (c.req.header("Authorization") ?? "").replace(/^Bearer\s+/i, "");
+  if (!token) {
+    return c.json({ error: "missing bearer token" }, 401);
+  }
+  const { data, error } = await admin().auth.getUser(token);
+  if (error || !data?.user) {
+    return c.json({ error: "invalid or expired token" }, 401);
+  }
+  c.set("userId", data.user.id);
+  await next();
+};
+app.use("/make-server-46ee36be/sync/*", requireUser);
+app.use("/make-server-46ee36be/blobs/*", requireUser);
+
+// Every stored key lives under the authenticated user's id, whatever key or
+// prefix the client sends, so one user can never read or overwrite another's.
+const userKey = (c, key: string) => `sync:${c.get("userId")}:${key}`;
+
+// Sync: apply a batch of conditional writes.
+// Each stored value is { key, version, data }. A write succeeds only when the
+// stored version equals expectedVersion (0 means the key must not exist yet);
+// otherwise the current value is returned so the client can merge and retry.
+// The check and the write are one statement (kv_cas_46ee36be), so concurrent
+// pushes from two devices can't both succeed. Any conflict makes it a 409.
+app.post("/make-server-46ee36be/sync/push", async (c) => {
+  const { writes } = await c.req.json();
+  if (!Array.isArray(writes) || writes.length === 0) {
+    return c.json({ results: [] });
+  }
+
+  const results = [];
+  for (const write of writes) {
+    if (typeof write.key !== "string" || !Number.isInteger(write.expectedVersion)) {
+      return c.json({ error: "each write needs a key and an integer expectedVersion" }, 400);
+    }
+    const value = { key: write.key, version: write.expectedVersion + 1, data: write.data };
+    const { data, error } = await admin().rpc("kv_cas_46ee36be", {
+      p_key: userKey(c, write.key),
+      p_expected: write.expectedVersion,
+      p_value: value,
+    });
+    if (error) {
+      return c.json({ error: error.message }, 500);
+    }
+    results.push(data.status === "ok"
+      ? { key: write.key, status: "ok", version: data.version }
+      : { key: write.key, status: "conflict", current: data.current ?? undefined });
+  }
+
+  const conflicted = results.some((result) => result.status === "conflict");
+  return c.json({ results }, conflicted ? 409 : 200);
+});
+
+// Sync: fetch the caller's stored values under a key prefix.
+app.get("/make-server-46ee36be/sync/pull", async (c) => {
+  const prefix = c.req.query("prefix");
+  if (!prefix) {
+    return c.json({ error: "prefix is required" }, 400);
+  }
+  return c.json({ values: await kv.getByPrefix(userKey(c, prefix)) });
+});
+
+// Blobs: content-addressed attachments, keyed by the SHA-256 of their bytes.
+// GET (and HEAD) report whether the caller has stored a blob; PUT streams one
+// in. Blobs are kept per user, so nobody can overwrite another user's blob or
+// learn whether they have stored a given file.
+const blobFolder = (c, digest: string) => `${c.get("userId")}/${digest.slice(0, 2)}`;
+const blobPath = (c, digest: string) => `${blobFolder(c, digest)}/${digest.slice(2)}`;
+const isDigest = (digest: string) => /^[0-9a-f]{64}$/.test(digest);
+
+app.get("/make-server-46ee36be/blobs/:digest", async (c) => {
+  const digest = c.req.param("digest");
+  if (!isDigest(digest)) {
+    return c.json({ error: "invalid digest" }, 400);
+  }
+  const { data, error } = await storage().from(BLOB_BUCKET)
+    .list(blobFolder(c, digest), { search: digest.slice(2), limit: 1 });
+  if (error) {
+    return c.json({ error: error.message }, 500);
+  }
+  return data.length > 0 ? c.json({ digest }) : c.json({ error: "not found" }, 404);
+});
+
+app.put("/make-server-46ee36be/blobs/:digest", async (c) => {
+  const digest = c.req.param("digest");
+  if (!isDigest(digest)) {
+    return c.json({ error: "invalid digest" }, 400);
+  }
+  // Never upsert: a stored blob is immutable, so a second upload is a no-op
+  const { error } = await storage().from(BLOB_BUCKET).upload(blobPath(c, digest), c.req.raw.body, {
+    contentType: "application/octet-stream",
+    upsert: false,
+    duplex: "half",
+  });
+  const exists = error && (String(error.statusCode) === "409" || /already exists/i.test(error.message));
+  if (error && !exists) {
+    return c.json({ error: error.message }, 500);
+  }
+  return c.json({ digest });
+});
+
 Deno.serve(app.fetch);
\ No newline at end of file
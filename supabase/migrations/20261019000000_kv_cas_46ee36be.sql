@@ -0,0 +1,29 @@
+-- Compare-and-set for sync writes, in one statement per key so that two
+-- devices pushing at once can't both pass the version check.
+-- Stored values are { key, version, data }; p_expected = 0 means "must not exist".
+CREATE OR REPLACE FUNCTION kv_cas_46ee36be(p_key TEXT, p_expected INTEGER, p_value JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  current_value JSONB;
+BEGIN
+  IF p_expected = 0 THEN
+    INSERT INTO kv_store_46ee36be (key, value) VALUES (p_key, p_value)
+    ON CONFLICT (key) DO NOTHING;
+  ELSE
+    UPDATE kv_store_46ee36be SET value = p_value
+    WHERE key = p_key AND (value->>'version')::INTEGER = p_expected;
+  END IF;
+
+  IF FOUND THEN
+    RETURN jsonb_build_object('status', 'ok', 'version', (p_value->>'version')::INTEGER);
+  END IF;
+
+  SELECT value INTO current_value FROM kv_store_46ee36be WHERE key = p_key;
+  RETURN jsonb_build_object('status', 'conflict', 'current', current_value);
+END;
+$$;
+
+-- Only the edge function (service role) may call it
+REVOKE ALL ON FUNCTION kv_cas_46ee36be(TEXT, INTEGER, JSONB) FROM PUBLIC, anon, authenticated;